@@ -1,19 +1,24 @@
 import streamlit as st
-from pyrebase import pyrebase
 import requests
 import os
-import shutil
-import subprocess
-from urllib.parse import quote
 import time
 import base64
 import webbrowser
 import json
+import re
+import sys
+# Only what the login page needs. The sync, library and model server modules pull in numpy and start
+# threads, so the dashboard imports them where they are first used (like pyrebase below).
+from archeon_core import telemetry, tokens, transport, viewers
+
+# Firebase configuration - Load from secure config file, parsed once per server process
+@st.cache_data(show_spinner=False)
+def load_firebase_config(path='firebase_config.json'):
+    with open(path, 'r') as f:
+        return json.load(f)
 
-# Firebase configuration - Load from secure config file
 try:
-    with open('firebase_config.json', 'r') as f:
-        firebase_config = json.load(f)
+    firebase_config = load_firebase_config()
 except FileNotFoundError:
     st.error("❌ Firebase configuration file not found. Please add firebase_config.json to the project root directory.")
     st.info("Create firebase_config.json with your Firebase project credentials.")
@@ -23,6 +28,13 @@ except json.JSONDecodeError:
     st.stop()
 
 
+# Inline <style> blocks are resent on every rerun; strip comments and indentation once
+@st.cache_data(show_spinner=False)
+def compact_css(markup):
+    markup = re.sub(r"/\*.*?\*/", "", markup, flags=re.S)
+    return re.sub(r"\s*\n\s*", "\n", markup).strip()
+
+
 # Page configuration
 st.set_page_config(
     page_title="Archeon VR Model Viewer",
@@ -33,7 +45,7 @@ st.set_page_config(
 
 # Hide Streamlit default elements
 st.markdown(
-    """
+    compact_css("""
     <style>
         /* Hide Streamlit's top-right menu and footer */
         header {visibility: hidden;}
@@ -98,6 +110,19 @@ st.markdown(
             background-color: rgba(80, 80, 100, 0.7);
             transform: translateX(5px);
         }
+        .model-item .thumbnail {
+            float: left;
+            width: 96px;
+            height: 64px;
+            margin-right: 12px;
+            border-radius: 3px;
+            background-color: rgb(24, 24, 40);
+        }
+        .model-item::after {
+            content: "";
+            display: block;
+            clear: both;
+        }
         
         /* Input fields styling */
         .stTextInput>div>div>input {
@@ -117,21 +142,73 @@ st.markdown(
             animation: float 3s ease-in-out infinite;
         }
     </style>
-    """,
+    """),
     unsafe_allow_html=True
 )
 
-# Initialize Firebase
-firebase = pyrebase.initialize_app(firebase_config)
-auth = firebase.auth()
-storage = firebase.storage()
+# Seconds a model listing stays cached between syncs
+LISTING_CACHE_TTL = 300
+# Seconds between sync status redraws
+SYNC_STATUS_REFRESH = 1.0
+OPTIMIZE_AFTER_SYNC = os.environ.get("ARCHEON_OPTIMIZE_MODELS", "1") != "0"
+# Seconds between system status redraws, and the window its live figures cover
+TELEMETRY_REFRESH = 2.0
+TELEMETRY_WINDOW = 60.0
+# "Open" launches the viewer once this much of the model is on disk, or the wait times out
+OPEN_READY_BYTES = 2 * 1024 * 1024
+OPEN_READY_TIMEOUT = 30.0
+# Cookie carrying this browser's remember id (see tokens.TokenStore.issue), and how long it lasts
+REMEMBER_COOKIE = "archeon_remember"
+REMEMBER_COOKIE_MAX_AGE = 30 * 24 * 3600
+# Library sort options: label -> (index column, descending)
+LIBRARY_SORTS = {
+    "Name": ("name", False),
+    "Largest file": ("size", True),
+    "Most splats": ("splat_count", True),
+    "Recently synced": ("mtime_ns", True),
+}
+
+# Firebase auth client, shared by all sessions. pyrebase pulls in a heavy import
+# chain, so it is only loaded the first time someone signs in.
+@st.cache_resource(show_spinner=False)
+def get_firebase_auth():
+    from pyrebase import pyrebase
+    return pyrebase.initialize_app(firebase_config).auth()
 
-# Initialize session state for login
+# Encrypted refresh tokens of users who chose "Remember me"
+token_store = tokens.get_store(firebase_config['apiKey'])
+
+# Initialize session state for login, signing the user this browser remembered straight back in
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
     st.session_state['user'] = None
+    st.session_state['token_manager'] = None
+    # st.context exposes the request's cookies from Streamlit 1.37 on; older versions just don't restore
+    remember_id = (getattr(getattr(st, "context", None), "cookies", None) or {}).get(REMEMBER_COOKIE)
+    manager = tokens.TokenManager.restore(firebase_config['apiKey'], token_store, remember_id) if remember_id else None
+    if manager is not None:
+        st.session_state['token_manager'] = manager
+        st.session_state['user'] = manager.user()
+        st.session_state['logged_in'] = True
+        st.session_state['remember_id'] = remember_id
+    elif remember_id:
+        st.session_state['remember_cookie'] = ""  # Revoked or expired; clear it
+
+# Write or clear the remember cookie in the browser, once, after sign-in, logout or a failed restore.
+# Streamlit can't set response cookies, so this goes through a script in a zero-height component.
+def write_remember_cookie():
+    value = st.session_state.pop('remember_cookie', None)
+    if value is None:
+        return
+    max_age = REMEMBER_COOKIE_MAX_AGE if value else 0
+    st.components.v1.html(
+        f"<script>window.parent.document.cookie = "
+        f"'{REMEMBER_COOKIE}={value}; Max-Age={max_age}; Path=/; SameSite=Strict';</script>",
+        height=0
+    )
 
-# Helper function to get base64 image
+# Helper function to get base64 image, encoded once per server process
+@st.cache_data(show_spinner=False)
 def get_base64_image(image_path):
     try:
         with open(image_path, "rb") as f:
@@ -176,22 +253,59 @@ st.markdown("""
     unsafe_allow_html=True
 )
 
-# Display connection status
-st.sidebar.markdown("""
-    <div style='padding: 10px; border-radius: 5px; background-color: rgba(30, 30, 50, 0.7);'>
-        <h4 style='margin-bottom: 10px;'>System Status</h4>
-        <p>
-            <span class='status-indicator status-online'></span>
-            Server: Online
-        </p>
-        <p>
-            <span class='status-indicator status-online'></span>
-            Storage: Connected
-        </p>
-    </div>
-    """, 
-    unsafe_allow_html=True
-)
+# Use st.fragment to redraw sync status on a timer without rerunning the whole page
+def auto_refresh(run_every):
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment is None:
+        return lambda func: func
+    return fragment(run_every=run_every)
+
+# The model server if a viewer or model URL has started it; the status panel must not start it itself
+def running_model_server():
+    module = sys.modules.get("archeon_core.server")
+    return None if module is None else module.current_server()
+
+# Live system status from sync telemetry (also exported at the model server's /metrics)
+@auto_refresh(TELEMETRY_REFRESH)
+def render_system_status():
+    model_server = running_model_server()
+    if model_server is None:
+        server_label, metrics_link = "Server: Idle (starts when a model is opened)", ""
+    else:
+        server_label = f"Server: Online (port {model_server.server_address[1]})"
+        metrics_link = (f"<br><a href='{model_server.metrics_url}' target='_blank' style='color: #8a8aff;'>"
+                        f"Prometheus metrics</a>")
+    stats = telemetry.summary(TELEMETRY_WINDOW)
+    if stats['requests'] == 0:
+        storage_class, storage_label = "status-online", "Storage: Idle"
+    elif stats['error_rate'] < 0.05:
+        storage_class, storage_label = "status-online", f"Storage: Connected ({stats['error_rate']:.0%} errors)"
+    else:
+        storage_class, storage_label = "status-offline", f"Storage: Degraded ({stats['error_rate']:.0%} errors)"
+    ttfb = "–" if stats['ttfb_ms'] is None else f"{stats['ttfb_ms']:.0f} ms"
+    st.markdown(f"""
+        <div style='padding: 10px; border-radius: 5px; background-color: rgba(30, 30, 50, 0.7);'>
+            <h4 style='margin-bottom: 10px;'>System Status</h4>
+            <p>
+                <span class='status-indicator status-online'></span>
+                {server_label}
+            </p>
+            <p>
+                <span class='status-indicator {storage_class}'></span>
+                {storage_label}
+            </p>
+            <p style='font-size: 0.85rem; color: #a6a6d9; margin-bottom: 0;'>
+                Throughput: {stats['mb_per_s']:.1f} MB/s · Active: {stats['active_transfers']} · Queued: {stats['queued_transfers']}<br>
+                Last {TELEMETRY_WINDOW:.0f}s: {stats['files']} ok, {stats['failed']} failed<br>
+                Median TTFB: {ttfb} · Retries: {stats['retries']}{metrics_link}
+            </p>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+with st.sidebar:
+    render_system_status()
 
 # Updated login function with properly hidden functional button
 def login():
@@ -218,7 +332,7 @@ def login():
             login_button_container = st.container()
             
             # Add CSS to style the button
-            st.markdown("""
+            st.markdown(compact_css("""
                 <style>
                     /* Custom style for the main login button */
                     div[data-testid="element-container"] button {
@@ -252,7 +366,7 @@ def login():
                         margin-left: 10px;
                     }
                 </style>
-            """, unsafe_allow_html=True)
+            """), unsafe_allow_html=True)
             
             # Use a single Streamlit button with the login icon added via markdown
             with login_button_container:
@@ -287,7 +401,15 @@ def login():
             if login_button:
                 with st.spinner("Authenticating..."):
                     try:
-                        user = auth.sign_in_with_email_and_password(email, password)
+                        user = get_firebase_auth().sign_in_with_email_and_password(email, password)
+                        # Replace whatever this browser remembered before; other browsers keep theirs
+                        token_store.revoke(st.session_state.pop('remember_id', None))
+                        st.session_state['token_manager'] = tokens.TokenManager.from_sign_in(
+                            firebase_config['apiKey'], user, token_store if remember_me else None)
+                        if remember_me:
+                            # Only a browser holding this id is signed back in, never whoever opens the app next
+                            st.session_state['remember_id'] = token_store.issue(user['localId'])
+                        st.session_state['remember_cookie'] = st.session_state.get('remember_id', "")
                         st.session_state['user'] = user
                         st.session_state['logged_in'] = True
                         
@@ -310,144 +432,6 @@ def login():
                             st.error("⚠ This account has been disabled. Please contact support.")
                         else:
                             st.error("⚠ An unexpected error occurred. Please try again.")
-# Updated render_logout_button function to properly hide the standard button
-def render_logout_button():
-    # Create a unique key for the logout button
-    logout_key = "logout_button_hidden"
-    
-    # Add CSS to hide the standard button with the specific key
-    st.markdown(f"""
-    <style>
-        /* Target the specific button by its key */
-        div[data-testid="element-container"]:has(button[kind="primary"][data-testid="{logout_key}"]) {{
-            display: none;
-        }}
-        
-        .logout-btn {{
-            background: linear-gradient(90deg, #434343, #656565);
-            color: white;
-            font-weight: 500;
-            border: none;
-            padding: 8px 20px;
-            border-radius: 5px;
-            transition: all 0.3s ease;
-            cursor: pointer;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-            box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
-        }}
-        .logout-btn:hover {{
-            background: linear-gradient(90deg, #5a5a5a, #7a7a7a);
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.3);
-        }}
-        .logout-btn:active {{
-            transform: translateY(0px);
-            box-shadow: 0 1px 2px rgba(0, 0, 0, 0.2);
-        }}
-    </style>
-    <div class="logout-btn-container" style="display: flex; justify-content: center; margin-top: 20px; margin-bottom: 30px;">
-        <button class="logout-btn" type="submit" form="logout-form">
-            <svg width="16" height="16" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                <path d="M9 21H5C4.46957 21 3.96086 20.7893 3.58579 20.4142C3.21071 20.0391 3 19.5304 3 19V5C3 4.46957 3.21071 3.96086 3.58579 3.58579C3.96086 3.21071 4.46957 3 5 3H9" stroke="white" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                <path d="M16 17L21 12L16 7" stroke="white" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                <path d="M21 12H9" stroke="white" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-            </svg>
-            <span>Logout</span>
-        </button>
-    </div>
-    <form id="logout-form"></form>
-    """, unsafe_allow_html=True)
-    
-    # Create the hidden Streamlit button with the unique key
-    return st.button("Logout", key=logout_key)
-
-# Update the file_sync function to use the new logout button
-def file_sync():
-    try:
-        user = st.session_state['user']
-        user_id = user['localId']
-        cloud_dir = f"models/{user_id}/"
-        
-        # Display user info in sidebar with improved UI
-        st.sidebar.markdown(f"""
-            <div style='padding: 15px; border-radius: 8px; background-color: rgba(30, 30, 50, 0.7); 
-                 margin-bottom: 20px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);'>
-                <h4 style='margin-bottom: 15px; color: #8a8aff;'>
-                    <svg width="16" height="16" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg" style="vertical-align: middle; margin-right: 5px;">
-                        <path d="M20 21V19C20 17.9391 19.5786 16.9217 18.8284 16.1716C18.0783 15.4214 17.0609 15 16 15H8C6.93913 15 5.92172 15.4214 5.17157 16.1716C4.42143 16.9217 4 17.9391 4 19V21" stroke="#8a8aff" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                        <path d="M12 11C14.2091 11 16 9.20914 16 7C16 4.79086 14.2091 3 12 3C9.79086 3 8 4.79086 8 7C8 9.20914 9.79086 11 12 11Z" stroke="#8a8aff" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                    </svg>
-                    User Profile
-                </h4>
-                <div style='display: flex; align-items: center; margin-bottom: 10px;'>
-                    <div style='width: 40px; height: 40px; border-radius: 50%; background-color: #4a00e0; 
-                         display: flex; align-items: center; justify-content: center; margin-right: 10px;'>
-                        <span style='color: white; font-weight: bold;'>${user['email'].charAt(0).toUpperCase()}</span>
-                    </div>
-                    <div>
-                        <p style='font-size: 0.9rem; margin: 0; font-weight: 500;'>
-                            ${user['email']}
-                        </p>
-                        <p style='font-size: 0.8rem; margin: 0; color: #a6a6d9;'>
-                            ID: ${user_id[:8]}...
-                        </p>
-                    </div>
-                </div>
-                <div style='height: 1px; background-color: rgba(166, 166, 217, 0.2); margin: 10px 0;'></div>
-                <div style='display: flex; justify-content: space-between; align-items: center;'>
-                    <span style='font-size: 0.8rem; color: #a6a6d9;'>
-                        <svg width="12" height="12" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg" style="vertical-align: middle; margin-right: 3px;">
-                            <circle cx="12" cy="12" r="10" stroke="#a6a6d9" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                            <path d="M12 6V12L16 14" stroke="#a6a6d9" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                        </svg>
-                        Last login: Today
-                    </span>
-                    <span style='font-size: 0.8rem; padding: 2px 8px; background-color: rgba(74, 0, 224, 0.2); 
-                          border-radius: 20px; color: #8a8aff;'>Active</span>
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-        
-        # Main dashboard header
-        st.markdown("""
-            <div class='content-card'>
-                <h2 style='text-align: center; color: #8a8aff;'>
-                    🎮 VR Model Dashboard
-                </h2>
-            </div>
-            """, 
-            unsafe_allow_html=True
-        )
-        
-        # Create tabs for different sections
-        tab1, tab2, tab3 = st.tabs(["📥 Model Sync", "👁️ Model Viewer", "ℹ️ Help"])
-        
-        with tab1:
-            # Content of tab1 (same as before)
-            pass
-        
-        with tab2:
-            # Content of tab2 (same as before)
-            pass
-        
-        with tab3:
-            # Content of tab3 (same as before)
-            pass
-        
-        # Use the enhanced logout button
-        st.markdown("<br>", unsafe_allow_html=True)
-        if render_logout_button():
-            logout()
-        
-    except Exception as e:
-        st.error(f"An error occurred: {str(e)}")
-        if st.button("Return to Login"):
-            logout()
-
 # Updated logout function with better transitioning
 def logout():
     # Show a nice animation before logging out
@@ -473,32 +457,191 @@ def logout():
     """, unsafe_allow_html=True)
     
     # Clear session state
-    auth.current_user = None
+    manager = st.session_state.get('token_manager')
+    if manager is not None:
+        transport.close_session(manager)
+        viewers.registry.close(manager.local_id)
+        model_server = running_model_server()
+        if model_server is not None:
+            model_server.revoke(manager.local_id)
+    # Forget this browser only; the account stays remembered on the others
+    token_store.revoke(st.session_state.pop('remember_id', None))
+    st.session_state['remember_cookie'] = ""
     st.session_state['logged_in'] = False
     st.session_state['user'] = None
+    st.session_state['token_manager'] = None
     
     # Small delay for animation
     time.sleep(1)
     st.rerun()
 
-# Ensure viewer content is in the right directory
-def ensure_viewer_contents(local_dir):
-    source_viewer_dir = "./viewer"
-    if os.path.exists(source_viewer_dir):
-        for item in os.listdir(source_viewer_dir):
-            s = os.path.join(source_viewer_dir, item)
-            d = os.path.join(local_dir, item)
-            if os.path.isdir(s):
-                shutil.copytree(s, d, dirs_exist_ok=True)
+# Cached model listing with metadata; cleared explicitly when a sync starts.
+# The token manager is left out of the cache key (leading underscore); cloud_dir already names the user.
+@st.cache_data(ttl=LISTING_CACHE_TTL, show_spinner=False)
+def load_model_listing(bucket, cloud_dir, _token_manager):
+    from archeon_core import manifest, storage, sync
+    session = transport.get_session(_token_manager)
+    # Metadata the last sync confirmed is reused, so only new models cost a lookup
+    known = manifest.known_metadata(manifest.load_manifest(sync.user_local_dir(_token_manager.local_id)))
+    return storage.list_models(session, transport.storage_base_url(bucket), cloud_dir, known=known)
+
+# Queue a background sync for the user, or reuse the one already running
+def start_sync_job(token_manager, optimize=False):
+    from archeon_core import jobs, sync
+    # The session refreshes the ID token itself, so syncs can outlive it
+    session = transport.get_session(token_manager)
+    base_url = transport.storage_base_url(firebase_config['storageBucket'])
+
+    def run(job):
+        return sync.sync_account(session, base_url, token_manager.local_id, optimize=optimize,
+                                 progress=job.progress, control=job.control, log=job.log)
+
+    return jobs.registry.submit(token_manager.local_id, run)
+
+# Bring the user's library index up to date and order the listing by it.
+# Only new or changed files are scanned, and only their headers, so this stays cheap on every rerun.
+def sort_and_filter_models(user_id, user_models, sort, search, formats):
+    from archeon_core import library, sync
+    index = library.get_index(sync.DOWNLOADS_DIR)
+    index.update_user(user_id, sync.user_local_dir(user_id))
+    column, descending = LIBRARY_SORTS[sort]
+    rows = index.query(user_id, order_by=column, descending=descending, search=search, formats=formats)
+    indexed = {row['name']: row for row in rows}
+    rank = {row['name']: position for position, row in enumerate(rows)}
+
+    listed = []
+    for model in user_models:
+        file_name = os.path.basename(model['name'])
+        if file_name in indexed:
+            listed.append((model, indexed[file_name]))
+        elif not formats and (not search or search.lower() in file_name.lower()):
+            # Not downloaded yet, so nothing is known beyond the listing; shown after the local models
+            listed.append((model, None))
+    listed.sort(key=lambda item: (rank.get(os.path.basename(item[0]['name']), len(rank)),
+                                  os.path.basename(item[0]['name'])))
+    return listed, index.stats(user_id)
+
+# Fetch one model ahead of the sync queue and open it in the web viewer as soon as it starts arriving
+def open_model_in_viewer(token_manager, model):
+    from archeon_core import downloader, preprocess, server, sync
+    session = transport.get_session(token_manager)
+    base_url = transport.storage_base_url(firebase_config['storageBucket'])
+    file_name = os.path.basename(model['name'])
+    local_path, fetch = sync.open_model(session, base_url, token_manager.local_id, model)
+
+    ready_bytes = min(model.get('size') or OPEN_READY_BYTES, OPEN_READY_BYTES)
+    deadline = time.monotonic() + OPEN_READY_TIMEOUT
+    with st.spinner(f"Fetching {file_name}..."):
+        # Until the fetch is done only the live transfer counts; the file on disk may be the old version
+        while (not fetch.done() and downloader.available_bytes(local_path, live_only=True) < ready_bytes
+               and time.monotonic() < deadline):
+            time.sleep(0.1)
+    if fetch.done() and fetch.exception() is not None:
+        st.error(f"❌ Could not fetch {file_name}: {fetch.exception()}")
+        return
+    if not fetch.done() and downloader.available_bytes(local_path, live_only=True) == 0:
+        st.warning(f"{file_name} hasn't started downloading yet; try again in a moment.")
+        return
+
+    # Reuse the user's open viewer tab when there is one, so switching models skips the viewer's startup
+    model_server = server.ensure_server()
+    local_dir = sync.user_local_dir(token_manager.local_id)
+    if fetch.done():
+        # Open the optimized .ksplat the last sync built for this exact version, if there is one
+        local_path = preprocess.viewer_file(local_dir, file_name, model.get('md5Hash'))
+    src = model_server.model_url(token_manager.local_id, os.path.relpath(local_path, local_dir).replace(os.sep, "/"))
+    _, _, launched = viewers.registry.open(token_manager.local_id, viewers.WEB, viewers.launch_web(model_server),
+                                          src, model=file_name)
+    action = "Opened" if launched else "Switched the viewer to"
+    if fetch.done():
+        st.success(f"🎨 {action} {file_name}.")
+    else:
+        st.success(f"🎨 {action} {file_name}; the rest streams into the viewer as it downloads.")
+
+# Start the user's Unity viewer, or keep the one already running
+def launch_native_viewer(user_id):
+    from archeon_core import server, sync
+    local_dir = sync.user_local_dir(user_id)
+    if not os.path.exists(os.path.join(local_dir, viewers.NATIVE_EXE)):
+        st.error("Viewer executable not found. Please sync your files first.")
+        return
+    if viewers.registry.get(user_id, viewers.NATIVE) is not None:
+        st.info("The VR Model Viewer is already running.")
+        return
+    try:
+        viewer, _, _ = viewers.registry.open(user_id, viewers.NATIVE,
+                                             viewers.launch_native(server.ensure_server(), local_dir), "")
+    except OSError as e:
+        st.error(f"Failed to launch viewer: {str(e)}")
+        return
+    # Wait for the viewer's ready handshake instead of a fixed sleep
+    with st.spinner("Starting the Model Viewer..."):
+        ready = viewer.wait_ready()
+    if ready:
+        st.success(f"🎨 VR Model Viewer ready in {viewer.startup_seconds:.1f}s!")
+    elif viewer.alive:
+        st.success("🎨 VR Model Viewer launched successfully!")
+    else:
+        st.error("The viewer exited during startup.")
+
+# Live status of the user's latest sync job
+@auto_refresh(SYNC_STATUS_REFRESH)
+def render_sync_status(user_id):
+    from archeon_core import downloader, jobs
+    job = jobs.registry.latest_for(user_id)
+    if job is None:
+        return
+
+    progress = job.progress
+    st.progress(progress.fraction())
+    st.markdown(
+        f"**{job.state.capitalize()}** · Downloaded **{downloader.format_bytes(progress.done_bytes)}** of "
+        f"**{downloader.format_bytes(progress.total_bytes)}** "
+        f"({progress.done_files}/{progress.total_files} files"
+        f"{f', {progress.failed_files} failed' if progress.failed_files else ''})"
+    )
+
+    if not job.finished:
+        col1, col2 = st.columns(2)
+        with col1:
+            if job.state == jobs.PAUSED:
+                if st.button("Resume", key=f"resume_{job.id}"):
+                    job.resume()
+            elif st.button("Pause", key=f"pause_{job.id}"):
+                job.pause()
+        with col2:
+            if st.button("Cancel", key=f"cancel_{job.id}"):
+                job.cancel()
+
+    with st.expander("Sync log", expanded=not job.finished):
+        for _, level, message in list(job.messages)[-20:]:
+            getattr(st, level, st.info)(message)
+
+    if job.finished and st.session_state.get('acknowledged_sync_job') != job.id:
+        # Show the outcome once, then refresh the listing so it reflects the sync
+        st.session_state['acknowledged_sync_job'] = job.id
+        load_model_listing.clear()
+        if job.state == jobs.DONE and job.result is not None and job.result.ok:
+            st.success("🎉 All files synced successfully!")
+            if job.result.artifacts is not None and not job.result.artifacts.ok:
+                st.warning("⚠ Optimizing the models for the viewer failed; see the sync log. "
+                           "The viewer opens the downloaded files meanwhile.")
             else:
-                shutil.copy2(s, d)
+                st.balloons()
+        elif job.state == jobs.DONE and job.result is not None:
+            st.warning(f"⚠ Sync finished with {len(job.result.failed)} failed download(s). Click \"Sync Models\" to retry.")
+        elif job.state == jobs.CANCELLED:
+            st.info("Sync cancelled. Partially downloaded files will resume on the next sync.")
+        else:
+            st.error(f"❌ Sync failed: {job.error}")
 
 # File sync function
 def file_sync():
+    from archeon_core import downloader, library, server, sync, thumbnails
     try:
         user = st.session_state['user']
         user_id = user['localId']
-        cloud_dir = f"models/{user_id}/"
+        cloud_dir = sync.user_cloud_dir(user_id)
         
         # Display user info in sidebar
         st.sidebar.markdown(f"""
@@ -542,92 +685,80 @@ def file_sync():
             )
 
             # Get list of files from Firebase
-            base_url = f"https://firebasestorage.googleapis.com/v0/b/{firebase_config['storageBucket']}/o"
-            headers = {"Authorization": f"Bearer {user['idToken']}"}
-            params = {'prefix': cloud_dir}
-
             with st.spinner("Loading your models..."):
-                response = requests.get(base_url, headers=headers, params=params)
-                response.raise_for_status()
-
-                items = response.json().get('items', [])
-                user_files = [item['name'] for item in items if 'name' in item]
+                user_models = load_model_listing(firebase_config['storageBucket'], cloud_dir,
+                                                 st.session_state['token_manager'])
 
             # Display file list with improved styling
             st.markdown("<h4 style='color: #8a8aff;'>Available Models</h4>", unsafe_allow_html=True)
             
-            if not user_files:
+            if not user_models:
                 st.info("📭 You don't have any models stored yet. Upload models to your Firebase storage to see them here.")
             else:
-                for file in user_files:
-                    file_name = os.path.basename(file)
-                    file_size = "Unknown size"  # You could fetch actual size from metadata if needed
+                search_col, sort_col, format_col = st.columns([3, 2, 2])
+                with search_col:
+                    search = st.text_input("Search", key="library_search", placeholder="Model name")
+                with sort_col:
+                    sort = st.selectbox("Sort by", list(LIBRARY_SORTS), key="library_sort")
+                with format_col:
+                    formats = st.multiselect("Format", [library.FORMAT_PLY, library.FORMAT_SPLAT, library.FORMAT_KSPLAT],
+                                             key="library_formats")
+                listed, stats = sort_and_filter_models(user_id, user_models, sort, search.strip(), formats)
+                if stats['models']:
+                    st.caption(f"{stats['models']} of {len(user_models)} models on this machine · "
+                               f"{stats['splats']:,} splats · {downloader.format_bytes(stats['bytes'])}")
+                if not listed:
+                    st.info("No models match these filters.")
+
+                model_server = None  # Started for the first thumbnail URL
+                opened = None
+                for model, indexed in listed:
+                    file_name = os.path.basename(model['name'])
+                    # Rendered by the model server when the image scrolls into view, then served from its cache
+                    thumbnail = ""
+                    if (indexed is not None and indexed['error'] is None
+                            and file_name.lower().endswith(thumbnails.SUPPORTED_EXTENSIONS)):
+                        model_server = model_server or server.ensure_server()
+                        thumbnail = (f"<img class='thumbnail' loading='lazy' alt='' "
+                                     f"src='{model_server.thumbnail_url(user_id, file_name)}'>")
+                    details = [downloader.format_bytes(model['size']) if model.get('size') is not None else "Unknown size"]
+                    if indexed is not None and indexed['error'] is None:
+                        details.append(f"{indexed['splat_count']:,} splats · SH {indexed['sh_degree']} · "
+                                       f"{indexed['variant']}")
+                    elif indexed is not None:
+                        details.append("Unreadable on disk")
+                    if model.get('updated'):
+                        details.append(f"Updated {model['updated'][:16].replace('T', ' ')}")
+                    if model.get('contentType'):
+                        details.append(model['contentType'])
                     
-                    st.markdown(f"""
-                        <div class='model-item'>
-                            <strong>📦 {file_name}</strong><br>
-                            <small style='color: #a6a6d9;'>{file_size}</small>
-                        </div>
-                        """, 
-                        unsafe_allow_html=True
-                    )
+                    item_col, open_col = st.columns([5, 1])
+                    with item_col:
+                        st.markdown(f"""
+                            <div class='model-item'>
+                                {thumbnail}<strong>📦 {file_name}</strong><br>
+                                <small style='color: #a6a6d9;'>{" · ".join(details)}</small>
+                            </div>
+                            """, 
+                            unsafe_allow_html=True
+                        )
+                    with open_col:
+                        # Fetches just this model, ahead of any sync, and streams it to the viewer
+                        if st.button("Open", key=f"open_{model['name']}"):
+                            opened = model
+                if opened is not None:
+                    open_model_in_viewer(st.session_state['token_manager'], opened)
             
             # Sync button with improved styling
             st.markdown("<br>", unsafe_allow_html=True)
             
-            # Function to actually sync files
-            def sync_files():
-                local_dir = os.path.join("downloads", user_id)
-                os.makedirs(local_dir, exist_ok=True)
-
-                ensure_viewer_contents(local_dir)  # Ensure viewer contents are in the user's directory
-
-                if not user_files:
-                    st.info("No files to sync.")
-                    return
-
-                # Progress tracking
-                progress_container = st.container()
-                overall_progress = st.progress(0)
-                file_progress = st.empty()
-                
-                for i, cloud_path in enumerate(user_files):
-                    file_name = os.path.basename(cloud_path)
-                    local_path = os.path.join(local_dir, file_name)
-                    
-                    # Update progress text
-                    file_progress.markdown(f"Processing **{file_name}** ({i+1}/{len(user_files)})")
-                    
-                    # Download only if not present locally
-                    if not os.path.exists(local_path):
-                        with progress_container:
-                            st.markdown(f"⬇️ Downloading: **{file_name}**")
-                            
-                        encoded_path = quote(cloud_path, safe='')
-                        file_download_url = f"{base_url}/{encoded_path}?alt=media"
-                        file_response = requests.get(file_download_url, headers=headers)
-                        
-                        if file_response.status_code == 200:
-                            with open(local_path, 'wb') as f:
-                                f.write(file_response.content)
-                            with progress_container:
-                                st.success(f"✔️ Downloaded {file_name}")
-                        else:
-                            with progress_container:
-                                st.error(f"❌ Failed to download {file_name}")
-                    else:
-                        with progress_container:
-                            st.info(f"ℹ️ {file_name} already present, skipping...")
-                    
-                    # Update overall progress
-                    overall_progress.progress((i + 1) / len(user_files))
-                
-                # Show completion message with animation
-                st.success("🎉 All files synced successfully!")
-                st.balloons()
-
+            # Sync runs as a background job so reruns and navigation don't interrupt it
+            optimize = st.checkbox("Optimize models for the viewer after syncing", value=OPTIMIZE_AFTER_SYNC,
+                                   key="optimize_after_sync")
             if st.button("Sync Models", key="sync_button"):
-                sync_files()
+                start_sync_job(st.session_state['token_manager'], optimize)
+
+            render_sync_status(user_id)
 
         with tab2:
             st.markdown("""
@@ -656,29 +787,17 @@ def file_sync():
             
             # View Models button
             if st.button("Launch Viewer", key="viewer_button"):
-                try:
-                    local_dir = os.path.join("downloads", user_id)
-                    exe_path = os.path.join(local_dir, "ArcheonViewer.exe")
-                    
-                    # Check if file exists
-                    if os.path.exists(exe_path):
-                        with st.spinner("Starting the Model Viewer..."):
-                            subprocess.Popen(exe_path, cwd=local_dir)
-                            time.sleep(2)  # Give time for the application to start
-                        st.success("🎨 VR Model Viewer launched successfully!")
-                    else:
-                        st.error("Viewer executable not found. Please sync your files first.")
-                except Exception as e:
-                    st.error(f"Failed to launch viewer: {str(e)}")
+                launch_native_viewer(user_id)
             if st.button("Launch embedded Non-VR Viewer", key="web_viewer_button"):
+                viewer_url = server.ensure_server().url("index.html")
                 st.components.v1.html(
-                    f'<iframe src="http://127.0.0.1:8080/index.html" width="800" height="600"></iframe>',
+                    f'<iframe src="{viewer_url}" width="800" height="600"></iframe>',
                     height=600,
                     width=1000
                 )
             # Button to open viewer in a new tab
             if st.button("Launch Non-VR Viewer", key="new_tab_button"):
-                url = "http://127.0.0.1:8080/index.html"
+                url = server.ensure_server().url("index.html")
                 chrome_path = r'"C:\Program Files\Google\Chrome\Application\chrome.exe" %s'  # Ensure correct path format
 
                 # Open URL in Google Chrome
@@ -843,6 +962,7 @@ def file_sync():
             logout()
 
 # Main app flow
+write_remember_cookie()
 if st.session_state['logged_in']:
     file_sync()
 else:
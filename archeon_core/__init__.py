@@ -0,0 +1 @@
+"""Sync, storage and model-processing helpers used by the Archeon app."""
@@ -0,0 +1,174 @@
+"""Content-addressed model store shared by every user on this machine.
+
+Blobs are keyed by the Firebase md5Hash and live once under
+downloads/.store/objects/. User directories only hold hard links (or copies
+where links aren't possible) into the store, so a model shared between
+accounts is downloaded and stored once. Each blob tracks the user paths
+that reference it; unreferenced blobs are kept as a cache and evicted
+least-recently-used first once the store exceeds its size cap.
+"""
+import base64
+import json
+import os
+import shutil
+import threading
+import time
+
+STORE_DIRNAME = ".store"
+INDEX_NAME = "index.json"
+DEFAULT_MAX_BYTES = int(os.environ.get("ARCHEON_STORE_MAX_BYTES", 10 * 1024 ** 3))
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def blob_key(md5_hash):
+    """Filesystem-safe hex key for a base64 md5Hash."""
+    return base64.b64decode(md5_hash).hex()
+
+
+class BlobStore:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._index_path = os.path.join(root, INDEX_NAME)
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def path_for(self, md5_hash):
+        key = blob_key(md5_hash)
+        return os.path.join(self.root, "objects", key[:2], key)
+
+    def has(self, md5_hash):
+        with self._lock:
+            return blob_key(md5_hash) in self._index and os.path.isfile(self.path_for(md5_hash))
+
+    def _add_ref(self, md5_hash, path):
+        entry = self._index[blob_key(md5_hash)]
+        path = os.path.abspath(path)
+        if path not in entry['refs']:
+            entry['refs'].append(path)
+        entry['last_used'] = time.time()
+
+    def _drop_ref(self, path):
+        path = os.path.abspath(path)
+        for entry in self._index.values():
+            if path in entry['refs']:
+                entry['refs'].remove(path)
+
+    def references(self, md5_hash, local_path):
+        with self._lock:
+            entry = self._index.get(blob_key(md5_hash))
+            return entry is not None and os.path.abspath(local_path) in entry['refs']
+
+    def ingest(self, local_path, md5_hash):
+        """Adopt a freshly downloaded file, replacing it with a link to the stored blob."""
+        with self._lock:
+            blob_path = self.path_for(md5_hash)
+            key = blob_key(md5_hash)
+            self._drop_ref(local_path)
+            if key in self._index and os.path.isfile(blob_path):
+                _replace_with_link(blob_path, local_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                _replace_with_link(local_path, blob_path)
+                self._index[key] = {'size': os.path.getsize(blob_path), 'refs': [], 'last_used': time.time()}
+            self._add_ref(md5_hash, local_path)
+            self._save_index()
+
+    def link_into(self, md5_hash, local_path):
+        """Materialize a stored blob at local_path; returns False if it isn't stored."""
+        with self._lock:
+            if not self.has(md5_hash):
+                return False
+            self._drop_ref(local_path)
+            os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+            _replace_with_link(self.path_for(md5_hash), local_path)
+            self._add_ref(md5_hash, local_path)
+            self._save_index()
+            return True
+
+    def release(self, local_path):
+        """Forget that local_path references a blob, e.g. after deleting it."""
+        with self._lock:
+            self._drop_ref(local_path)
+            self._save_index()
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry['size'] for entry in self._index.values())
+
+    def gc(self, max_bytes=None):
+        """Prune stale refs, then evict unreferenced blobs LRU-first until under the cap.
+
+        Returns the number of bytes freed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        freed = 0
+        with self._lock:
+            for key, entry in self._index.items():
+                blob_path = os.path.join(self.root, "objects", key[:2], key)
+                entry['refs'] = [ref for ref in entry['refs'] if _same_file(ref, blob_path, entry['size'])]
+
+            total = sum(entry['size'] for entry in self._index.values())
+            unreferenced = sorted((entry['last_used'], key) for key, entry in self._index.items() if not entry['refs'])
+            for _, key in unreferenced:
+                if max_bytes is not None and total <= max_bytes:
+                    break
+                entry = self._index.pop(key)
+                try:
+                    os.remove(os.path.join(self.root, "objects", key[:2], key))
+                except FileNotFoundError:
+                    pass
+                total -= entry['size']
+                freed += entry['size']
+            self._save_index()
+        return freed
+
+
+def _replace_with_link(src, dst):
+    """Atomically point dst at src's content, via a hard link when possible."""
+    tmp_path = dst + ".link.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def _same_file(ref, blob_path, size):
+    try:
+        ref_stat = os.stat(ref)
+        blob_stat = os.stat(blob_path)
+    except OSError:
+        return False
+    if (ref_stat.st_dev, ref_stat.st_ino) == (blob_stat.st_dev, blob_stat.st_ino):
+        return True
+    # Copied (not linked) refs are trusted while their size still matches
+    return ref_stat.st_size == size
+
+
+def get_store(downloads_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """Return the process-wide store under downloads_dir."""
+    root = os.path.abspath(os.path.join(downloads_dir, STORE_DIRNAME))
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = BlobStore(root, max_bytes)
+        return store
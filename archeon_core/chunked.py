@@ -0,0 +1,409 @@
+"""Bounded-memory reading and writing of .ply and .splat scenes.
+
+splats.load_scene decodes a whole file at once, which for a 10M-splat,
+SH degree 3 capture is several GB before any work starts. Here a scene is
+read in fixed-size windows of records, sized from a memory ceiling
+(ARCHEON_MEMORY_LIMIT, 512M by default), and every job below holds at most
+a few windows at a time:
+
+- scene_stats: splat count, bounds and opacity over all windows;
+- prune_scene: drop faint or oversized splats, passing the kept records
+  through unchanged (PLY properties, SH and all);
+- write_splat_stream: .ply/.splat to .splat, in source or progressive
+  order. Progressive order is an external sort: splats are spilled to
+  temporary files by groups of coarse Morton cells, each group is keyed
+  on its own (see ordering.progressive_keys), and the sorted groups are
+  merged window by window. The output matches ordering.reorder exactly.
+
+PeakMemory reports what a job actually used:
+
+    python -m archeon_core.chunked stats scene.ply
+    python -m archeon_core.chunked prune scene.ply pruned.ply --alpha 20 --memory-limit 256M
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from . import ordering, splats
+
+MIN_WINDOW = 4096
+# Decoded SplatData, float64 temporaries and the encoded copy, per splat on top of its record
+WORKING_BYTES_PER_SPLAT = 500
+# Everything progressive_keys allocates for one group, per splat
+GROUP_BYTES_PER_SPLAT = 600
+MAX_GROUPS = 256     # Spill files open at once
+HISTOGRAM_BITS = 15  # Morton prefix used to balance groups; 32768 buckets
+PLY_COUNT_DIGITS = 12  # The vertex count is zero-padded so it can be patched in place
+
+
+def parse_size(text):
+    """Bytes from '512M', '2G', '64K' or a plain number."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(float(text))
+    except ValueError:
+        raise ValueError(f"Invalid size: {text!r}")
+
+
+DEFAULT_MEMORY_LIMIT = parse_size(os.environ.get("ARCHEON_MEMORY_LIMIT", "512M"))
+
+
+def window_size(record_bytes, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Records per window for a job that may use memory_limit bytes."""
+    return max(MIN_WINDOW, memory_limit // (record_bytes + WORKING_BYTES_PER_SPLAT))
+
+
+def current_rss():
+    """Resident memory of this process in bytes, where the OS exposes it."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PeakMemory:
+    """Peak resident memory over a with-block, in bytes (peak; None if unknown).
+
+    On Linux the kernel's high-water mark is reset on entry, so the figure
+    belongs to the block. Elsewhere it is the process's lifetime peak, an
+    upper bound (exact for a one-job CLI run).
+    """
+
+    def __init__(self):
+        self.start = None
+        self.peak = None
+
+    def __enter__(self):
+        self.start = current_rss()
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        self.peak = self._high_water_mark()
+        return False
+
+    @staticmethod
+    def _high_water_mark():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        try:
+            import resource
+        except ImportError:  # Windows
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class SceneReader:
+    """Fixed-size windows of a .ply (INRIA v1) or .splat file's records."""
+
+    def __init__(self, path, sh_degree=0):
+        self.path = path
+        lower = path.lower()
+        if lower.endswith(".ply"):
+            self.header = splats.read_ply_header(path)
+            splats.check_vertex_layout(path, self.header)
+            self.dtype, self.offset, self.count = self.header.dtype, self.header.data_offset, self.header.vertex_count
+            self.sh_degree = min(sh_degree, self.header.sh_degree)
+        elif lower.endswith(".splat"):
+            self.header = None
+            self.dtype, self.offset = splats.splat_dtype(), 0
+            self.count = os.path.getsize(path) // splats.SPLAT_ROW_BYTES
+            self.sh_degree = 0
+        else:
+            raise ValueError(f"Unsupported scene format: {os.path.basename(path)}")
+
+    def decode(self, records):
+        if self.header is None:
+            return splats.decode_splat_rows(records)
+        return splats.decode_ply_vertices(records, self.header, self.sh_degree)
+
+    def windows(self, window):
+        """Yield each window's records as a fresh array; nothing stays mapped between windows."""
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for start in range(0, self.count, window):
+                expected = min(window, self.count - start)
+                records = np.fromfile(f, dtype=self.dtype, count=expected)
+                if len(records) < expected:
+                    raise ValueError(f"{os.path.basename(self.path)} is truncated after {start + len(records)} "
+                                     f"of {self.count} splats")
+                yield records
+
+
+class RecordWriter:
+    """Appends records to a file; the base class writes headerless .splat rows."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'wb')
+
+    def write_records(self, records):
+        records.tofile(self._file)
+        self.count += len(records)
+
+    def write(self, scene):
+        self.write_records(splats.encode_splat_rows(scene))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class PlyRecordWriter(RecordWriter):
+    """Binary PLY with one vertex element; the count is filled in on close."""
+
+    def __init__(self, path, properties):
+        super().__init__(path)
+        lines = ["ply", "format binary_little_endian 1.0", f"element vertex {0:0{PLY_COUNT_DIGITS}d}"]
+        lines += [f"property {ply_type} {name}" for name, ply_type in properties]
+        lines.append("end_header")
+        header = ("\n".join(lines) + "\n").encode('ascii')
+        self._count_offset = header.index(b"element vertex ") + len(b"element vertex ")
+        self._file.write(header)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.seek(self._count_offset)
+            self._file.write(f"{self.count:0{PLY_COUNT_DIGITS}d}".encode('ascii'))
+        super().close()
+
+
+def _visible(scene, alpha_threshold, max_scale=None):
+    keep = scene.colors[:, 3] >= alpha_threshold
+    if max_scale is not None:
+        keep &= scene.scales.max(axis=1) <= max_scale
+    return keep
+
+
+@dataclass
+class SceneStats:
+    splats: int
+    kept: int                 # Splats passing the alpha threshold
+    low: Optional[tuple]      # Bounds of the kept splats' centres
+    high: Optional[tuple]
+    mean_opacity: float       # 0-255, over all splats
+    sh_degree: int
+
+
+def scene_stats(path, alpha_threshold=1, memory_limit=DEFAULT_MEMORY_LIMIT):
+    reader = SceneReader(path)
+    kept, opacity_sum = 0, 0
+    low = high = None
+    for records in reader.windows(window_size(reader.dtype.itemsize, memory_limit)):
+        scene = reader.decode(records)
+        opacity_sum += int(scene.colors[:, 3].sum(dtype=np.int64))
+        centers = scene.centers[_visible(scene, alpha_threshold)].astype(np.float64)
+        kept += len(centers)
+        if len(centers):
+            low = centers.min(axis=0) if low is None else np.minimum(low, centers.min(axis=0))
+            high = centers.max(axis=0) if high is None else np.maximum(high, centers.max(axis=0))
+    sh_degree = 0
+    if reader.header is not None:
+        sh_degree = splats.stored_sh_degree(sum(1 for name in reader.dtype.names if name.startswith("f_rest")) // 3)
+    return SceneStats(reader.count, kept, None if low is None else tuple(low.tolist()),
+                      None if high is None else tuple(high.tolist()),
+                      opacity_sum / reader.count if reader.count else 0.0, sh_degree)
+
+
+def prune_scene(input_path, output_path, alpha_threshold=1, max_scale=None, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Copy the splats that pass the filters into a file of the same format; returns (input, kept) counts."""
+    if os.path.splitext(input_path)[1].lower() != os.path.splitext(output_path)[1].lower():
+        raise ValueError("Pruning keeps the input format; use the converter to change it")
+    reader = SceneReader(input_path)
+    tmp_path = output_path + ".tmp"
+    if reader.header is not None:
+        writer = PlyRecordWriter(tmp_path, reader.header.properties)
+    else:
+        writer = RecordWriter(tmp_path)
+    with writer:
+        for records in reader.windows(window_size(reader.dtype.itemsize, memory_limit)):
+            writer.write_records(records[_visible(reader.decode(records), alpha_threshold, max_scale)])
+    os.replace(tmp_path, output_path)
+    return reader.count, writer.count
+
+
+def write_splat_stream(input_path, output_path, alpha_threshold=1, order="progressive",
+                       memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Convert to .splat within memory_limit; returns (input, written) counts."""
+    reader = SceneReader(input_path)
+    window = window_size(reader.dtype.itemsize, memory_limit)
+    with RecordWriter(output_path) as writer:
+        if order == "progressive":
+            write_progressive_splat(reader, writer, alpha_threshold, window, memory_limit)
+        else:
+            for records in reader.windows(window):
+                scene = reader.decode(records)
+                writer.write(scene.subset(_visible(scene, alpha_threshold)))
+    return reader.count, writer.count
+
+
+def write_progressive_splat(reader, writer, alpha_threshold, window, memory_limit):
+    """Write reader's visible splats to writer in ordering.reorder's order, out of core."""
+    stats = scene_stats(reader.path, alpha_threshold, memory_limit)
+    if not stats.kept:
+        return
+    bits = ordering.MORTON_BITS
+    low = np.array(stats.low)
+    bounds = (low, (np.array(stats.high) - low).max() or 1.0)
+    coarse_bits = ordering.coarse_bits_for(stats.kept, bits)
+
+    # Groups are runs of whole coarse cells in Morton order, balanced by a histogram over a
+    # Morton prefix no finer than the coarse grid. A single prefix denser than the budget can't be split
+    prefix_bits = min(3 * coarse_bits, HISTOGRAM_BITS)
+    prefix_shift = np.uint64(3 * bits - prefix_bits)
+    histogram = np.zeros(1 << prefix_bits, dtype=np.int64)
+    for records in reader.windows(window):
+        scene = reader.decode(records)
+        centers = scene.centers[_visible(scene, alpha_threshold)]
+        histogram += np.bincount((ordering.morton_codes(centers, bits, bounds) >> prefix_shift).astype(np.int64),
+                                 minlength=len(histogram))
+    budget = max(memory_limit // GROUP_BYTES_PER_SPLAT, math.ceil(stats.kept / MAX_GROUPS))
+    group_of_prefix = (np.cumsum(histogram) - histogram) // budget
+    row_dtype = splats.splat_dtype()
+
+    with tempfile.TemporaryDirectory(prefix=".archeon-sort-", dir=os.path.dirname(writer.path) or ".") as tmp_dir:
+        def spill_path(group, kind):
+            return os.path.join(tmp_dir, f"{group}.{kind}")
+
+        # Encode the visible splats once and spill them by group, keeping source order within each
+        spills = {}
+        try:
+            for records in reader.windows(window):
+                scene = reader.decode(records)
+                scene = scene.subset(_visible(scene, alpha_threshold))
+                groups = group_of_prefix[(ordering.morton_codes(scene.centers, bits, bounds) >> prefix_shift)
+                                         .astype(np.int64)]
+                by_group = np.argsort(groups, kind='stable')
+                rows = splats.encode_splat_rows(scene)[by_group]
+                sorted_groups = groups[by_group]
+                starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+                for start, end in zip(starts, np.r_[starts[1:], len(rows)]):
+                    group = int(sorted_groups[start])
+                    if group not in spills:
+                        spills[group] = open(spill_path(group, "rows"), 'wb')
+                    rows[start:end].tofile(spills[group])
+        finally:
+            for f in spills.values():
+                f.close()
+
+        # Key and sort each group on its own. Round and Morton code pack into one
+        # uint64 (codes use 3 * MORTON_BITS = 48 bits), so runs merge on a single key
+        for group in spills:
+            rows = np.fromfile(spill_path(group, "rows"), dtype=row_dtype)
+            rounds, codes = ordering.progressive_keys(splats.decode_splat_rows(rows), bits, coarse_bits, bounds)
+            keys = rounds.astype(np.uint64) << np.uint64(3 * bits) | codes
+            order = np.argsort(keys, kind='stable')
+            keys[order].tofile(spill_path(group, "keys"))
+            rows[order].tofile(spill_path(group, "rows"))
+            del rows, rounds, codes, keys, order
+
+        # k-way merge. Emit everything up to the smallest of the runs' last buffered keys;
+        # equal keys share a Morton cell and so a group, which keeps the merge stable
+        chunk = max(1, window // len(spills))
+        runs = []
+        for group in sorted(spills):
+            runs.append({'keys': open(spill_path(group, "keys"), 'rb'), 'rows': open(spill_path(group, "rows"), 'rb'),
+                         'key_buffer': np.zeros(0, dtype=np.uint64), 'row_buffer': np.zeros(0, dtype=row_dtype)})
+        try:
+            while True:
+                for run in runs:
+                    if not len(run['key_buffer']) and not run['keys'].closed:
+                        run['key_buffer'] = np.fromfile(run['keys'], dtype=np.uint64, count=chunk)
+                        run['row_buffer'] = np.fromfile(run['rows'], dtype=row_dtype, count=chunk)
+                        if not len(run['key_buffer']):
+                            run['keys'].close()
+                            run['rows'].close()
+                live = [run for run in runs if len(run['key_buffer'])]
+                if not live:
+                    break
+                # Runs with more to read can only continue past their last buffered key
+                bound = min((run['key_buffer'][-1] for run in live if not run['keys'].closed), default=None)
+                keys, rows = [], []
+                for run in live:
+                    take = len(run['key_buffer']) if bound is None else \
+                        int(np.searchsorted(run['key_buffer'], bound, side='right'))
+                    keys.append(run['key_buffer'][:take])
+                    rows.append(run['row_buffer'][:take])
+                    run['key_buffer'], run['row_buffer'] = run['key_buffer'][take:], run['row_buffer'][take:]
+                keys, rows = np.concatenate(keys), np.concatenate(rows)
+                writer.write_records(rows[np.argsort(keys, kind='stable')])
+        finally:
+            for run in runs:
+                run['keys'].close()
+                run['rows'].close()
+
+
+def format_peak(peak):
+    if peak is None:
+        return "peak memory unknown"
+    return f"peak memory {peak / 1024 ** 2:.0f} MB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m archeon_core.chunked",
+                                     description="Inspect or prune .ply/.splat scenes within a memory ceiling.")
+    parser.add_argument("--memory-limit", type=parse_size, default=DEFAULT_MEMORY_LIMIT,
+                        help="Working memory per job, e.g. 256M or 2G")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_parser = commands.add_parser("stats", help="Splat count, bounds and opacity")
+    stats_parser.add_argument("input")
+    stats_parser.add_argument("--alpha", type=int, default=1, help="Opacity (0-255) a splat needs to count as kept")
+    prune_parser = commands.add_parser("prune", help="Drop faint or oversized splats")
+    prune_parser.add_argument("input")
+    prune_parser.add_argument("output")
+    prune_parser.add_argument("--alpha", type=int, default=1, help="Minimum opacity (0-255) to keep")
+    prune_parser.add_argument("--max-scale", type=float, default=None, help="Largest scale axis to keep")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        with PeakMemory() as memory:
+            if args.command == "stats":
+                stats = scene_stats(args.input, args.alpha, args.memory_limit)
+            else:
+                counts = prune_scene(args.input, args.output, args.alpha, args.max_scale, args.memory_limit)
+    except (OSError, ValueError) as e:
+        print(f"{args.command.capitalize()} failed: {e}", file=sys.stderr)
+        return 1
+    if args.command == "stats":
+        print(f"{stats.splats} splats, {stats.kept} with opacity >= {args.alpha}, SH degree {stats.sh_degree}, "
+              f"mean opacity {stats.mean_opacity:.0f}")
+        if stats.low is not None:
+            print("Bounds: " + " to ".join("(" + ", ".join(f"{v:.3f}" for v in corner) + ")"
+                                           for corner in (stats.low, stats.high)))
+    else:
+        print(f"Kept {counts[1]} of {counts[0]} splats in {args.output}")
+    print(f"{time.perf_counter() - start:.2f}s, {format_peak(memory.peak)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
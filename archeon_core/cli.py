@@ -0,0 +1,298 @@
+"""Headless command line: sync model libraries without the Streamlit app.
+
+    python -m archeon_core login EMAIL [--password-stdin]   remember an account
+    python -m archeon_core accounts                          list remembered accounts
+    python -m archeon_core logout EMAIL                      forget an account
+    python -m archeon_core sync [--account EMAIL ...] [--parallel 2] [--optimize] [--json]
+
+`sync` signs every remembered account (or just the --account ones) back in
+with its stored refresh token and syncs them in parallel into downloads/,
+sharing the blob store with the app, so it can run unattended from cron, a
+systemd timer or Task Scheduler:
+
+    0 6 * * *  cd /opt/archeon && python -m archeon_core sync --optimize --json >> sync.log
+
+With --json every event is one JSON object per line (start, progress, file,
+log, done, error, summary). The exit status is EXIT_OK when every account
+synced cleanly, EXIT_FAILED when any file or account failed, EXIT_AUTH when
+an account could no longer sign in, EXIT_USAGE for bad arguments or config
+and EXIT_INTERRUPTED after Ctrl+C or SIGTERM.
+"""
+import argparse
+import getpass
+import json
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from . import downloader, scheduler, sync, tokens, transport
+
+CONFIG_PATH = "firebase_config.json"
+DEFAULT_PARALLEL = 2
+PROGRESS_INTERVAL = 1.0
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_AUTH = 3
+EXIT_INTERRUPTED = 130
+
+
+class Reporter:
+    """Thread-safe event output, as JSON lines or as readable text."""
+
+    def __init__(self, as_json, stream=sys.stdout):
+        self.as_json = as_json
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event, account=None, **fields):
+        with self._lock:
+            if self.as_json:
+                record = {'ts': round(time.time(), 3), 'event': event}
+                if account is not None:
+                    record['account'] = account
+                record.update(fields)
+                self.stream.write(json.dumps(record) + "\n")
+            else:
+                self.stream.write(_format_text(event, account, fields) + "\n")
+            self.stream.flush()
+
+
+def _format_text(event, account, fields):
+    prefix = f"[{account}] " if account else ""
+    if event == "progress":
+        return (f"{prefix}{fields['percent']:5.1f}%  {downloader.format_bytes(fields['done_bytes'])} of "
+                f"{downloader.format_bytes(fields['total_bytes'])} ({fields['done_files']}/{fields['total_files']} files"
+                f"{', ' + str(fields['failed_files']) + ' failed' if fields.get('failed_files') else ''})")
+    if event == "done":
+        return (f"{prefix}Done: {fields['downloaded']} downloaded, {fields['linked']} linked, "
+                f"{fields['unchanged']} unchanged, {fields['deleted']} removed, {fields['failed']} failed "
+                f"in {fields['seconds']:.1f}s")
+    if event == "summary":
+        return f"{fields['ok']}/{fields['accounts']} account(s) synced cleanly (exit {fields['exit_code']})"
+    return prefix + str(fields.get('message', event))
+
+
+def load_config(path):
+    with open(path, 'r') as f:
+        config = json.load(f)
+    missing = [key for key in ('apiKey', 'storageBucket') if not config.get(key)]
+    if missing:
+        raise ValueError(f"{path} is missing {', '.join(missing)}")
+    return config
+
+
+def sync_one(account, config, store, args, reporter, control):
+    """Sign one remembered account in and sync it; returns an exit code."""
+    email = account['email'] or account['local_id']
+    manager = tokens.TokenManager(config['apiKey'], account['refresh_token'], local_id=account['local_id'],
+                                  email=account['email'], store=store)
+    try:
+        manager.id_token()
+    except tokens.AuthError as e:
+        reporter.emit("error", email, message=f"Sign-in failed ({e}); run 'login' again")
+        return EXIT_AUTH
+    except requests.exceptions.RequestException as e:
+        reporter.emit("error", email, message=f"Could not reach Firebase: {e}")
+        return EXIT_FAILED
+
+    progress = downloader.ByteProgress()
+    last_report = [0.0]
+
+    def report_progress(force=False):
+        now = time.monotonic()
+        if not force and now - last_report[0] < args.progress_interval:
+            return
+        last_report[0] = now
+        reporter.emit("progress", email, percent=100.0 * progress.fraction(), done_bytes=progress.done_bytes,
+                      total_bytes=progress.total_bytes, done_files=progress.done_files,
+                      total_files=progress.total_files, failed_files=progress.failed_files)
+
+    def on_result(result):
+        reporter.emit("file", email, path=result.task.cloud_path, ok=result.ok, error=result.error)
+
+    def log(level, message):
+        reporter.emit("log", email, level=level, message=message)
+
+    reporter.emit("start", email, user_id=manager.local_id, message=f"Syncing {sync.user_cloud_dir(manager.local_id)}")
+    start = time.perf_counter()
+    session = transport.get_session(manager)
+    try:
+        summary = sync.sync_account(session, transport.storage_base_url(config['storageBucket']), manager.local_id,
+                                    args.downloads, args.optimize, progress, control, log, on_result,
+                                    report_progress)
+    except downloader.TransferCancelled:
+        reporter.emit("error", email, message="Interrupted; partial downloads will resume next run")
+        return EXIT_INTERRUPTED
+    except tokens.AuthError as e:
+        reporter.emit("error", email, message=f"Sign-in expired during sync ({e})")
+        return EXIT_AUTH
+    except Exception as e:
+        reporter.emit("error", email, message=f"Sync failed: {e}")
+        return EXIT_FAILED
+    finally:
+        transport.close_session(manager)
+
+    report_progress(force=True)
+    artifacts_ok = summary.artifacts is None or summary.artifacts.ok
+    reporter.emit("done", email, ok=summary.ok and artifacts_ok, downloaded=len(summary.downloaded),
+                  linked=len(summary.linked), unchanged=summary.unchanged, deleted=len(summary.deleted),
+                  failed=len(summary.failed), failed_paths=summary.failed,
+                  seconds=round(time.perf_counter() - start, 3),
+                  optimized=None if summary.artifacts is None else {
+                      'built': len(summary.artifacts.built), 'cached': len(summary.artifacts.cached),
+                      'failed': len(summary.artifacts.failed), 'error': summary.artifacts.error})
+    return EXIT_OK if summary.ok and artifacts_ok else EXIT_FAILED
+
+
+def _combine(codes):
+    for code in (EXIT_INTERRUPTED, EXIT_AUTH, EXIT_FAILED):
+        if code in codes:
+            return code
+    return EXIT_OK
+
+
+def cmd_sync(args, config, store, reporter):
+    remembered = store.accounts()
+    if args.account:
+        wanted = {email.lower() for email in args.account}
+        accounts = [account for account in remembered if (account['email'] or "").lower() in wanted]
+        unknown = wanted - {(account['email'] or "").lower() for account in accounts}
+        for email in sorted(unknown):
+            reporter.emit("error", email, message="Not a remembered account; run 'login' first")
+        if unknown:
+            return EXIT_AUTH
+    else:
+        accounts = remembered
+    if not accounts:
+        reporter.emit("error", message="No remembered accounts; run 'python -m archeon_core login EMAIL' first")
+        return EXIT_USAGE
+
+    scheduler.get_scheduler().configure(args.max_transfers, args.workers, args.bandwidth, args.user_bandwidth)
+    controls = [downloader.TransferControl() for _ in accounts]
+
+    def stop(signum, frame):
+        for control in controls:
+            control.cancel()
+
+    previous = signal.signal(signal.SIGTERM, stop) if threading.current_thread() is threading.main_thread() else None
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+            futures = [pool.submit(sync_one, account, config, store, args, reporter, control)
+                       for account, control in zip(accounts, controls)]
+            while not all(future.done() for future in futures):
+                try:
+                    time.sleep(0.2)
+                except KeyboardInterrupt:
+                    stop(signal.SIGINT, None)
+            codes = [future.result() for future in futures]
+    finally:
+        if previous is not None:
+            signal.signal(signal.SIGTERM, previous)
+    if any(control.cancelled for control in controls):
+        codes.append(EXIT_INTERRUPTED)
+    exit_code = _combine(codes)
+    reporter.emit("summary", accounts=len(accounts), ok=codes.count(EXIT_OK), exit_code=exit_code)
+    return exit_code
+
+
+def cmd_login(args, config, store, reporter):
+    password = sys.stdin.readline().rstrip("\n") if args.password_stdin else getpass.getpass(f"Password for {args.email}: ")
+    try:
+        user = tokens.sign_in(config['apiKey'], args.email, password)
+    except tokens.AuthError as e:
+        reporter.emit("error", args.email, message=f"Sign-in failed: {e}")
+        return EXIT_AUTH
+    except requests.exceptions.RequestException as e:
+        reporter.emit("error", args.email, message=f"Could not reach Firebase: {e}")
+        return EXIT_FAILED
+    tokens.TokenManager.from_sign_in(config['apiKey'], user, store)
+    reporter.emit("login", args.email, user_id=user['localId'], message="Signed in and remembered")
+    return EXIT_OK
+
+
+def cmd_accounts(args, config, store, reporter):
+    for account in store.accounts():
+        reporter.emit("account", account['email'], user_id=account['local_id'],
+                      saved_at=account['saved_at'], message=f"{account['email']} ({account['local_id']})")
+    return EXIT_OK
+
+
+def cmd_logout(args, config, store, reporter):
+    matches = [account for account in store.accounts() if (account['email'] or "").lower() == args.email.lower()]
+    for account in matches:
+        store.forget(account['local_id'])
+    if not matches:
+        reporter.emit("error", args.email, message="Not a remembered account")
+        return EXIT_USAGE
+    reporter.emit("logout", args.email, message="Forgotten")
+    return EXIT_OK
+
+
+def _rate(text):
+    """Bytes per second from '500K', '20M', '1G' or a plain number."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(float(text))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate: {text!r}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m archeon_core",
+                                     description="Sync Archeon model libraries without the Streamlit app.")
+    parser.add_argument("--config", default=CONFIG_PATH, help="Firebase config JSON (default: %(default)s)")
+    parser.add_argument("--token-dir", default=tokens.TOKEN_DIR, help="Where remembered accounts are stored")
+    parser.add_argument("--json", action="store_true", help="Emit events as JSON lines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = commands.add_parser("sync", help="Sync remembered accounts")
+    sync_parser.add_argument("--account", action="append", metavar="EMAIL",
+                             help="Only sync this account; repeatable (default: all remembered)")
+    sync_parser.add_argument("--parallel", type=int, default=DEFAULT_PARALLEL, help="Accounts synced at once")
+    sync_parser.add_argument("--workers", type=int, default=scheduler.USER_TRANSFERS,
+                             help="Concurrent downloads per account")
+    sync_parser.add_argument("--max-transfers", type=int, default=scheduler.MAX_TRANSFERS,
+                             help="Concurrent downloads across all accounts")
+    sync_parser.add_argument("--bandwidth", type=_rate, default=scheduler.MAX_BANDWIDTH, metavar="RATE",
+                             help="Total download cap in bytes/s, e.g. 20M (default: unlimited)")
+    sync_parser.add_argument("--user-bandwidth", type=_rate, default=scheduler.USER_BANDWIDTH, metavar="RATE",
+                             help="Per-account download cap in bytes/s (default: unlimited)")
+    sync_parser.add_argument("--downloads", default=sync.DOWNLOADS_DIR, help="Downloads root (default: %(default)s)")
+    sync_parser.add_argument("--optimize", action="store_true", help="Build viewer artifacts after syncing")
+    sync_parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL,
+                             help="Seconds between progress events")
+    sync_parser.set_defaults(handler=cmd_sync)
+
+    login_parser = commands.add_parser("login", help="Sign in and remember an account")
+    login_parser.add_argument("email")
+    login_parser.add_argument("--password-stdin", action="store_true", help="Read the password from stdin")
+    login_parser.set_defaults(handler=cmd_login)
+
+    accounts_parser = commands.add_parser("accounts", help="List remembered accounts")
+    accounts_parser.set_defaults(handler=cmd_accounts)
+
+    logout_parser = commands.add_parser("logout", help="Forget a remembered account")
+    logout_parser.add_argument("email")
+    logout_parser.set_defaults(handler=cmd_logout)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reporter = Reporter(args.json)
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        reporter.emit("error", message=f"Could not load Firebase config: {e}")
+        return EXIT_USAGE
+    store = tokens.TokenStore(args.token_dir, config['apiKey'])
+    return args.handler(args, config, store, reporter)
@@ -0,0 +1,120 @@
+"""Convert .ply/.splat captures to .ksplat, .splat or .spz without Node.js.
+
+Takes the same options, in the same positional order, as
+web_viewer/GaussianSplats3D/util/create-ksplat.js:
+
+    python -m archeon_core.convert input.ply output.ksplat [compression level = 1]
+        [alpha removal threshold = 1] [scene center = "0,0,0"] [block size = 5.0]
+        [bucket size = 256] [spherical harmonics level = 0] [--order progressive|source]
+
+.splat and .spz output is written in progressive order (see ordering.py)
+unless --order source is given; .ksplat files keep the viewer's bucket layout.
+
+.splat output is produced window by window within --memory-limit (see
+chunked.py), so scenes larger than RAM convert. .ksplat buckets and .spz
+streams are laid out over the whole scene, so those formats still load it
+in full. Every conversion reports its peak memory.
+"""
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from . import chunked, ksplat, ordering, splats, spz
+
+OUTPUT_FORMATS = (".ksplat", ".splat", ".spz")
+ORDERS = ("progressive", "source")
+
+
+@dataclass
+class ConversionResult:
+    input_path: str
+    output_path: str
+    input_splats: int
+    output_splats: int
+    seconds: float
+    encoding: Optional[spz.EncodeResult] = None  # Set for .spz output
+    peak_rss: Optional[int] = None  # Bytes; see chunked.PeakMemory
+
+
+def parse_scene_center(value):
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 3:
+        raise ValueError(f"Scene center must be 'x,y,z', got '{value}'")
+    return tuple(parts)
+
+
+def convert_file(input_path, output_path, compression_level=ksplat.DEFAULT_COMPRESSION_LEVEL,
+                 alpha_threshold=ksplat.DEFAULT_ALPHA_THRESHOLD, scene_center=(0.0, 0.0, 0.0),
+                 block_size=ksplat.DEFAULT_BLOCK_SIZE, bucket_size=ksplat.DEFAULT_BUCKET_SIZE, sh_degree=0,
+                 order="progressive", workers=spz.DEFAULT_WORKERS, memory_limit=chunked.DEFAULT_MEMORY_LIMIT):
+    """Convert one scene; the output format follows output_path's extension."""
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {os.path.basename(output_path)}")
+
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    # Write beside the target and swap in, so readers never see a partial file
+    tmp_path = output_path + ".tmp"
+    encoding = None
+    with chunked.PeakMemory() as memory:
+        if extension == ".splat":
+            input_splats, written = chunked.write_splat_stream(input_path, tmp_path, alpha_threshold, order,
+                                                               memory_limit)
+        else:
+            scene = splats.load_scene(input_path, sh_degree)
+            input_splats = len(scene)
+            if extension == ".ksplat":
+                written = ksplat.write_ksplat(scene, tmp_path, compression_level, alpha_threshold, scene_center,
+                                              block_size, bucket_size)
+            else:
+                scene = scene.subset(scene.colors[:, 3] >= alpha_threshold)
+                if order == "progressive":
+                    scene = ordering.reorder(scene)
+                encoding = spz.encode_spz(scene, tmp_path, workers)
+                written = len(scene)
+            del scene
+    os.replace(tmp_path, output_path)
+    return ConversionResult(input_path, output_path, input_splats, written, time.perf_counter() - start, encoding,
+                            memory.peak)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m archeon_core.convert",
+                                     description="Convert a .ply or .splat scene to .ksplat, .splat or .spz.")
+    parser.add_argument("input", help="Path to a .ply or .splat file")
+    parser.add_argument("output", help="Output .ksplat, .splat or .spz file")
+    parser.add_argument("compression_level", nargs="?", type=int, default=ksplat.DEFAULT_COMPRESSION_LEVEL,
+                        choices=ksplat.COMPRESSION_LEVELS)
+    parser.add_argument("alpha_threshold", nargs="?", type=int, default=ksplat.DEFAULT_ALPHA_THRESHOLD)
+    parser.add_argument("scene_center", nargs="?", type=parse_scene_center, default=(0.0, 0.0, 0.0))
+    parser.add_argument("block_size", nargs="?", type=float, default=ksplat.DEFAULT_BLOCK_SIZE)
+    parser.add_argument("bucket_size", nargs="?", type=int, default=ksplat.DEFAULT_BUCKET_SIZE)
+    parser.add_argument("sh_degree", nargs="?", type=int, default=0, choices=(0, 1, 2))
+    parser.add_argument("--order", default="progressive", choices=ORDERS,
+                        help="Splat order for .splat and .spz output")
+    parser.add_argument("--workers", type=int, default=spz.DEFAULT_WORKERS, help="Threads for .spz encoding")
+    parser.add_argument("--memory-limit", type=chunked.parse_size, default=chunked.DEFAULT_MEMORY_LIMIT,
+                        help="Working memory for .splat output, e.g. 256M or 2G")
+    args = parser.parse_args(argv)
+
+    try:
+        result = convert_file(args.input, args.output, args.compression_level, args.alpha_threshold,
+                              args.scene_center, args.block_size, args.bucket_size, args.sh_degree, args.order,
+                              args.workers, args.memory_limit)
+    except (OSError, ValueError) as e:
+        print(f"Conversion failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Wrote {result.output_splats} splats to {result.output_path} in {result.seconds:.2f}s, "
+          f"{chunked.format_peak(result.peak_rss)}")
+    if result.encoding is not None:
+        print(f"SPZ: {result.encoding.ratio:.1f}x smaller than float32, "
+              f"encoded at {result.encoding.throughput / 1e6:.0f} MB/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,502 @@
+"""Concurrent, streamed and resumable downloads of Firebase Storage objects.
+
+Each object is streamed in chunks to a hidden partial file next to its final
+location and atomically renamed into place once complete and verified, so a
+crashed or cancelled transfer never leaves a truncated model behind and the
+next run picks up where it stopped.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from urllib.parse import quote
+
+import requests
+
+from . import telemetry
+from .manifest import md5_base64
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_WORKERS = 4
+REQUEST_TIMEOUT = (10, 60)  # (connect, read) seconds
+MAX_ATTEMPTS = 5
+BACKOFF_FACTOR = 1.0
+CHECKPOINT_BYTES = 4 * 1024 * 1024    # Persist range progress this often
+PARALLEL_THRESHOLD = 64 * 1024 * 1024  # Split larger objects into parallel ranges
+MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+MAX_SEGMENTS = 4
+RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+
+@dataclass
+class DownloadTask:
+    cloud_path: str
+    local_path: str
+    size: Optional[int] = None  # Expected size in bytes, if known up front
+    md5_hash: Optional[str] = None  # Base64 md5Hash from the object metadata
+    generation: Optional[str] = None
+
+
+@dataclass
+class Segment:
+    start: int
+    end: Optional[int]  # Inclusive; None means "to the end of the object"
+    written: int = 0
+
+
+@dataclass
+class DownloadResult:
+    task: DownloadTask
+    ok: bool
+    error: Optional[str] = None
+
+
+class TransferCancelled(Exception):
+    pass
+
+
+class LiveTransfer:
+    """A download in progress whose partial file can be read while it grows."""
+
+    def __init__(self, part_path, size, segments):
+        self.part_path = part_path
+        self.size = size
+        self.segments = segments
+        self.finished = threading.Event()
+        self.ok = False
+
+    def available(self):
+        """Bytes readable from the start of the partial file without gaps."""
+        if self.finished.is_set() and self.ok:
+            return self.size
+        offset = 0
+        for segment in sorted(self.segments, key=lambda segment: segment.start):
+            if segment.start != offset:
+                break
+            offset = segment.start + segment.written
+            if segment.end is None or offset <= segment.end:
+                break
+        return offset
+
+
+_live = {}  # abspath(local_path) -> LiveTransfer while the object downloads
+_live_lock = threading.Lock()
+
+
+def live_transfer(local_path):
+    """The in-progress download for local_path, or None."""
+    with _live_lock:
+        return _live.get(os.path.abspath(local_path))
+
+
+def available_bytes(local_path, live_only=False):
+    """Bytes of local_path readable from the start now, finished or still downloading.
+
+    With live_only, only a running download counts: while a newer version
+    is queued, the outdated file on disk must not pass for its first bytes.
+    """
+    live = live_transfer(local_path)
+    if live is not None:
+        return live.available()
+    if live_only:
+        return 0
+    try:
+        return os.path.getsize(local_path)
+    except OSError:
+        return 0
+
+
+class TransferControl:
+    """Pause/resume/cancel switch checked by download workers between chunks."""
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # Wake paused workers so they can exit
+
+    def sleep(self, seconds):
+        """Sleep for up to seconds, waking early if cancelled."""
+        self._cancelled.wait(seconds)
+
+    def check(self):
+        """Block while paused; raise TransferCancelled once cancelled."""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise TransferCancelled()
+
+
+class ByteProgress:
+    """Thread-safe byte and file counters shared by all download workers."""
+
+    def __init__(self, total_bytes=0, total_files=0):
+        self._lock = threading.Lock()
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.total_files = total_files
+        self.done_files = 0
+        self.failed_files = 0
+
+    def add_total(self, nbytes):
+        with self._lock:
+            self.total_bytes += nbytes
+
+    def advance(self, nbytes):
+        with self._lock:
+            self.done_bytes += nbytes
+
+    def file_done(self):
+        with self._lock:
+            self.done_files += 1
+
+    def file_failed(self):
+        with self._lock:
+            self.failed_files += 1
+
+    def fraction(self):
+        with self._lock:
+            if self.total_bytes > 0:
+                return min(self.done_bytes / self.total_bytes, 1.0)
+            if self.total_files > 0:
+                return self.done_files / self.total_files
+            return 0.0
+
+
+def object_url(base_url, cloud_path):
+    return f"{base_url}/{quote(cloud_path, safe='')}"
+
+
+def media_url(base_url, cloud_path):
+    return object_url(base_url, cloud_path) + "?alt=media"
+
+
+def partial_paths(local_path):
+    """Return (partial file, sidecar state file) paths for a download."""
+    directory, name = os.path.split(local_path)
+    part_path = os.path.join(directory, f".{name}.part")
+    return part_path, part_path + ".json"
+
+
+def _plan_segments(size, parallel=True):
+    if size is None or size < PARALLEL_THRESHOLD or not parallel:
+        return [Segment(0, None if size is None else size - 1)]
+    count = min(MAX_SEGMENTS, max(1, size // MIN_SEGMENT_SIZE))
+    step = -(-size // count)
+    return [Segment(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+def _load_state(state_path, part_path, task):
+    """Return saved segments if the partial belongs to the same object version."""
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not os.path.exists(part_path):
+        return None
+    if (state.get('size'), state.get('md5Hash'), state.get('generation')) != (task.size, task.md5_hash, task.generation):
+        return None
+    return [Segment(*segment) for segment in state.get('segments', [])] or None
+
+
+def _save_state(state_path, part_path, task, segments):
+    """Record range progress, after making the bytes it vouches for durable.
+
+    Segments write unbuffered, so everything counted in segment.written is
+    already with the OS; fsyncing the part file first means a resume after
+    a crash never skips ranges that only ever reached the page cache.
+    """
+    written = [[s.start, s.end, s.written] for s in segments]
+    fd = os.open(part_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'size': task.size,
+            'md5Hash': task.md5_hash,
+            'generation': task.generation,
+            'segments': written,
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, state_path)
+
+
+def _fetch_segment(session, url, part_path, segment, checkpoint, progress, chunk_size, stats=None):
+    """Download one byte range into part_path, resuming after dropped connections.
+
+    stats, if given, collects this segment's retries, last HTTP status, time
+    to first response and disk write time for telemetry.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(retries=0, status=None, ttfb=None, write_seconds=0.0)
+    attempt = 0
+    while True:
+        start = segment.start + segment.written
+        if segment.end is not None and start > segment.end:
+            return
+        headers = {}
+        if start > 0 or segment.end is not None:
+            headers['Range'] = f"bytes={start}-" + ("" if segment.end is None else str(segment.end))
+        try:
+            request_start = time.perf_counter()
+            with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                elapsed = time.perf_counter() - request_start
+                stats['retries'] += telemetry.record_response("media", response, elapsed)
+                stats['status'] = response.status_code
+                if stats['ttfb'] is None:
+                    stats['ttfb'] = elapsed
+                if response.status_code == 416 and segment.end is None:
+                    return  # Open-ended range already fully written
+                if response.status_code == 200 and headers:
+                    # Server ignored the Range header; only a whole-file segment can use this
+                    if segment.start != 0 or segment.end is not None and segment.end + 1 < _content_length(response):
+                        raise IOError("Server does not support range requests")
+                    if progress is not None:
+                        progress.advance(-segment.written)
+                    segment.written = 0
+                    start = 0
+                response.raise_for_status()
+                # Unbuffered, so a chunk is with the OS before segment.written counts it
+                with open(part_path, 'r+b', buffering=0) as f:
+                    f.seek(start)
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        write_start = time.perf_counter()
+                        view = memoryview(chunk)
+                        while view:  # Raw writes may be partial
+                            view = view[f.write(view):]
+                        stats['write_seconds'] += time.perf_counter() - write_start
+                        telemetry.registry.inc('archeon_download_bytes_total', len(chunk))
+                        segment.written += len(chunk)
+                        if progress is not None:
+                            progress.advance(len(chunk))
+                        checkpoint(len(chunk))
+            if segment.end is None or segment.start + segment.written > segment.end:
+                return
+            raise requests.exceptions.ChunkedEncodingError("Connection closed before range completed")
+        except RETRYABLE_ERRORS:
+            attempt += 1
+            telemetry.record_error("media", retried=attempt < MAX_ATTEMPTS)
+            if attempt >= MAX_ATTEMPTS:
+                raise
+            stats['retries'] += 1
+            time.sleep(BACKOFF_FACTOR * (2 ** (attempt - 1)))
+
+
+def _content_length(response):
+    length = response.headers.get('Content-Length', '')
+    return int(length) if length.isdigit() else 0
+
+
+def download_object(session, base_url, task, progress=None, chunk_size=CHUNK_SIZE, control=None, throttle=None,
+                    sequential=False):
+    """Download one object resumably and rename it over task.local_path.
+
+    Bytes land in a hidden .part file whose sidecar records the expected
+    size, md5Hash and generation plus per-range progress. A later call for
+    the same object version continues each range from its last byte with an
+    HTTP Range request; large objects are fetched as parallel ranges. The
+    finished file is checked against size and md5 before it is moved into
+    place. throttle(nbytes), if given, is called after every chunk and may
+    block to hold the transfer to a bandwidth cap.
+
+    While it runs the transfer is published as a LiveTransfer, so the model
+    server can stream the partial file to a viewer. sequential fetches a new
+    download as one range, so it fills the file front to back.
+    """
+    if control is not None:
+        control.check()
+    directory = os.path.dirname(task.local_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    part_path, state_path = partial_paths(task.local_path)
+    url = media_url(base_url, task.cloud_path)
+
+    segments = _load_state(state_path, part_path, task)
+    if segments is None:
+        segments = _plan_segments(task.size, parallel=not sequential)
+        with open(part_path, 'wb') as f:
+            if task.size:
+                f.truncate(task.size)
+        _save_state(state_path, part_path, task, segments)
+
+    resumed = sum(segment.written for segment in segments)
+    if progress is not None and resumed:
+        progress.advance(resumed)
+
+    lock = threading.Lock()
+    unsaved = [0]
+    stats = [{} for _ in segments]
+    started = time.perf_counter()
+    verify_seconds = 0.0
+    result = "error"
+    telemetry.registry.inc('archeon_active_transfers')
+    live = LiveTransfer(part_path, task.size, segments)
+    live_key = os.path.abspath(task.local_path)
+    with _live_lock:
+        _live[live_key] = live
+
+    def checkpoint(nbytes):
+        if throttle is not None:
+            throttle(nbytes)
+        if control is not None:
+            control.check()
+        with lock:
+            unsaved[0] += nbytes
+            if unsaved[0] >= CHECKPOINT_BYTES:
+                unsaved[0] = 0
+                _save_state(state_path, part_path, task, segments)
+
+    try:
+        try:
+            if len(segments) == 1:
+                _fetch_segment(session, url, part_path, segments[0], checkpoint, progress, chunk_size, stats[0])
+            else:
+                with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+                    futures = [telemetry.submit(pool, _fetch_segment, session, url, part_path, segment,
+                                                checkpoint, progress, chunk_size, segment_stats)
+                               for segment, segment_stats in zip(segments, stats)]
+                    for future in futures:
+                        future.result()
+        finally:
+            with lock:
+                _save_state(state_path, part_path, task, segments)
+
+        if task.size is None and progress is not None:
+            progress.add_total(os.path.getsize(part_path))
+        if task.size is not None and os.path.getsize(part_path) != task.size:
+            raise IOError(f"Size mismatch for {task.cloud_path}")
+        if task.md5_hash:
+            verify_start = time.perf_counter()
+            digest = md5_base64(part_path)
+            verify_seconds = time.perf_counter() - verify_start
+            if digest != task.md5_hash:
+                # Corrupt data can't be resumed; start clean next time
+                os.remove(part_path)
+                os.remove(state_path)
+                raise IOError(f"Checksum mismatch for {task.cloud_path}")
+
+        os.replace(part_path, task.local_path)
+        os.remove(state_path)
+        live.ok = True
+        result = "ok"
+        if progress is not None:
+            progress.file_done()
+    except BaseException as e:
+        result = "cancelled" if isinstance(e, TransferCancelled) else "error"
+        # The partial file is kept for resuming, but it doesn't count as progress yet
+        if progress is not None:
+            progress.advance(-sum(segment.written for segment in segments))
+            if result == "error":
+                progress.file_failed()
+        raise
+    finally:
+        with _live_lock:
+            if _live.get(live_key) is live:
+                del _live[live_key]
+        live.finished.set()
+        _record_transfer(task, segments, stats, resumed, time.perf_counter() - started, verify_seconds, result)
+
+
+def _record_transfer(task, segments, stats, resumed, seconds, verify_seconds, result):
+    telemetry.registry.inc('archeon_active_transfers', -1)
+    telemetry.registry.inc('archeon_download_files_total', result=result)
+    telemetry.registry.observe('archeon_download_seconds', seconds)
+    write_seconds = sum(segment_stats.get('write_seconds', 0.0) for segment_stats in stats)
+    telemetry.registry.inc('archeon_write_seconds_total', write_seconds)
+    telemetry.registry.inc('archeon_verify_seconds_total', verify_seconds)
+    received = sum(segment.written for segment in segments) - resumed
+    ttfbs = [segment_stats['ttfb'] for segment_stats in stats if segment_stats.get('ttfb') is not None]
+    statuses = [segment_stats['status'] for segment_stats in stats if segment_stats.get('status') is not None]
+    telemetry.event(
+        "transfer", file=task.cloud_path, result=result, bytes=received, resumed_bytes=resumed,
+        seconds=round(seconds, 6), mb_per_s=round(received / 1024 ** 2 / seconds, 3) if seconds else None,
+        ttfb_ms=round(min(ttfbs) * 1000, 3) if ttfbs else None,
+        retries=sum(segment_stats.get('retries', 0) for segment_stats in stats),
+        status=max(statuses) if statuses else None, segments=len(segments),
+        write_ms=round(write_seconds * 1000, 3), verify_ms=round(verify_seconds * 1000, 3))
+
+
+def download_many(session, base_url, tasks, progress=None, workers=DEFAULT_WORKERS, control=None,
+                  on_result: Optional[Callable[[DownloadResult], None]] = None,
+                  on_tick: Optional[Callable[[], None]] = None, tick_interval=0.25,
+                  scheduler=None, owner=None) -> List[DownloadResult]:
+    """Download tasks with a bounded worker pool over one pooled session.
+
+    Callbacks run on the calling thread: on_result once per finished task and
+    on_tick roughly every tick_interval seconds, which lets a UI redraw
+    progress without touching it from worker threads. A TransferControl, if
+    given, pauses or cancels every worker; partial files stay resumable.
+
+    With a scheduler (see scheduler.py) the tasks are queued there as owner's
+    instead, sharing its slots and bandwidth caps with every other sync in
+    the process, and workers is ignored.
+    """
+    results = []
+    if not tasks:
+        return results
+
+    if scheduler is not None:
+        pending = {scheduler.submit(owner, session, base_url, task, progress, control): task for task in tasks}
+        _collect(pending, results, control, on_result, on_tick, tick_interval)
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {telemetry.submit(pool, download_object, session, base_url, task, progress,
+                                    control=control): task for task in tasks}
+        _collect(pending, results, control, on_result, on_tick, tick_interval)
+    return results
+
+
+def _collect(pending, results, control, on_result, on_tick, tick_interval):
+    while pending:
+        if control is not None and control.cancelled:
+            # Drop transfers still waiting for a slot or for another user's copy
+            for future in pending:
+                future.cancel()
+        done, _ = wait(pending, timeout=tick_interval, return_when=FIRST_COMPLETED)
+        for future in done:
+            task = pending.pop(future)
+            error = TransferCancelled() if future.cancelled() else future.exception()
+            result = DownloadResult(task, error is None, None if error is None else str(error))
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+        if on_tick is not None:
+            on_tick()
+
+
+def format_bytes(nbytes):
+    size = float(nbytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
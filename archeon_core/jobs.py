@@ -0,0 +1,139 @@
+"""Process-wide registry of background sync jobs.
+
+Jobs run on daemon worker threads owned by this module rather than by a
+Streamlit script run, so widget interactions and page reruns neither block
+nor kill a transfer. The UI only reads job state, which is cheap enough to
+poll every second.
+"""
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+from .downloader import ByteProgress, TransferControl
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+MAX_CONCURRENT_JOBS = 8  # Transfers themselves are bounded by scheduler.py
+MAX_MESSAGES = 200
+MAX_HISTORY = 5  # Finished jobs kept per owner for display
+
+
+class SyncJob:
+    def __init__(self, job_id, owner, target):
+        self.id = job_id
+        self.owner = owner
+        self.progress = ByteProgress()
+        self.control = TransferControl()
+        self.messages = deque(maxlen=MAX_MESSAGES)
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._target = target
+        self._state = QUEUED
+
+    @property
+    def state(self):
+        if self._state == RUNNING and self.control.paused:
+            return PAUSED
+        return self._state
+
+    @property
+    def finished(self):
+        return self._state in FINISHED_STATES
+
+    def log(self, level, message):
+        self.messages.append((time.time(), level, message))
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def _run(self):
+        if self.control.cancelled:
+            self._state = CANCELLED
+            return
+        self._state = RUNNING
+        self.started_at = time.time()
+        try:
+            self.result = self._target(self)
+            self._state = CANCELLED if self.control.cancelled else DONE
+        except Exception as e:
+            self.error = str(e)
+            self._state = CANCELLED if self.control.cancelled else FAILED
+            self.log("error", f"Sync failed: {e}")
+        finally:
+            self.finished_at = time.time()
+
+
+class JobRegistry:
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._workers = []
+        self._max_concurrent = max_concurrent
+
+    def _ensure_workers(self):
+        while len(self._workers) < self._max_concurrent:
+            worker = threading.Thread(target=self._work, name=f"archeon-sync-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job._run()
+            finally:
+                self._queue.task_done()
+
+    def submit(self, owner, target):
+        """Queue target(job) for owner, or return owner's job already in flight."""
+        with self._lock:
+            active = self.active_for(owner)
+            if active is not None:
+                return active
+            finished = sorted((job for job in self.jobs_for(owner) if job.finished), key=lambda job: job.id)
+            for stale in finished[:-MAX_HISTORY]:
+                del self._jobs[stale.id]
+            job = SyncJob(next(self._ids), owner, target)
+            self._jobs[job.id] = job
+            self._ensure_workers()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs_for(self, owner):
+        return [job for job in list(self._jobs.values()) if job.owner == owner]
+
+    def active_for(self, owner):
+        for job in self.jobs_for(owner):
+            if not job.finished:
+                return job
+        return None
+
+    def latest_for(self, owner):
+        jobs = self.jobs_for(owner)
+        return max(jobs, key=lambda job: job.id) if jobs else None
+
+
+# Shared by every Streamlit session in this process
+registry = JobRegistry()
@@ -0,0 +1,209 @@
+"""Vectorized .ksplat writer compatible with the GaussianSplats3D viewer.
+
+Produces the same single-section layout as SplatBuffer.generateFromUncompressedSplatArrays
+(used by util/create-ksplat.js): splats are ordered by distance from the
+scene centre, filtered by opacity, grouped into spatial buckets and encoded
+at compression level 0 (float32), 1 (half floats, 16-bit bucket-relative
+positions) or 2 (level 1 with 8-bit SH).
+"""
+import numpy as np
+
+HEADER_BYTES = 4096
+SECTION_HEADER_BYTES = 1024
+BUCKET_STORAGE_BYTES = 12
+VERSION = (0, 1)
+
+COMPRESSION_LEVELS = (0, 1, 2)
+SCALE_RANGE = {0: 1, 1: 32767, 2: 32767}
+SH_HALF_RANGE = 1.5  # Default 8-bit SH range when a scene has no SH data
+HALF_FLOAT_MAX = 65504.0
+PARTITION_CLAMP = 0.5  # Grid used by SplatPartitioner when ordering by distance
+
+DEFAULT_COMPRESSION_LEVEL = 1
+DEFAULT_ALPHA_THRESHOLD = 1
+DEFAULT_BLOCK_SIZE = 5.0
+DEFAULT_BUCKET_SIZE = 256
+
+
+def splat_record_dtype(compression_level, sh_components):
+    """Packed per-splat record for a compression level."""
+    if compression_level == 0:
+        fields = [('center', '<f4', 3), ('scale', '<f4', 3), ('rotation', '<f4', 4), ('color', 'u1', 4)]
+        sh_type = '<f4'
+    else:
+        fields = [('center', '<u2', 3), ('scale', '<f2', 3), ('rotation', '<f2', 4), ('color', 'u1', 4)]
+        sh_type = '<f2' if compression_level == 1 else 'u1'
+    if sh_components:
+        fields.append(('sh', sh_type, sh_components))
+    return np.dtype(fields)
+
+
+def partition_order(centers, scene_center):
+    """Stable order by clamped squared distance from the scene centre (SplatPartitioner)."""
+    offset = np.floor((centers.astype(np.float64) - scene_center) / PARTITION_CLAMP) * PARTITION_CLAMP
+    return np.argsort(np.sum(offset * offset, axis=1), kind='stable')
+
+
+def compute_buckets(centers, block_size, bucket_size):
+    """Group splats into spatial buckets the way the viewer's SplatBuffer does.
+
+    Returns (order, bucket_centers, partial_lengths, full_count): order lists
+    splat indices bucket by bucket, full buckets first in the order they
+    filled up, then partially filled buckets by ascending block id.
+    """
+    count = len(centers)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros(0, dtype=np.uint32), 0
+    points = centers.astype(np.float64)
+    low = points.min(axis=0)
+    dimensions = points.max(axis=0) - low
+    y_blocks, z_blocks = np.ceil(dimensions[1:] / block_size)
+    blocks = np.floor((points - low) / block_size)
+    ids = (blocks[:, 0] * (y_blocks * z_blocks) + blocks[:, 1] * z_blocks + blocks[:, 2]).astype(np.int64)
+
+    # Rank of each splat within its block, in input order
+    by_id = np.argsort(ids, kind='stable')
+    sorted_ids = ids[by_id]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    group_sizes = np.diff(np.r_[starts, count])
+    group = np.repeat(np.arange(len(starts)), group_sizes)
+    rank = np.arange(count) - starts[group]
+    chunk = rank // bucket_size
+
+    full_per_group = group_sizes // bucket_size
+    full_offsets = np.r_[0, np.cumsum(full_per_group)[:-1]]
+    is_full = chunk < full_per_group[group]
+    full_count = int(full_per_group.sum())
+
+    # A full bucket is emitted when its last splat arrives
+    completes = is_full & (rank % bucket_size == bucket_size - 1)
+    completion_rank = np.empty(full_count, dtype=np.int64)
+    completion_rank[np.argsort(by_id[completes], kind='stable')] = np.arange(full_count)
+
+    partial_groups = np.flatnonzero(group_sizes % bucket_size)
+    partial_index = np.full(len(starts), -1, dtype=np.int64)
+    partial_index[partial_groups] = np.arange(len(partial_groups))
+
+    bucket_of = full_count + partial_index[group]
+    bucket_of[is_full] = completion_rank[full_offsets[group[is_full]] + chunk[is_full]]
+    within = np.lexsort((by_id, bucket_of))
+    order = by_id[within]
+
+    # Centre of each bucket's block, taken from its first splat
+    bucket_starts = np.flatnonzero(np.r_[True, np.diff(bucket_of[within]) != 0])
+    bucket_centers = blocks[order[bucket_starts]] * block_size + low + block_size / 2.0
+    partial_lengths = (group_sizes[partial_groups] % bucket_size).astype(np.uint32)
+    return order, bucket_centers, partial_lengths, full_count
+
+
+def sh_range(sh):
+    """Min/max over the first 23 SH coefficients, falling back to the default range."""
+    values = sh[:, :23]
+    if values.size == 0:
+        return -SH_HALF_RANGE, SH_HALF_RANGE
+    # The viewer treats a zero bound as missing
+    return float(values.min()) or -SH_HALF_RANGE, float(values.max()) or SH_HALF_RANGE
+
+
+def _half(values):
+    return np.clip(values, -HALF_FLOAT_MAX, HALF_FLOAT_MAX).astype(np.float16)
+
+
+def encode_splats(splats, order, bucket_of_splat, bucket_centers, compression_level, block_size, sh_min, sh_max):
+    """Encode splats (in output order) as packed ksplat records."""
+    sh_components = splats.sh.shape[1]
+    records = np.zeros(len(order), dtype=splat_record_dtype(compression_level, sh_components))
+    centers = splats.centers[order]
+    scales = splats.scales[order]
+    rotations = splats.rotations[order]
+    records['color'] = splats.colors[order]
+    sh = splats.sh[order] if sh_components else None
+
+    if compression_level == 0:
+        records['center'] = centers
+        records['scale'] = scales
+        records['rotation'] = rotations
+        if sh is not None:
+            records['sh'] = sh
+        return records
+
+    scale_range = SCALE_RANGE[compression_level]
+    factor = scale_range / (block_size * 0.5)
+    delta = centers.astype(np.float64) - bucket_centers[bucket_of_splat]
+    # Math.round rounds halves up
+    quantized = np.floor(delta * factor + 0.5) + scale_range
+    records['center'] = np.clip(quantized, 0, 2 * scale_range + 1).astype(np.uint16)
+    records['scale'] = _half(scales)
+    records['rotation'] = _half(rotations)
+    if sh is not None:
+        if compression_level == 1:
+            records['sh'] = _half(sh)
+        else:
+            normalized = (np.clip(sh, sh_min, sh_max) - sh_min) / (sh_max - sh_min)
+            records['sh'] = np.clip(np.floor(normalized * 255), 0, 255).astype(np.uint8)
+    return records
+
+
+def _header(splat_count, compression_level, scene_center, sh_min, sh_max):
+    header = bytearray(HEADER_BYTES)
+    np.frombuffer(header, dtype=np.uint8, count=2)[:] = VERSION
+    u32 = np.frombuffer(header, dtype='<u4')
+    u32[1:5] = (1, 1, splat_count, splat_count)
+    np.frombuffer(header, dtype='<u2')[10] = compression_level
+    f32 = np.frombuffer(header, dtype='<f4')
+    f32[6:9] = scene_center
+    f32[9:11] = (sh_min, sh_max)
+    return header
+
+
+def _section_header(splat_count, compression_level, sh_degree, bucket_size, bucket_count, block_size,
+                    storage_bytes, full_count, partial_count):
+    header = bytearray(SECTION_HEADER_BYTES)
+    u32 = np.frombuffer(header, dtype='<u4')
+    u16 = np.frombuffer(header, dtype='<u2')
+    u32[0:2] = (splat_count, splat_count)
+    u32[7] = storage_bytes
+    if compression_level >= 1:
+        u32[2:4] = (bucket_size, bucket_count)
+        np.frombuffer(header, dtype='<f4')[4] = block_size
+        u16[10] = BUCKET_STORAGE_BYTES
+        u32[6] = SCALE_RANGE[compression_level]
+        u32[8:10] = (full_count, partial_count)
+    u16[20] = sh_degree
+    return header
+
+
+def write_ksplat(splats, path, compression_level=DEFAULT_COMPRESSION_LEVEL, alpha_threshold=DEFAULT_ALPHA_THRESHOLD,
+                 scene_center=(0.0, 0.0, 0.0), block_size=DEFAULT_BLOCK_SIZE, bucket_size=DEFAULT_BUCKET_SIZE):
+    """Write splats as a single-section .ksplat file; returns the number of splats written."""
+    if compression_level not in COMPRESSION_LEVELS:
+        raise ValueError(f"Unsupported compression level: {compression_level}")
+    if splats.sh_degree > 2:
+        raise ValueError("ksplat files support at most SH degree 2")
+    scene_center = np.asarray(scene_center, dtype=np.float64)
+    sh_min, sh_max = sh_range(splats.sh)
+
+    # Compose the partition, alpha filter and bucket orders so the splat
+    # attributes are only gathered once, in encode_splats
+    order = partition_order(splats.centers, scene_center)
+    order = order[splats.colors[order, 3] >= alpha_threshold]
+    bucket_order, bucket_centers, partial_lengths, full_count = compute_buckets(splats.centers[order], block_size,
+                                                                                bucket_size)
+    order = order[bucket_order]
+    bucket_sizes = np.r_[np.full(full_count, bucket_size), partial_lengths].astype(np.int64)
+    bucket_of_splat = np.repeat(np.arange(len(bucket_sizes)), bucket_sizes)
+    records = encode_splats(splats, order, bucket_of_splat, bucket_centers, compression_level,
+                            block_size, sh_min, sh_max)
+
+    bucket_bytes = b""
+    if compression_level >= 1:
+        bucket_bytes = partial_lengths.astype('<u4').tobytes() + bucket_centers.astype('<f4').tobytes()
+    storage_bytes = len(bucket_bytes) + records.nbytes
+
+    with open(path, 'wb') as f:
+        f.write(_header(len(records), compression_level, scene_center, sh_min, sh_max))
+        f.write(_section_header(len(records), compression_level, splats.sh_degree, bucket_size,
+                                len(bucket_sizes), block_size, storage_bytes, full_count, len(partial_lengths)))
+        f.write(bucket_bytes)
+        records.tofile(f)
+    return len(records)
@@ -0,0 +1,251 @@
+"""Header-only model scanner and SQLite index of the local library.
+
+scan_model reads only what a file's header says (splat count, SH degree,
+format variant) plus a bounding box from an evenly spaced sample of a few
+thousand positions, so even multi-gigabyte scenes are scanned in
+milliseconds:
+
+- PLY: INRIA v1/v2 headers; PlayCanvas-compressed files take their bounds
+  from the per-chunk min/max records;
+- .splat: 32-byte rows, so the count is the file size / 32;
+- .ksplat: the main and first section headers; compressed files are bounded
+  by their bucket cells.
+
+ModelIndex keeps the results in downloads/.library.sqlite keyed by user and
+file name, with each file's size and mtime. update_user re-scans only files
+whose size or mtime changed and drops rows for removed files; it runs after
+every sync and whenever the dashboard opens. Sorting, filtering and totals
+are then SQL queries over a few hundred rows.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from . import ksplat, manifest, splats
+
+INDEX_NAME = ".library.sqlite"
+SCHEMA_VERSION = 1
+SCANNED_EXTENSIONS = (".ply", ".splat", ".ksplat")
+SAMPLE_SIZE = 4096  # Positions read to estimate a bounding box
+
+FORMAT_PLY = "ply"
+FORMAT_SPLAT = "splat"
+FORMAT_KSPLAT = "ksplat"
+
+COLUMNS = ("user_id", "name", "cloud_path", "md5_hash", "size", "mtime_ns", "format", "variant", "splat_count",
+           "sh_degree", "min_x", "min_y", "min_z", "max_x", "max_y", "max_z", "error", "scanned_at")
+SORT_COLUMNS = ("name", "size", "splat_count", "sh_degree", "mtime_ns", "format")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _sample(count):
+    """Evenly spaced record indices, at most SAMPLE_SIZE of them."""
+    return np.unique(np.linspace(0, count - 1, min(count, SAMPLE_SIZE)).astype(np.int64))
+
+
+def _bounds(points):
+    """((min_x, min_y, min_z), (max_x, max_y, max_z)) of finite points, or None."""
+    points = np.asarray(points, dtype=np.float64)
+    points = points[np.all(np.isfinite(points), axis=1)]
+    if not len(points):
+        return None
+    return tuple(points.min(axis=0).tolist()), tuple(points.max(axis=0).tolist())
+
+
+def scan_ply(path):
+    header = splats.read_ply_header(path)
+    bounds = None
+    if header.format == splats.PLY_FORMAT_PLAYCANVAS and "chunk" in header.element_properties:
+        chunks = np.memmap(path, dtype=header.element_dtype("chunk"), mode='r',
+                           offset=header.element_offset("chunk"), shape=(dict(header.elements)["chunk"],))
+        if len(chunks):
+            low = np.stack([chunks[f"min_{axis}"] for axis in "xyz"], axis=1)
+            high = np.stack([chunks[f"max_{axis}"] for axis in "xyz"], axis=1)
+            bounds = _bounds(np.concatenate([low, high]))
+        rest = sum(1 for name, _ in header.element_properties.get("sh", []) if name.startswith("f_rest"))
+    else:
+        names = {name for name, _ in header.properties}
+        if {"x", "y", "z"} <= names and header.vertex_count:
+            vertices = np.memmap(path, dtype=header.dtype, mode='r', offset=header.element_offset("vertex"),
+                                 shape=(header.vertex_count,))
+            sample = vertices[_sample(header.vertex_count)]
+            bounds = _bounds(np.stack([sample[axis] for axis in "xyz"], axis=1))
+        rest = sum(1 for name, _ in header.properties if name.startswith("f_rest"))
+    return {'format': FORMAT_PLY, 'variant': header.format, 'splat_count': header.vertex_count,
+            'sh_degree': splats.stored_sh_degree(rest // 3), 'bounds': bounds}
+
+
+def scan_splat(path):
+    count = os.path.getsize(path) // splats.SPLAT_ROW_BYTES
+    bounds = None
+    if count:
+        rows = np.memmap(path, dtype=splats.splat_dtype(), mode='r', shape=(count,))
+        bounds = _bounds(rows['center'][_sample(count)])
+    return {'format': FORMAT_SPLAT, 'variant': FORMAT_SPLAT, 'splat_count': count, 'sh_degree': 0,
+            'bounds': bounds}
+
+
+def scan_ksplat(path):
+    with open(path, 'rb') as f:
+        head = f.read(ksplat.HEADER_BYTES + ksplat.SECTION_HEADER_BYTES)
+    if len(head) < ksplat.HEADER_BYTES + ksplat.SECTION_HEADER_BYTES:
+        raise ValueError(f"{os.path.basename(path)} is too short for a .ksplat file")
+    major, minor = head[0], head[1]
+    max_sections, sections, _, splat_count = np.frombuffer(head, dtype='<u4', count=4, offset=4)
+    compression_level = int(np.frombuffer(head, dtype='<u2', count=1, offset=20)[0])
+    section = head[ksplat.HEADER_BYTES:]
+    sh_degree = int(np.frombuffer(section, dtype='<u2', count=1, offset=40)[0])
+
+    bounds = None
+    if sections == 1 and max_sections == 1:
+        # Only single-section files, like those written by ksplat.write_ksplat, are bounded
+        section_u32 = np.frombuffer(section, dtype='<u4', count=10)
+        data_offset = ksplat.HEADER_BYTES + ksplat.SECTION_HEADER_BYTES
+        if compression_level == 0:
+            dtype = ksplat.splat_record_dtype(0, splats.SH_COMPONENTS.get(sh_degree, 0))
+            records = np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(int(splat_count),))
+            if len(records):
+                bounds = _bounds(records['center'][_sample(len(records))])
+        else:
+            bucket_count, partial_count = int(section_u32[3]), int(section_u32[9])
+            block_size = float(np.frombuffer(section, dtype='<f4', count=1, offset=16)[0])
+            centers = np.memmap(path, dtype='<f4', mode='r', offset=data_offset + 4 * partial_count,
+                                shape=(bucket_count, 3))
+            if bucket_count:
+                extent = _bounds(centers)
+                if extent is not None:
+                    half = block_size / 2
+                    bounds = (tuple(v - half for v in extent[0]), tuple(v + half for v in extent[1]))
+    return {'format': FORMAT_KSPLAT, 'variant': f"ksplat_v{major}.{minor}_c{compression_level}",
+            'splat_count': int(splat_count), 'sh_degree': sh_degree, 'bounds': bounds}
+
+
+SCANNERS = {".ply": scan_ply, ".splat": scan_splat, ".ksplat": scan_ksplat}
+
+
+def scan_model(path):
+    """Header facts for a model file: format, variant, splat_count, sh_degree and sampled bounds."""
+    return SCANNERS[os.path.splitext(path)[1].lower()](path)
+
+
+class ModelIndex:
+    """SQLite table of scanned models, safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._db.execute("DROP TABLE IF EXISTS models")
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS models (
+                    user_id TEXT NOT NULL, name TEXT NOT NULL, cloud_path TEXT, md5_hash TEXT,
+                    size INTEGER, mtime_ns INTEGER, format TEXT, variant TEXT,
+                    splat_count INTEGER, sh_degree INTEGER,
+                    min_x REAL, min_y REAL, min_z REAL, max_x REAL, max_y REAL, max_z REAL,
+                    error TEXT, scanned_at REAL,
+                    PRIMARY KEY (user_id, name))""")
+
+    def update_user(self, user_id, local_dir):
+        """Re-scan new or changed model files in local_dir and forget removed ones.
+
+        Returns (scanned, unchanged, removed) counts.
+        """
+        cloud_paths = {manifest.local_name(cloud_path): (cloud_path, entry.get('md5Hash'))
+                       for cloud_path, entry in manifest.load_manifest(local_dir).items()}
+        files = {}
+        try:
+            with os.scandir(local_dir) as entries:
+                for entry in entries:
+                    if (not entry.name.startswith(".") and entry.name.lower().endswith(SCANNED_EXTENSIONS)
+                            and entry.is_file()):
+                        files[entry.name] = entry.stat()
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            known = {row['name']: (row['size'], row['mtime_ns']) for row in
+                     self._db.execute("SELECT name, size, mtime_ns FROM models WHERE user_id = ?", (user_id,))}
+        changed = [name for name, stat in files.items() if known.get(name) != (stat.st_size, stat.st_mtime_ns)]
+        removed = [name for name in known if name not in files]
+
+        rows = []
+        for name in changed:
+            stat = files[name]
+            try:
+                facts, error = scan_model(os.path.join(local_dir, name)), None
+            except (OSError, ValueError, KeyError) as e:
+                facts, error = {'format': os.path.splitext(name)[1].lower().lstrip(".")}, str(e)
+            low, high = facts.get('bounds') or ((None,) * 3, (None,) * 3)
+            cloud_path, md5_hash = cloud_paths.get(name, (None, None))
+            rows.append((user_id, name, cloud_path, md5_hash, stat.st_size, stat.st_mtime_ns, facts.get('format'),
+                         facts.get('variant'), facts.get('splat_count'), facts.get('sh_degree'), *low, *high,
+                         error, time.time()))
+        with self._lock, self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO models ({', '.join(COLUMNS)}) "
+                                 f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+            self._db.executemany("DELETE FROM models WHERE user_id = ? AND name = ?",
+                                 [(user_id, name) for name in removed])
+        return len(changed), len(files) - len(changed), len(removed)
+
+    def query(self, user_id, order_by="name", descending=False, search=None, formats=None, min_splats=None):
+        """user_id's models as dicts, filtered and sorted in SQL."""
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Can't sort by {order_by!r}")
+        clauses, params = ["user_id = ?"], [user_id]
+        if search:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append("%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if formats:
+            clauses.append(f"format IN ({', '.join('?' * len(formats))})")
+            params.extend(formats)
+        if min_splats is not None:
+            clauses.append("splat_count >= ?")
+            params.append(min_splats)
+        sql = (f"SELECT * FROM models WHERE {' AND '.join(clauses)} "
+               f"ORDER BY {order_by} {'DESC' if descending else 'ASC'}, name")
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params)]
+
+    def stats(self, user_id):
+        """Totals over user_id's indexed models."""
+        with self._lock:
+            row = self._db.execute("""
+                SELECT COUNT(*) AS models, COALESCE(SUM(size), 0) AS bytes,
+                       COALESCE(SUM(splat_count), 0) AS splats, MAX(splat_count) AS largest,
+                       SUM(error IS NOT NULL) AS unreadable
+                FROM models WHERE user_id = ?""", (user_id,)).fetchone()
+            formats = dict(self._db.execute("SELECT format, COUNT(*) FROM models WHERE user_id = ? "
+                                            "GROUP BY format", (user_id,)).fetchall())
+        return dict(row, unreadable=row['unreadable'] or 0, formats=formats)
+
+    def forget_user(self, user_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM models WHERE user_id = ?", (user_id,))
+
+
+def extent(row):
+    """Bounding-box size (dx, dy, dz) of an index row, or None if it has no bounds."""
+    if row.get('min_x') is None:
+        return None
+    return tuple(row[f"max_{axis}"] - row[f"min_{axis}"] for axis in "xyz")
+
+
+def get_index(downloads_dir):
+    """Return the process-wide index under downloads_dir."""
+    path = os.path.abspath(os.path.join(downloads_dir, INDEX_NAME))
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = ModelIndex(path)
+        return index
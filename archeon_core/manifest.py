@@ -0,0 +1,135 @@
+"""Per-user sync manifest for incremental model syncs.
+
+The manifest records, for every synced object, the Firebase generation,
+md5Hash, size and updated time it was downloaded at. Comparing it against
+a fresh listing tells us exactly which objects are new, changed or gone, so
+an up-to-date library syncs without moving any model bytes.
+"""
+import base64
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+MANIFEST_NAME = ".archeon_manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SyncPlan:
+    download: List[dict] = field(default_factory=list)   # Remote metadata to fetch
+    unchanged: List[dict] = field(default_factory=list)  # Remote metadata already up to date
+    delete: List[str] = field(default_factory=list)      # Cloud paths removed remotely
+
+
+def local_name(cloud_path):
+    return os.path.basename(cloud_path)
+
+
+def load_manifest(local_dir) -> Dict[str, dict]:
+    path = os.path.join(local_dir, MANIFEST_NAME)
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('objects', {})
+
+
+def save_manifest(local_dir, objects):
+    path = os.path.join(local_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'objects': objects}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def md5_base64(path):
+    """MD5 of a local file in the base64 form Firebase reports as md5Hash."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode()
+
+
+def manifest_entry(metadata):
+    return {
+        'file': local_name(metadata['name']),
+        'generation': metadata.get('generation'),
+        'md5Hash': metadata.get('md5Hash'),
+        'size': metadata.get('size'),
+        'updated': metadata.get('updated'),
+        'checked': metadata.get('checked'),  # When this metadata was read from Storage
+    }
+
+
+def known_metadata(manifest):
+    """The manifest's entries as storage metadata, for storage.list_models(known=...)."""
+    return {cloud_path: {'name': cloud_path, 'generation': entry.get('generation'), 'md5Hash': entry.get('md5Hash'),
+                         'size': entry.get('size'), 'updated': entry.get('updated'), 'contentType': None,
+                         'checked': entry.get('checked')}
+            for cloud_path, entry in manifest.items()}
+
+
+def _is_current(local_dir, entry, metadata):
+    local_path = os.path.join(local_dir, entry['file'])
+    try:
+        local_size = os.path.getsize(local_path)
+    except OSError:
+        return False
+    # A size mismatch catches truncated files left by a crashed run
+    if metadata.get('size') is not None and local_size != metadata['size']:
+        return False
+    if metadata.get('generation') and entry.get('generation') != metadata['generation']:
+        return False
+    if metadata.get('md5Hash') and entry.get('md5Hash') != metadata['md5Hash']:
+        return False
+    return True
+
+
+def plan_sync(local_dir, manifest, remote) -> SyncPlan:
+    """Diff remote metadata (cloud path -> metadata) against the manifest.
+
+    Objects missing from the manifest but already on disk, e.g. from syncs
+    made before the manifest existed, are adopted when their size and md5
+    match, which updates the manifest in place instead of re-downloading.
+    """
+    plan = SyncPlan()
+    for cloud_path, metadata in remote.items():
+        entry = manifest.get(cloud_path)
+        if entry is None:
+            local_path = os.path.join(local_dir, local_name(cloud_path))
+            if (os.path.isfile(local_path) and metadata.get('md5Hash')
+                    and os.path.getsize(local_path) == metadata.get('size')
+                    and md5_base64(local_path) == metadata['md5Hash']):
+                manifest[cloud_path] = manifest_entry(metadata)
+                plan.unchanged.append(metadata)
+            else:
+                plan.download.append(metadata)
+        elif _is_current(local_dir, entry, metadata):
+            plan.unchanged.append(metadata)
+        else:
+            plan.download.append(metadata)
+
+    plan.delete = [cloud_path for cloud_path in manifest if cloud_path not in remote]
+    return plan
+
+
+def apply_deletions(local_dir, manifest, cloud_paths):
+    """Remove local copies of objects deleted remotely and drop their entries."""
+    removed = []
+    for cloud_path in cloud_paths:
+        entry = manifest.pop(cloud_path, None)
+        if entry is None:
+            continue
+        try:
+            os.remove(os.path.join(local_dir, entry['file']))
+        except FileNotFoundError:
+            pass
+        removed.append(cloud_path)
+    return removed
@@ -0,0 +1,321 @@
+"""Post-sync stage that turns raw scenes into viewer-ready artifacts.
+
+Each synced .ply/.splat is converted once, in a process pool, into a set of
+.ksplat variants (full quality, reduced SH, lower-detail LODs), a
+progressively ordered .splat and an octree tileset for streaming, stored under <local_dir>/.artifacts/<model>/. A stamp records the source md5Hash and the
+artifact specs, so later runs skip models whose artifacts are current and
+the viewer can open them without any parsing, sorting or compression.
+
+The app runs the pool through `python -m archeon_core.preprocess` in a child
+process: spawned pool workers re-import __main__, which under Streamlit is
+the app script itself.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from . import ksplat, manifest, ordering, splats, tiler
+
+ARTIFACTS_DIRNAME = ".artifacts"
+STAMP_NAME = "stamp.json"
+TILES_DIRNAME = "tiles"
+PROGRESSIVE_NAME = "progressive.splat"
+SOURCE_EXTENSIONS = (".ply", ".splat")
+# Each worker holds a whole scene and its encoded variants, so workers are
+# few by default and further capped by available memory (see worker_count)
+DEFAULT_WORKERS = min(2, os.cpu_count() or 1)
+SCENE_MEMORY_FACTOR = 6  # Peak worker memory per byte of source scene
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CANCEL_POLL_INTERVAL = 0.5
+
+
+@dataclass(frozen=True)
+class ArtifactSpec:
+    name: str
+    compression_level: int = ksplat.DEFAULT_COMPRESSION_LEVEL
+    sh_degree: int = 0
+    detail: float = 1.0  # Fraction of splats kept, most significant first
+
+
+DEFAULT_SPECS = (
+    ArtifactSpec("full", compression_level=1, sh_degree=2),
+    ArtifactSpec("sh0", compression_level=1, sh_degree=0),
+    ArtifactSpec("lod1", compression_level=2, sh_degree=0, detail=0.5),
+    ArtifactSpec("lod2", compression_level=2, sh_degree=0, detail=0.125),
+)
+
+
+@dataclass
+class PreprocessSummary:
+    built: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    error: Optional[str] = None  # Set when the preprocess run itself failed
+
+    @property
+    def ok(self):
+        return not self.failed and self.error is None
+
+
+def _ignore_log(level, message):
+    pass
+
+
+def artifact_dir(local_dir, model_name):
+    return os.path.join(local_dir, ARTIFACTS_DIRNAME, model_name)
+
+
+def artifact_path(local_dir, model_name, spec_name):
+    return os.path.join(artifact_dir(local_dir, model_name), f"{spec_name}.ksplat")
+
+
+def viewer_file(local_dir, model_name, source_hash, spec_name=DEFAULT_SPECS[0].name):
+    """The file a viewer should open for model_name: its spec_name artifact if current, else the raw model."""
+    if source_hash and is_current(local_dir, model_name, source_hash):
+        return artifact_path(local_dir, model_name, spec_name)
+    return os.path.join(local_dir, model_name)
+
+
+def specs_signature(specs):
+    payload = json.dumps([[asdict(spec) for spec in specs], tiler.tileset_options(), PROGRESSIVE_NAME],
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def read_stamp(local_dir, model_name):
+    try:
+        with open(os.path.join(artifact_dir(local_dir, model_name), STAMP_NAME), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def is_current(local_dir, model_name, source_hash, specs=DEFAULT_SPECS):
+    stamp = read_stamp(local_dir, model_name)
+    if stamp.get('source') != source_hash or stamp.get('specs') != specs_signature(specs):
+        return False
+    if tiler.load_tileset(os.path.join(artifact_dir(local_dir, model_name), TILES_DIRNAME)) is None:
+        return False
+    if not os.path.isfile(os.path.join(artifact_dir(local_dir, model_name), PROGRESSIVE_NAME)):
+        return False
+    return all(os.path.isfile(artifact_path(local_dir, model_name, spec.name)) for spec in specs)
+
+
+def build_artifacts(source_path, out_dir, source_hash, specs=DEFAULT_SPECS):
+    """Convert one scene into every spec; runs inside a pool worker."""
+    os.makedirs(out_dir, exist_ok=True)
+    max_degree = max(spec.sh_degree for spec in specs)
+    scene = splats.load_scene(source_path, max_degree)
+    ranked = splats.importance_order(scene)
+    written = {}
+    for spec in specs:
+        variant = scene
+        if spec.detail < 1.0:
+            keep = max(1, int(len(scene) * spec.detail))
+            variant = scene.subset(ranked[:keep])
+        if spec.sh_degree < variant.sh_degree:
+            variant = variant.reduce_sh(spec.sh_degree)
+        tmp_path = os.path.join(out_dir, f"{spec.name}.ksplat.tmp")
+        written[spec.name] = ksplat.write_ksplat(variant, tmp_path, spec.compression_level)
+        os.replace(tmp_path, os.path.join(out_dir, f"{spec.name}.ksplat"))
+    tiler.build_tileset(scene.reduce_sh(0), os.path.join(out_dir, TILES_DIRNAME))
+    # Every prefix of this file is a coarse version of the scene, for progressive loading
+    visible = scene.subset(scene.colors[:, 3] >= ksplat.DEFAULT_ALPHA_THRESHOLD)
+    splats.write_splat(ordering.reorder(visible), os.path.join(out_dir, PROGRESSIVE_NAME + ".tmp"))
+    os.replace(os.path.join(out_dir, PROGRESSIVE_NAME + ".tmp"), os.path.join(out_dir, PROGRESSIVE_NAME))
+
+    # Written last, so an interrupted build is never mistaken for a current one
+    stamp = {'source': source_hash, 'specs': specs_signature(specs), 'splats': written}
+    with open(os.path.join(out_dir, STAMP_NAME + ".tmp"), 'w') as f:
+        json.dump(stamp, f)
+    os.replace(os.path.join(out_dir, STAMP_NAME + ".tmp"), os.path.join(out_dir, STAMP_NAME))
+    return stamp
+
+
+def prune_artifacts(local_dir, model_names):
+    """Remove artifacts for models no longer in model_names."""
+    root = os.path.join(local_dir, ARTIFACTS_DIRNAME)
+    if not os.path.isdir(root):
+        return []
+    removed = []
+    for name in os.listdir(root):
+        if name not in model_names:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def available_memory():
+    """Bytes of memory free for new work, or None where it can't be read."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    if sys.platform == "win32":
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MemoryStatus(dwLength=ctypes.sizeof(MemoryStatus))
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+    return None
+
+
+def worker_count(workers, scene_sizes):
+    """workers, reduced so the largest scenes being built at once fit in available memory."""
+    workers = max(1, min(workers, len(scene_sizes)))
+    available = available_memory()
+    if available is None or not scene_sizes:
+        return workers
+    largest = sorted(scene_sizes, reverse=True)
+    while workers > 1 and sum(largest[:workers]) * SCENE_MEMORY_FACTOR > available:
+        workers -= 1
+    return workers
+
+
+def preprocess_models(local_dir, specs=DEFAULT_SPECS, workers=DEFAULT_WORKERS, log=_ignore_log, control=None):
+    """Build missing or stale artifacts for every synced scene in local_dir.
+
+    Source hashes come from the sync manifest, so checking an up-to-date
+    library reads no model data.
+    """
+    summary = PreprocessSummary()
+    sources = {}
+    for cloud_path, entry in manifest.load_manifest(local_dir).items():
+        name = manifest.local_name(cloud_path)
+        if name.lower().endswith(SOURCE_EXTENSIONS) and os.path.isfile(os.path.join(local_dir, name)):
+            sources[name] = entry.get('md5Hash') or manifest.md5_base64(os.path.join(local_dir, name))
+    prune_artifacts(local_dir, sources)
+
+    pending = []
+    for name, source_hash in sources.items():
+        if is_current(local_dir, name, source_hash, specs):
+            summary.cached.append(name)
+        else:
+            pending.append(name)
+    if not pending:
+        return summary
+
+    workers = worker_count(workers, [os.path.getsize(os.path.join(local_dir, name)) for name in pending])
+    log("info", f"⚙️ Optimizing {len(pending)} model(s) for the viewer...")
+    # Spawned workers don't inherit the app's threads or locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(build_artifacts, os.path.join(local_dir, name), artifact_dir(local_dir, name),
+                               sources[name], specs): name for name in pending}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                summary.built.append(name)
+                log("success", f"✔️ Optimized {name}")
+            except Exception as e:
+                summary.failed.append(name)
+                log("error", f"❌ Failed to optimize {name}: {e}")
+            if control is not None and control.cancelled:
+                pool.shutdown(wait=True, cancel_futures=True)
+                break
+    return summary
+
+
+def _terminate_group(process):
+    """Stop process and every worker it started."""
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+    except (OSError, subprocess.SubprocessError):
+        process.terminate()
+
+
+def run_preprocess(local_dir, workers=DEFAULT_WORKERS, log=_ignore_log, control=None):
+    """Run preprocess_models in a child process, relaying its log and honouring cancellation."""
+    command = [sys.executable, "-m", "archeon_core.preprocess", os.path.abspath(local_dir),
+               "--workers", str(workers), "--json"]
+    # In its own process group, so cancelling can stop the pool workers along with it
+    if os.name == "nt":
+        group = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group = {'start_new_session': True}
+    process = subprocess.Popen(command, cwd=PACKAGE_ROOT, stdout=subprocess.PIPE, text=True, **group)
+    summary = None
+
+    def watch_cancel():
+        while control is not None and process.poll() is None:
+            if control.cancelled:
+                _terminate_group(process)
+                return
+            try:
+                process.wait(CANCEL_POLL_INTERVAL)
+            except subprocess.TimeoutExpired:
+                pass
+
+    watcher = threading.Thread(target=watch_cancel, daemon=True)
+    watcher.start()
+    for line in process.stdout:
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if 'summary' in event:
+            summary = PreprocessSummary(**event['summary'])
+        else:
+            log(event['level'], event['message'])
+    process.wait()
+    watcher.join()
+    if control is not None and control.cancelled:
+        return summary or PreprocessSummary()
+    if summary is None:
+        # Crashed, killed (e.g. out of memory) or failed to start before reporting
+        summary = PreprocessSummary(error=f"Preprocess exited with status {process.returncode} without a summary")
+        log("error", f"❌ Failed to optimize models: {summary.error}")
+    elif process.returncode != 0 and summary.ok:
+        summary.error = f"Preprocess exited with status {process.returncode}"
+        log("error", f"❌ Failed to optimize models: {summary.error}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m archeon_core.preprocess",
+                                     description="Build viewer artifacts for the synced models in a directory.")
+    parser.add_argument("local_dir")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--json", action="store_true", help="Emit log events and the summary as JSON lines")
+    args = parser.parse_args(argv)
+
+    def log(level, message):
+        if args.json:
+            print(json.dumps({'level': level, 'message': message}), flush=True)
+        else:
+            print(message, flush=True)
+
+    summary = preprocess_models(args.local_dir, workers=args.workers, log=log)
+    if args.json:
+        print(json.dumps({'summary': asdict(summary)}), flush=True)
+    else:
+        print(f"{len(summary.built)} built, {len(summary.cached)} up to date, {len(summary.failed)} failed")
+    return 0 if summary.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Lay out the Unity viewer build inside each user directory without copying it.
+
+Files are hard-linked (or reflinked / symlinked) from ./viewer where the
+filesystem allows it, falling back to a copy only for files whose size or
+mtime changed. A stamp holding a signature of the source tree lets an
+up-to-date user directory be confirmed without touching the files at all.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+STAMP_NAME = ".viewer_stamp.json"
+MODES = ("auto", "hardlink", "symlink", "copy")
+DEFAULT_MODE = os.environ.get("ARCHEON_VIEWER_PROVISION", "auto")
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, XFS)
+
+
+def _walk_files(source_dir):
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, source_dir), os.stat(path)
+
+
+def source_signature(source_dir):
+    """Hash of every file's relative path, size and mtime; cheap to recompute."""
+    digest = hashlib.sha256()
+    files = []
+    for rel_path, stat in _walk_files(source_dir):
+        digest.update(f"{rel_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        files.append(rel_path)
+    return digest.hexdigest(), files
+
+
+def _read_stamp(local_dir):
+    try:
+        with open(os.path.join(local_dir, STAMP_NAME), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_stamp(local_dir, stamp):
+    path = os.path.join(local_dir, STAMP_NAME)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(stamp, f)
+    os.replace(path + ".tmp", path)
+
+
+def _up_to_date(src_stat, dst_path):
+    try:
+        dst_stat = os.stat(dst_path)
+    except OSError:
+        return False
+    if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+        return True  # Already a hard link to the source
+    return src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime)
+
+
+def _reflink(src, dst):
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflinks not supported on this platform")
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _place(src, dst, mode):
+    """Materialize src at dst and return the method that worked."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode in ("auto", "hardlink"):
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            if mode == "hardlink":
+                raise
+        try:
+            _reflink(src, dst)
+            return "reflink"
+        except OSError:
+            pass
+    elif mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+        return "symlink"
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def provision_viewer(local_dir, source_dir, mode="auto"):
+    """Make local_dir contain the viewer build from source_dir.
+
+    Returns a dict of counts per placement method ('hardlink', 'copy',
+    'unchanged', ...), or {'verified': 1} when the stamp shows nothing changed.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown provisioning mode: {mode}")
+    if not os.path.isdir(source_dir):
+        return {}
+
+    signature, files = source_signature(source_dir)
+    stamp = _read_stamp(local_dir)
+    if stamp.get('signature') == signature and stamp.get('mode') == mode:
+        top_level = {rel_path.split(os.sep, 1)[0] for rel_path in files}
+        if all(os.path.lexists(os.path.join(local_dir, name)) for name in top_level):
+            return {'verified': 1}
+
+    counts = {}
+    for rel_path in files:
+        src = os.path.join(source_dir, rel_path)
+        dst = os.path.join(local_dir, rel_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if _up_to_date(os.stat(src), dst) and (mode != "symlink" or os.path.islink(dst)):
+            method = "unchanged"
+        else:
+            method = _place(src, dst, mode)
+        counts[method] = counts.get(method, 0) + 1
+
+    # Drop files that were provisioned before but are gone from the build
+    for rel_path in set(stamp.get('files', [])) - set(files):
+        try:
+            os.remove(os.path.join(local_dir, rel_path))
+        except OSError:
+            pass
+
+    _write_stamp(local_dir, {'signature': signature, 'mode': mode, 'files': files})
+    return counts
@@ -0,0 +1,302 @@
+"""Process-wide download scheduler shared by every session and sync job.
+
+All syncs in this process submit their transfers here instead of running
+private worker pools, so concurrent users cooperate for the uplink:
+
+- a fixed number of transfer slots bounds total concurrency, and each user
+  can hold at most a few of them;
+- a free slot goes to the waiting user with the fewest transfers in flight
+  (round robin between ties), so one large library can't starve the rest;
+- bytes are metered through token buckets: one global cap and one cap per
+  user (ARCHEON_MAX_BANDWIDTH / ARCHEON_USER_BANDWIDTH, bytes per second,
+  0 for unlimited);
+- a transfer already queued or in flight for the same object (same md5Hash,
+  or the same destination) is joined rather than fetched again. A follower
+  with a different destination gets a link or copy of the finished file.
+
+Urgent transfers (a model the user just asked to open) skip the line: they
+are dispatched before anything else, on a few slots of their own, and are
+fetched front to back so the viewer can start on the partial file.
+"""
+import collections
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+from . import downloader, telemetry
+from .blobstore import _replace_with_link
+
+MAX_TRANSFERS = int(os.environ.get("ARCHEON_MAX_TRANSFERS", 8))
+USER_TRANSFERS = downloader.DEFAULT_WORKERS
+MAX_BANDWIDTH = int(os.environ.get("ARCHEON_MAX_BANDWIDTH", 0))    # Bytes/s for all users; 0 = unlimited
+USER_BANDWIDTH = int(os.environ.get("ARCHEON_USER_BANDWIDTH", 0))  # Bytes/s per user; 0 = unlimited
+URGENT_TRANSFERS = 2  # Extra slots only urgent transfers may use
+IDLE_RECHECK = 0.5  # Seconds between looks at paused queue heads
+
+
+class TokenBucket:
+    """Byte-rate limiter; callers may overdraw and then wait off the debt."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        """Take nbytes and return how many seconds to wait before using them."""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= nbytes
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class _Transfer:
+    def __init__(self, owner, session, base_url, task, progress, control, urgent=False):
+        self.owner = owner
+        self.urgent = urgent
+        self.session = session
+        self.base_url = base_url
+        self.task = task
+        self.progress = progress
+        self.control = control
+        self.future = Future()
+        self.followers = []  # Transfers of the same object waiting on this one
+
+    @property
+    def key(self):
+        if self.task.md5_hash:
+            return "md5:" + self.task.md5_hash
+        return "path:" + os.path.abspath(self.task.local_path)
+
+    @property
+    def paused(self):
+        return self.control is not None and self.control.paused and not self.control.cancelled
+
+
+class Scheduler:
+    def __init__(self, max_transfers=MAX_TRANSFERS, user_transfers=USER_TRANSFERS, bandwidth=MAX_BANDWIDTH,
+                 user_bandwidth=USER_BANDWIDTH):
+        self.max_transfers = max(1, max_transfers)
+        self.user_transfers = max(1, user_transfers)
+        self.user_bandwidth = user_bandwidth
+        self._bucket = TokenBucket(bandwidth)
+        self._user_buckets = {}
+        self._queues = collections.OrderedDict()  # owner -> deque of waiting transfers
+        self._urgent = collections.deque()        # Waiting urgent transfers, served first
+        self._running = collections.Counter()     # owner -> transfers in flight
+        self._by_key = {}                         # object key -> primary transfer, queued or running
+        self._turns = itertools.count()
+        self._last_turn = {}
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def configure(self, max_transfers=None, user_transfers=None, bandwidth=None, user_bandwidth=None):
+        """Change limits; takes effect for the next dispatched transfer and byte."""
+        with self._cond:
+            if max_transfers is not None:
+                self.max_transfers = max(1, max_transfers)
+            if user_transfers is not None:
+                self.user_transfers = max(1, user_transfers)
+            if bandwidth is not None:
+                self._bucket = TokenBucket(bandwidth)
+            if user_bandwidth is not None:
+                self.user_bandwidth = user_bandwidth
+                self._user_buckets = {}
+            self._ensure_workers()
+            self._cond.notify_all()
+
+    def submit(self, owner, session, base_url, task, progress=None, control=None, urgent=False):
+        """Queue a download for owner; returns a Future resolving to None or raising its error.
+
+        An urgent submission for an object that is already waiting moves that
+        transfer to the front instead of adding another one.
+        """
+        transfer = _Transfer(owner, session, base_url, task, progress, control, urgent)
+        with self._cond:
+            self._enqueue(transfer)
+            self._ensure_workers()
+        return transfer.future
+
+    def _enqueue(self, transfer):
+        primary = self._by_key.get(transfer.key)
+        if primary is not None:
+            primary.followers.append(transfer)
+            telemetry.registry.inc('archeon_download_deduplicated_total')
+            waiting = self._queues.get(primary.owner, ())
+            if transfer.urgent and primary in waiting:
+                waiting.remove(primary)
+                if not waiting:
+                    del self._queues[primary.owner]
+                primary.urgent = True
+                self._urgent.append(primary)
+                self._cond.notify()
+            return
+        self._by_key[transfer.key] = transfer
+        if transfer.urgent:
+            self._urgent.append(transfer)
+        else:
+            self._queues.setdefault(transfer.owner, collections.deque()).append(transfer)
+        telemetry.registry.inc('archeon_scheduler_queued')
+        self._cond.notify()
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_transfers + URGENT_TRANSFERS:
+            worker = threading.Thread(target=self._work, name=f"archeon-transfer-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _next(self):
+        """Pick the next transfer under the fairness rules, or None; call with the lock held."""
+        running = sum(self._running.values())
+        if self._urgent and running < self.max_transfers + URGENT_TRANSFERS:
+            best = self._urgent.popleft()
+            self._running[best.owner] += 1
+            telemetry.registry.inc('archeon_scheduler_queued', -1)
+            return best
+        if running >= self.max_transfers:
+            return None
+        candidates = [owner for owner, waiting in self._queues.items()
+                      if waiting and self._running[owner] < self.user_transfers]
+        best = None
+        for owner in sorted(candidates, key=lambda owner: (self._running[owner], self._last_turn.get(owner, -1))):
+            waiting = self._queues[owner]
+            # Paused jobs keep their place in line without holding a slot
+            index = next((i for i, transfer in enumerate(waiting) if not transfer.paused), None)
+            if index is not None:
+                best = waiting[index]
+                del waiting[index]
+                break
+        if best is None:
+            return None
+        if not self._queues[best.owner]:
+            del self._queues[best.owner]
+        self._running[best.owner] += 1
+        self._last_turn[best.owner] = next(self._turns)
+        telemetry.registry.inc('archeon_scheduler_queued', -1)
+        return best
+
+    def _work(self):
+        while True:
+            with self._cond:
+                transfer = self._next()
+                while transfer is None:
+                    self._cond.wait(IDLE_RECHECK)
+                    transfer = self._next()
+            error = None
+            try:
+                if not transfer.future.set_running_or_notify_cancel():
+                    raise downloader.TransferCancelled()
+                downloader.download_object(transfer.session, transfer.base_url, transfer.task,
+                                           transfer.progress, control=transfer.control,
+                                           throttle=self._throttle(transfer), sequential=transfer.urgent)
+            except BaseException as e:
+                error = e
+            with self._cond:
+                self._running[transfer.owner] -= 1
+                if not self._running[transfer.owner]:
+                    del self._running[transfer.owner]
+                del self._by_key[transfer.key]
+                followers = self._finish(transfer, error)
+                self._cond.notify_all()
+            _resolve(transfer.future, error)
+            for follower, follower_error in followers:
+                _resolve(follower.future, follower_error)
+
+    def _finish(self, transfer, error):
+        """Settle a finished transfer's followers; call with the lock held."""
+        settled = []
+        for follower in transfer.followers:
+            if follower.future.cancelled():
+                continue
+            if isinstance(error, downloader.TransferCancelled):
+                # Only the primary's own job was cancelled; the others still want the object
+                self._enqueue(follower)
+            elif error is not None:
+                if follower.progress is not None:
+                    follower.progress.file_failed()
+                settled.append((follower, error))
+            else:
+                try:
+                    _adopt(transfer.task, follower)
+                    settled.append((follower, None))
+                except OSError:
+                    self._enqueue(follower)
+        return settled
+
+    def _throttle(self, transfer):
+        if not self._bucket.rate and not self.user_bandwidth:
+            return None
+        with self._cond:
+            user_bucket = self._user_buckets.get(transfer.owner)
+            if user_bucket is None:
+                user_bucket = self._user_buckets[transfer.owner] = TokenBucket(self.user_bandwidth)
+        global_bucket = self._bucket
+        control = transfer.control
+
+        def throttle(nbytes):
+            delay = max(user_bucket.consume(nbytes), global_bucket.consume(nbytes))
+            if delay:
+                telemetry.registry.inc('archeon_throttle_seconds_total', delay)
+                if control is not None:
+                    control.sleep(delay)
+                else:
+                    time.sleep(delay)
+        return throttle
+
+    def queued(self, owner=None):
+        with self._cond:
+            urgent = [transfer for transfer in self._urgent if owner is None or transfer.owner == owner]
+            if owner is not None:
+                return len(self._queues.get(owner, ())) + len(urgent)
+            return sum(len(waiting) for waiting in self._queues.values()) + len(urgent)
+
+    def running(self, owner=None):
+        with self._cond:
+            return self._running[owner] if owner is not None else sum(self._running.values())
+
+
+def _adopt(source_task, follower):
+    """Give a follower the object its primary just downloaded."""
+    task = follower.task
+    if os.path.abspath(task.local_path) != os.path.abspath(source_task.local_path):
+        os.makedirs(os.path.dirname(task.local_path) or ".", exist_ok=True)
+        _replace_with_link(source_task.local_path, task.local_path)
+    if follower.progress is not None:
+        if task.size is None:
+            follower.progress.add_total(os.path.getsize(task.local_path))
+        follower.progress.advance(task.size if task.size is not None else os.path.getsize(task.local_path))
+        follower.progress.file_done()
+
+
+def _resolve(future, error):
+    # A caller may cancel a pending future at any moment; losing that race must not kill the worker
+    if future.done() or (not future.running() and not future.set_running_or_notify_cancel()):
+        return
+    try:
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+    except InvalidStateError:
+        pass
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
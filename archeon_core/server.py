@@ -0,0 +1,434 @@
+"""In-process static server for the web viewer and synced models.
+
+Replaces `npm run demo` (util/server.js), which had to be started by hand and
+re-read whole files on every request. Files are streamed with
+socket.sendfile, validated with ETag/Last-Modified (304s on repeat opens),
+served in parts for Range requests and swapped for precompressed .br/.gz
+siblings when the browser accepts them. Every response carries the
+COOP/COEP headers the viewer's sorter needs for SharedArrayBuffer.
+
+Requesting a tileset.json with ?camera=x,y,z returns it with a 'schedule'
+listing tile level files coarse to fine, nearest tiles first. /metrics
+exposes sync telemetry in the Prometheus text format.
+
+A model that is still downloading (see sync.open_model) is streamed from
+its partial file as bytes arrive, so the viewer can start before the
+transfer finishes. Warm viewers report readiness and fetch load commands
+under /viewer/<id>/ (see viewers.py). /thumbnails/<token>/<user>/<file>
+returns a model's PNG preview, rendering it on first request (see
+thumbnails.py).
+
+Synced models are served under /models/<token>/<user>/. The token is a
+random secret that the server issues per user (access_token) and the app
+only puts into URLs for that user's own session. A request with a missing
+or wrong token gets a 404, so other local processes, browser tabs and
+accounts can't read a user's library.
+"""
+import email.utils
+import json
+import mimetypes
+import os
+import posixpath
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from . import downloader, telemetry, thumbnails, tiler, viewers
+from .preprocess import ARTIFACTS_DIRNAME
+
+WEB_VIEWER_DIR = "./web_viewer/GaussianSplats3D/build/demo"
+MODELS_PREFIX = "/models/"
+THUMBNAILS_PREFIX = "/thumbnails/"
+THUMBNAIL_TIMEOUT = 30.0     # Longest a thumbnail request waits for its render
+METRICS_PATH = "/metrics"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("ARCHEON_VIEWER_PORT", 8080))
+STREAM_POLL = 0.05           # Seconds between checks for new bytes in a growing file
+STREAM_STALL_TIMEOUT = 60.0  # Give up on a download that stops growing for this long
+
+CROSS_ORIGIN_HEADERS = {
+    "Cross-Origin-Opener-Policy": "same-origin",
+    "Cross-Origin-Embedder-Policy": "require-corp",
+}
+# Preferred first; each maps Accept-Encoding tokens to a sibling file suffix
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+CONTENT_TYPES = {
+    ".js": "text/javascript",
+    ".mjs": "text/javascript",
+    ".wasm": "application/wasm",
+    ".ksplat": "application/octet-stream",
+    ".splat": "application/octet-stream",
+    ".ply": "application/octet-stream",
+    ".spz": "application/octet-stream",
+}
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def content_type(path):
+    extension = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def make_etag(stat, encoding=None):
+    tag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None to send the whole file.
+
+    Raises ValueError for a range that can't be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ArcheonServer/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def end_headers(self):
+        for name, value in CROSS_ORIGIN_HEADERS.items():
+            self.send_header(name, value)
+        super().end_headers()
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.startswith(viewers.CONTROL_PREFIX):
+            self._serve_viewer_control(url, "POST")
+        else:
+            self._send_empty(405, [("Allow", "GET, HEAD")])
+
+    def _send_empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _serve(self, send_body):
+        url = urlsplit(self.path)
+        if url.path == METRICS_PATH:
+            self._send_text(telemetry.registry.render(), "text/plain; version=0.0.4; charset=utf-8", send_body)
+            return
+        if url.path.startswith(viewers.CONTROL_PREFIX):
+            self._serve_viewer_control(url, "GET")
+            return
+        if url.path.startswith(THUMBNAILS_PREFIX):
+            self._serve_thumbnail(url, send_body)
+            return
+        if url.path.startswith(MODELS_PREFIX):
+            path = self.server.authorize(url.path, MODELS_PREFIX)
+        else:
+            path = self.server.resolve(url.path)
+        if path is not None and not os.path.isfile(path) and url.path.startswith(MODELS_PREFIX):
+            live = downloader.live_transfer(path)
+            if live is not None and live.size is not None:
+                self._serve_growing(path, live, send_body)
+                return
+        if path is None or not os.path.isfile(path):
+            self._send_empty(404)
+            return
+        camera = parse_qs(url.query).get("camera")
+        if camera and os.path.basename(path) == tiler.TILESET_NAME:
+            self._serve_schedule(path, camera[0], send_body)
+            return
+
+        stat = os.stat(path)
+        encoding, served_path, served_stat = None, path, stat
+        accepted = self.headers.get("Accept-Encoding", "")
+        for token, suffix in PRECOMPRESSED:
+            candidate = path + suffix
+            if token in accepted and os.path.isfile(candidate):
+                candidate_stat = os.stat(candidate)
+                if candidate_stat.st_mtime >= stat.st_mtime:  # Ignore stale siblings
+                    encoding, served_path, served_stat = token, candidate, candidate_stat
+                    break
+
+        etag = make_etag(served_stat, encoding)
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        validators = [("ETag", etag), ("Last-Modified", last_modified), ("Cache-Control", "no-cache"),
+                      ("Vary", "Accept-Encoding")]
+        if self._not_modified(etag, stat.st_mtime):
+            self._send_empty(304, validators)
+            return
+
+        size = served_stat.st_size
+        byte_range = None
+        if_range = self.headers.get("If-Range")
+        if if_range is None or if_range == etag or if_range == last_modified:
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self._send_empty(416, [("Content-Range", f"bytes */{size}")])
+                return
+
+        start, end = byte_range if byte_range else (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", content_type(path))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        for name, value in validators:
+            self.send_header(name, value)
+        self.end_headers()
+
+        if send_body and end >= start:
+            with open(served_path, 'rb') as f:
+                try:
+                    # Zero-copy where the OS supports it; falls back to send() otherwise
+                    self.connection.sendfile(f, start, end - start + 1)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+    def _serve_growing(self, path, live, send_body):
+        """Stream a model while it downloads; ranges are ignored, the whole object is sent in order."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type(path))
+        self.send_header("Content-Length", str(live.size))
+        self.send_header("Accept-Ranges", "none")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if not send_body:
+            return
+        sent = 0
+        last_progress = time.monotonic()
+        try:
+            # The open handle survives the partial file being renamed into place
+            f = open(live.part_path, 'rb')
+        except FileNotFoundError:
+            f = open(path, 'rb')  # Finished in the meantime
+        with f:
+            try:
+                while sent < live.size:
+                    available = live.available()
+                    if available > sent:
+                        self.connection.sendfile(f, sent, available - sent)
+                        sent = available
+                        last_progress = time.monotonic()
+                    elif live.finished.is_set() or time.monotonic() - last_progress > STREAM_STALL_TIMEOUT:
+                        # Failed, cancelled or stalled: cut the response short so the viewer sees an error
+                        self.close_connection = True
+                        return
+                    else:
+                        live.finished.wait(STREAM_POLL)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    def _serve_viewer_control(self, url, method):
+        viewer_id, _, action = url.path[len(viewers.CONTROL_PREFIX):].partition("/")
+        viewer = viewers.registry.find(viewer_id)
+        if viewer is None:
+            self._send_empty(404)
+            return
+        if method == "GET" and action == "commands":
+            try:
+                after = int(parse_qs(url.query).get("after", ["0"])[0])
+            except ValueError:
+                self._send_empty(400)
+                return
+            self._send_text(json.dumps(viewer.commands_after(after)), "application/json", True)
+            return
+        if method != "POST" or action not in ("ready", "status"):
+            self._send_empty(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError(body)
+            if action == "ready":
+                viewer.mark_ready(body)
+            else:
+                viewer.report(body)
+        except (TypeError, ValueError):
+            self._send_empty(400)
+            return
+        self._send_empty(204)
+
+    def _serve_thumbnail(self, url, send_body):
+        path = self.server.authorize(url.path, THUMBNAILS_PREFIX)
+        if path is None or not os.path.isfile(path) or not path.lower().endswith(thumbnails.SUPPORTED_EXTENSIONS):
+            self._send_empty(404)
+            return
+        key, png_path = thumbnails.get_cache(self.server.models_dir).get(path, THUMBNAIL_TIMEOUT)
+        if png_path is None:
+            self._send_empty(404)
+            return
+        # The key changes with the model's content, so it is a strong validator
+        validators = [("ETag", f'"{key}"'), ("Cache-Control", "no-cache")]
+        if self._not_modified(f'"{key}"', os.stat(png_path).st_mtime):
+            self._send_empty(304, validators)
+            return
+        with open(png_path, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in validators:
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _serve_schedule(self, path, camera, send_body):
+        try:
+            position = [float(value) for value in camera.split(",")]
+            if len(position) != 3:
+                raise ValueError(camera)
+        except ValueError:
+            self._send_empty(400)
+            return
+        tileset = tiler.load_tileset(os.path.dirname(path))
+        if tileset is None:
+            self._send_empty(404)
+            return
+        tileset['schedule'] = tiler.stream_schedule(tileset, position)
+        self._send_text(json.dumps(tileset), "application/json", send_body)
+
+    def _send_text(self, text, mime_type, send_body):
+        body = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", mime_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+
+class ModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, viewer_dir, models_dir, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.viewer_dir = os.path.abspath(viewer_dir)
+        self.models_dir = os.path.abspath(models_dir)
+        try:
+            super().__init__((host, port), StaticHandler)
+        except OSError:
+            # Port taken (e.g. by a manually started npm demo server); use any free port
+            super().__init__((host, 0), StaticHandler)
+        self._access_tokens = {}  # user_id -> secret its model and thumbnail URLs carry
+        self._access_lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, name="archeon-model-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path=""):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    @property
+    def metrics_url(self):
+        return self.url(METRICS_PATH)
+
+    def access_token(self, user_id):
+        """The secret user_id's model and thumbnail URLs carry, issued on first use."""
+        with self._access_lock:
+            token = self._access_tokens.get(user_id)
+            if token is None:
+                token = self._access_tokens[user_id] = secrets.token_urlsafe(24)
+            return token
+
+    def revoke(self, user_id):
+        """Invalidate user_id's URLs, e.g. on logout; the next model_url issues a new token."""
+        with self._access_lock:
+            self._access_tokens.pop(user_id, None)
+
+    def model_url(self, user_id, file_name):
+        return self.url(f"{MODELS_PREFIX.strip('/')}/{self.access_token(user_id)}/{user_id}/{file_name}")
+
+    def thumbnail_url(self, user_id, file_name):
+        return self.url(f"{THUMBNAILS_PREFIX.strip('/')}/{self.access_token(user_id)}/{user_id}/{quote(file_name)}")
+
+    def authorize(self, url_path, prefix):
+        """The model file a prefix/<token>/<user>/<path> URL names, or None unless token is that user's."""
+        url_path = posixpath.normpath(unquote(url_path))
+        if not url_path.startswith(prefix):
+            return None
+        token, _, rel_path = url_path[len(prefix):].partition("/")
+        user_id = rel_path.partition("/")[0]
+        with self._access_lock:
+            expected = self._access_tokens.get(user_id)
+        if not user_id or expected is None or not secrets.compare_digest(token.encode(), expected.encode()):
+            return None
+        return self.resolve(MODELS_PREFIX + quote(rel_path))
+
+    def resolve(self, url_path):
+        """Map a URL path to a file under the viewer or models root, or None."""
+        url_path = posixpath.normpath(unquote(url_path))
+        if url_path.startswith(MODELS_PREFIX):
+            root, rel_path = self.models_dir, url_path[len(MODELS_PREFIX):]
+            # Keep the blob store, manifests and stamps private; artifacts are viewer files
+            if any(part.startswith(".") and part != ARTIFACTS_DIRNAME for part in rel_path.split("/")):
+                return None
+        else:
+            root, rel_path = self.viewer_dir, url_path.lstrip("/")
+        path = os.path.normpath(os.path.join(root, *[part for part in rel_path.split("/") if part]))
+        if path != root and not path.startswith(root + os.sep):
+            return None
+        if os.path.isdir(path):
+            for index in ("index.html", "index.htm"):
+                if os.path.isfile(os.path.join(path, index)):
+                    return os.path.join(path, index)
+        return path
+
+
+def ensure_server(viewer_dir=WEB_VIEWER_DIR, models_dir="downloads", host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Start the process-wide model server on first use and return it."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ModelServer(viewer_dir, models_dir, host, port)
+        return _server
+
+
+def current_server():
+    """Return the process-wide model server if something has started it, else None."""
+    return _server
@@ -0,0 +1,267 @@
+"""Vectorized Gaussian splat readers for .ply and .splat scenes.
+
+Files are memory-mapped and decoded with structured NumPy dtypes into a
+SplatData of per-splat arrays, using the same conventions as the web
+viewer's UncompressedSplatArray: linear scales, (w, x, y, z) normalized
+rotations, 0-255 colour/opacity and channel-grouped SH coefficients.
+"""
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from . import ordering
+
+SH_C0 = 0.28209479177387814
+PLY_END_HEADER = b"end_header"
+SPLAT_ROW_BYTES = 32
+
+# PLY property types and their little-endian NumPy equivalents
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': '<i2', 'int16': '<i2', 'ushort': '<u2', 'uint16': '<u2',
+    'int': '<i4', 'int32': '<i4', 'uint': '<u4', 'uint32': '<u4',
+    'float': '<f4', 'float32': '<f4', 'double': '<f8', 'float64': '<f8',
+}
+
+# Coefficients per splat for each SH degree, as in the web viewer
+SH_COMPONENTS = {0: 0, 1: 9, 2: 24, 3: 45}
+
+PLY_FORMAT_INRIA_V1 = "inria_v1"
+PLY_FORMAT_INRIA_V2 = "inria_v2"
+PLY_FORMAT_PLAYCANVAS = "playcanvas_compressed"
+
+
+@dataclass
+class SplatData:
+    centers: np.ndarray    # (N, 3) float32
+    scales: np.ndarray     # (N, 3) float32, linear (already exp'd)
+    rotations: np.ndarray  # (N, 4) float32, normalized (w, x, y, z)
+    colors: np.ndarray     # (N, 4) uint8 RGBA; alpha is opacity
+    sh: np.ndarray         # (N, SH_COMPONENTS[sh_degree]) float32
+    sh_degree: int = 0
+
+    def __len__(self):
+        return len(self.centers)
+
+    def subset(self, index):
+        """Splats selected by a boolean mask or index array, in that order."""
+        return SplatData(self.centers[index], self.scales[index], self.rotations[index],
+                         self.colors[index], self.sh[index], self.sh_degree)
+
+    def reduce_sh(self, sh_degree):
+        """Drop SH bands above sh_degree; degree 1 coefficients are stored first."""
+        sh_degree = min(sh_degree, self.sh_degree)
+        return SplatData(self.centers, self.scales, self.rotations, self.colors,
+                         self.sh[:, :SH_COMPONENTS[sh_degree]], sh_degree)
+
+
+@dataclass
+class PlyHeader:
+    format: str
+    vertex_count: int
+    properties: list  # [(name, ply_type)] for the vertex element
+    data_offset: int  # Byte offset of the vertex data
+    elements: list    # [(name, count)] for every element, in file order
+    sh_degree: int = 0
+    element_properties: dict = field(default_factory=dict)  # Element name -> [(name, ply_type)]
+
+    @property
+    def dtype(self):
+        return np.dtype([(name, PLY_TYPES[ply_type]) for name, ply_type in self.properties])
+
+    def element_dtype(self, element):
+        if any(ply_type == "list" for _, ply_type in self.element_properties[element]):
+            raise ValueError(f"PLY element '{element}' has variable-size records")
+        return np.dtype([(name, PLY_TYPES[ply_type]) for name, ply_type in self.element_properties[element]])
+
+    def element_offset(self, element):
+        """Byte offset of an element's records, from the sizes of the elements before it."""
+        offset = self.data_offset
+        for name, count in self.elements:
+            if name == element:
+                return offset
+            offset += count * self.element_dtype(name).itemsize
+        raise KeyError(element)
+
+
+def stored_sh_degree(coefficients_per_channel):
+    """SH degree of the f_rest coefficients a file stores (0-3); the viewer uses at most 2."""
+    return 3 if coefficients_per_channel >= 15 else 2 if coefficients_per_channel >= 8 \
+        else 1 if coefficients_per_channel >= 3 else 0
+
+
+def read_ply_header(path, max_header_bytes=1 << 16):
+    """Parse a binary little-endian PLY header without reading the body."""
+    with open(path, 'rb') as f:
+        head = f.read(max_header_bytes)
+    end = head.find(PLY_END_HEADER)
+    if not head.startswith(b"ply") or end < 0:
+        raise ValueError(f"{path} is not a PLY file")
+    data_offset = head.index(b"\n", end) + 1
+    lines = [line.strip() for line in head[:end].decode('ascii', 'replace').splitlines()]
+
+    ply_format = PLY_FORMAT_INRIA_V1
+    elements, element_properties = [], {}
+    current = None
+    for line in lines:
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == "format" and parts[1] != "binary_little_endian":
+            raise ValueError(f"Unsupported PLY encoding '{parts[1]}' in {path}")
+        if parts[0] == "element":
+            current = parts[1]
+            elements.append((current, int(parts[2])))
+            element_properties[current] = []
+            if current == "chunk":
+                ply_format = PLY_FORMAT_PLAYCANVAS
+            elif current == "codebook_centers":
+                ply_format = PLY_FORMAT_INRIA_V2
+        elif parts[0] == "property" and current is not None:
+            if parts[1] == "list":
+                if current == "vertex":
+                    raise ValueError(f"List properties are not supported in {path}")
+                element_properties[current].append((parts[-1], "list"))  # Variable-size; never decoded
+                continue
+            element_properties[current].append((parts[2], parts[1]))
+            if current == "vertex" and "packed_" in parts[2]:
+                ply_format = PLY_FORMAT_PLAYCANVAS
+
+    vertex_count = dict(elements).get("vertex", 0)
+    properties = element_properties.get("vertex", [])
+    # Same rule as PlyParserUtils: degree from f_rest coefficients per channel
+    per_channel = sum(1 for name, _ in properties if name.startswith("f_rest")) // 3
+    sh_degree = 2 if per_channel >= 8 else 1 if per_channel >= 3 else 0
+    return PlyHeader(ply_format, vertex_count, properties, data_offset, elements, sh_degree, element_properties)
+
+
+def check_vertex_layout(path, header):
+    """Raise ValueError unless the PLY is INRIA v1 with its vertex records first."""
+    if header.format != PLY_FORMAT_INRIA_V1:
+        raise ValueError(f"{os.path.basename(path)}: {header.format} PLY files are not supported by the converter")
+    if not header.elements or header.elements[0][0] != "vertex":
+        raise ValueError(f"{os.path.basename(path)}: vertex data must be the first PLY element")
+
+
+def map_ply_vertices(path, header=None):
+    """Memory-map the vertex records of an INRIA v1 PLY as a structured array."""
+    header = header or read_ply_header(path)
+    check_vertex_layout(path, header)
+    return np.memmap(path, dtype=header.dtype, mode='r', offset=header.data_offset, shape=(header.vertex_count,))
+
+
+def _field(vertices, name, dtype=np.float64):
+    """Read one property as floats, normalizing uchar values to 0-1 like the viewer."""
+    values = vertices[name]
+    if values.dtype == np.uint8:
+        return values.astype(dtype) / 255.0
+    return values.astype(dtype)
+
+
+def _normalize_quaternions(q):
+    length = np.sqrt(np.sum(q * q, axis=1, keepdims=True))
+    degenerate = length[:, 0] == 0
+    q = np.divide(q, length, out=np.zeros_like(q), where=length != 0)
+    # Like THREE.Quaternion.normalize(), which the viewer applies to (rot_0, ..., rot_3),
+    # a zero quaternion becomes (0, 0, 0, 1) in stored order
+    q[degenerate] = (0.0, 0.0, 0.0, 1.0)
+    return q
+
+
+def _to_byte(values):
+    return np.clip(np.floor(values), 0, 255).astype(np.uint8)
+
+
+def decode_ply_vertices(vertices, header, sh_degree=0):
+    """Decode PLY vertex records (e.g. a memmap slice) into SplatData."""
+    names = set(vertices.dtype.names)
+    count = len(vertices)
+    sh_degree = min(sh_degree, header.sh_degree)
+
+    centers = np.stack([_field(vertices, axis, np.float32) for axis in ("x", "y", "z")], axis=1)
+
+    if "scale_0" in names:
+        scales = np.exp(np.stack([_field(vertices, f"scale_{i}") for i in range(3)], axis=1))
+    else:
+        scales = np.full((count, 3), 0.01)
+
+    if "rot_0" in names:
+        rotations = _normalize_quaternions(np.stack([_field(vertices, f"rot_{i}") for i in range(4)], axis=1))
+    else:
+        rotations = np.tile([1.0, 0.0, 0.0, 0.0], (count, 1))
+
+    colors = np.zeros((count, 4), dtype=np.uint8)
+    if "f_dc_0" in names:
+        for i in range(3):
+            colors[:, i] = _to_byte((0.5 + SH_C0 * _field(vertices, f"f_dc_{i}")) * 255)
+    elif "red" in names:
+        for i, channel in enumerate(("red", "green", "blue")):
+            colors[:, i] = _to_byte(_field(vertices, channel) * 255)
+    if "opacity" in names:
+        colors[:, 3] = _to_byte(255.0 / (1.0 + np.exp(-_field(vertices, "opacity"))))
+
+    sh = np.zeros((count, SH_COMPONENTS[sh_degree]), dtype=np.float32)
+    if sh_degree >= 1:
+        per_channel = sum(1 for name in names if name.startswith("f_rest")) // 3
+        columns = []
+        # Degree 1 coefficients for R, G, B, then degree 2 for R, G, B
+        for first, width in ((0, 3), (3, 5))[:sh_degree]:
+            for rgb in range(3):
+                for i in range(width):
+                    columns.append(f"f_rest_{first + i + per_channel * rgb}")
+        for out_index, name in enumerate(columns):
+            sh[:, out_index] = _field(vertices, name, np.float32)
+
+    return SplatData(centers, scales.astype(np.float32), rotations.astype(np.float32), colors, sh, sh_degree)
+
+
+def load_ply(path, sh_degree=0):
+    header = read_ply_header(path)
+    return decode_ply_vertices(map_ply_vertices(path, header), header, sh_degree)
+
+
+def importance_order(splats):
+    """Splat indices, most visually significant first (see ordering.importance)."""
+    return np.argsort(-ordering.importance(splats), kind='stable')
+
+
+def splat_dtype():
+    return np.dtype([('center', '<f4', 3), ('scale', '<f4', 3), ('color', 'u1', 4), ('rotation', 'u1', 4)])
+
+
+def decode_splat_rows(rows):
+    """Decode standard 32-byte .splat rows into SplatData."""
+    rotations = _normalize_quaternions((rows['rotation'].astype(np.float64) - 128.0) / 128.0)
+    return SplatData(np.array(rows['center'], dtype=np.float32), np.array(rows['scale'], dtype=np.float32),
+                     rotations.astype(np.float32), np.array(rows['color']),
+                     np.zeros((len(rows), 0), dtype=np.float32), 0)
+
+
+def load_splat(path):
+    size = os.path.getsize(path)
+    rows = np.memmap(path, dtype=splat_dtype(), mode='r', shape=(size // SPLAT_ROW_BYTES,))
+    return decode_splat_rows(rows)
+
+
+def load_scene(path, sh_degree=0):
+    lower = path.lower()
+    if lower.endswith(".ply"):
+        return load_ply(path, sh_degree)
+    if lower.endswith(".splat"):
+        return load_splat(path)
+    raise ValueError(f"Unsupported scene format: {os.path.basename(path)}")
+
+
+def encode_splat_rows(splats):
+    """Encode SplatData as standard 32-byte .splat rows."""
+    rows = np.empty(len(splats), dtype=splat_dtype())
+    rows['center'] = splats.centers
+    rows['scale'] = splats.scales
+    rows['color'] = splats.colors
+    rows['rotation'] = np.clip(np.round(splats.rotations * 128.0 + 128.0), 0, 255).astype(np.uint8)
+    return rows
+
+
+def write_splat(splats, path):
+    encode_splat_rows(splats).tofile(path)
@@ -0,0 +1,200 @@
+"""SPZ (version 2) encoder and decoder matching the viewer's SpzLoader.js.
+
+Attributes are quantized chunk by chunk on a thread pool (NumPy releases
+the GIL) into the attribute-major SPZ layout, then deflated pigz-style:
+every chunk is compressed independently on the pool, primed with the
+previous chunk's last 32 KiB as a dictionary and ended on a sync flush, so
+the pieces join into one ordinary gzip member that browsers can inflate.
+"""
+import gzip
+import math
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import splats
+
+SPZ_MAGIC = 0x5053474e
+SPZ_VERSION = 2
+HEADER_FORMAT = "<IIIBBBB"
+COLOR_SCALE = 0.15
+DEFAULT_FRACTIONAL_BITS = 12
+POSITION_LIMIT = 1 << 23  # Signed 24-bit fixed point
+SH_DIMS = {0: 0, 1: 3, 2: 8, 3: 15}
+# Quantization bits for degree 1 and higher SH coefficients, as in the reference encoder
+SH1_BITS = 5
+SH_REST_BITS = 4
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_CHUNK_SPLATS = 262144
+DEFLATE_CHUNK_BYTES = 4 * 1024 * 1024
+DEFLATE_WINDOW = 32 * 1024
+DEFAULT_LEVEL = 6
+
+# Viewer SH slot for (channel j, coefficient k): SH_INDEX_MAP[j * 15 + k]
+SH_INDEX_MAP = (
+    0, 1, 2, 9, 10, 11, 12, 13, 24, 25, 26, 27, 28, 29, 30,
+    3, 4, 5, 14, 15, 16, 17, 18, 31, 32, 33, 34, 35, 36, 37,
+    6, 7, 8, 19, 20, 21, 22, 23, 38, 39, 40, 41, 42, 43, 44,
+)
+
+
+@dataclass
+class EncodeResult:
+    splats: int
+    input_bytes: int   # Uncompressed float32 size of the scene
+    packed_bytes: int  # Quantized size before deflate
+    output_bytes: int
+    seconds: float
+
+    @property
+    def ratio(self):
+        return self.input_bytes / self.output_bytes if self.output_bytes else 0.0
+
+    @property
+    def throughput(self):
+        """Input bytes encoded per second."""
+        return self.input_bytes / self.seconds if self.seconds else 0.0
+
+
+def fractional_bits_for(centers, preferred=DEFAULT_FRACTIONAL_BITS):
+    """Largest precision (up to preferred) that keeps every coordinate in 24 bits."""
+    extent = float(np.abs(centers).max()) if len(centers) else 0.0
+    if extent == 0.0:
+        return preferred
+    return int(max(0, min(preferred, math.floor(math.log2((POSITION_LIMIT - 1) / extent)))))
+
+
+def _quantize_sh(values, bits):
+    q = np.round(values * 128.0 + 128.0)
+    bucket = 1 << (8 - bits)
+    q = np.floor((q + bucket / 2) / bucket) * bucket
+    return np.clip(q, 0, 255).astype(np.uint8)
+
+
+def _quantize_chunk(scene, start, end, out, fractional_bits):
+    """Quantize splats [start, end) into the preallocated attribute arrays in out."""
+    fixed = np.round(scene.centers[start:end].astype(np.float64) * (1 << fractional_bits)).astype(np.int64)
+    fixed = np.clip(fixed, -POSITION_LIMIT, POSITION_LIMIT - 1) & 0xffffff
+    positions = out['positions'][start:end]
+    for byte in range(3):
+        positions[:, :, byte] = (fixed >> (8 * byte)) & 0xff
+
+    out['alphas'][start:end] = scene.colors[start:end, 3]
+    # Recover the DC coefficient from the 8-bit colour (midpoint of its bucket)
+    dc = ((scene.colors[start:end, :3] + 0.5) / 255.0 - 0.5) / splats.SH_C0
+    out['colors'][start:end] = np.clip(np.round((dc * COLOR_SCALE + 0.5) * 255.0), 0, 255)
+
+    log_scales = np.log(np.maximum(scene.scales[start:end].astype(np.float64), 1e-30))
+    out['scales'][start:end] = np.clip(np.round((log_scales + 10.0) * 16.0), 0, 255)
+
+    # (w, x, y, z) -> xyz with w >= 0, since the loader rebuilds w as sqrt(1 - |xyz|^2)
+    rotations = scene.rotations[start:end].astype(np.float64)
+    xyz = rotations[:, 1:] * np.where(rotations[:, :1] < 0, -1.0, 1.0)
+    out['rotations'][start:end] = np.clip(np.round((xyz + 1.0) * 127.5), 0, 255)
+
+    dim = SH_DIMS[scene.sh_degree]
+    if dim:
+        sh = out['sh'][start:end]
+        for k in range(dim):
+            bits = SH1_BITS if k < 3 else SH_REST_BITS
+            for j in range(3):
+                sh[:, k, j] = _quantize_sh(scene.sh[start:end, SH_INDEX_MAP[j * 15 + k]], bits)
+
+
+def pack(scene, fractional_bits=None, workers=DEFAULT_WORKERS, chunk_splats=DEFAULT_CHUNK_SPLATS):
+    """Uncompressed SPZ payload (header plus attribute arrays) for scene."""
+    if scene.sh_degree > 2:
+        raise ValueError("SPZ export supports SH degree up to 2")
+    count = len(scene)
+    if fractional_bits is None:
+        fractional_bits = fractional_bits_for(scene.centers)
+    out = {
+        'positions': np.zeros((count, 3, 3), dtype=np.uint8),
+        'alphas': np.zeros(count, dtype=np.uint8),
+        'colors': np.zeros((count, 3), dtype=np.uint8),
+        'scales': np.zeros((count, 3), dtype=np.uint8),
+        'rotations': np.zeros((count, 3), dtype=np.uint8),
+        'sh': np.zeros((count, SH_DIMS[scene.sh_degree], 3), dtype=np.uint8),
+    }
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_quantize_chunk, scene, start, min(start + chunk_splats, count), out, fractional_bits)
+                   for start in range(0, count, chunk_splats)]
+        for future in futures:
+            future.result()
+
+    header = struct.pack(HEADER_FORMAT, SPZ_MAGIC, SPZ_VERSION, count, scene.sh_degree, fractional_bits, 0, 0)
+    return b"".join([header] + [out[name].tobytes() for name in
+                                ('positions', 'alphas', 'colors', 'scales', 'rotations', 'sh')])
+
+
+def _deflate_chunk(data, start, end, level):
+    zdict = data[max(0, start - DEFLATE_WINDOW):start]
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict) if zdict else \
+        zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    last = end == len(data)
+    return compressor.compress(data[start:end]) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def parallel_gzip(data, workers=DEFAULT_WORKERS, level=DEFAULT_LEVEL, chunk_bytes=DEFLATE_CHUNK_BYTES):
+    """Single-member gzip of data, with chunks deflated concurrently."""
+    view = memoryview(data)
+    bounds = [(start, min(start + chunk_bytes, len(data))) for start in range(0, len(data), chunk_bytes)] or [(0, 0)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pieces = list(pool.map(lambda bound: _deflate_chunk(view, bound[0], bound[1], level), bounds))
+    header = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+    trailer = struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+    return b"".join([header] + pieces + [trailer])
+
+
+def encode_spz(scene, path, workers=DEFAULT_WORKERS, level=DEFAULT_LEVEL, fractional_bits=None):
+    """Write scene as a .spz file; returns size and timing stats."""
+    start = time.perf_counter()
+    payload = pack(scene, fractional_bits, workers)
+    compressed = parallel_gzip(payload, workers, level)
+    with open(path, 'wb') as f:
+        f.write(compressed)
+    seconds = time.perf_counter() - start
+    input_bytes = len(scene) * (4 * (3 + 3 + 4) + 4 + 4 * scene.sh.shape[1])
+    return EncodeResult(len(scene), input_bytes, len(payload), len(compressed), seconds)
+
+
+def decode_spz(path):
+    """Read a version 2 .spz file back into SplatData (inverse of encode_spz)."""
+    with open(path, 'rb') as f:
+        data = gzip.decompress(f.read())
+    magic, version, count, sh_degree, fractional_bits, _, _ = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != SPZ_MAGIC or version != SPZ_VERSION:
+        raise ValueError(f"{os.path.basename(path)} is not a version {SPZ_VERSION} SPZ file")
+    dim = SH_DIMS[sh_degree]
+    offset = struct.calcsize(HEADER_FORMAT)
+    arrays = {}
+    for name, shape in (('positions', (count, 3, 3)), ('alphas', (count,)), ('colors', (count, 3)),
+                        ('scales', (count, 3)), ('rotations', (count, 3)), ('sh', (count, dim, 3))):
+        size = int(np.prod(shape))
+        arrays[name] = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset).reshape(shape)
+        offset += size
+
+    raw = arrays['positions'].astype(np.int32)
+    fixed = raw[:, :, 0] | raw[:, :, 1] << 8 | raw[:, :, 2] << 16
+    fixed = np.where(fixed & 0x800000, fixed - (1 << 24), fixed)
+    centers = (fixed / float(1 << fractional_bits)).astype(np.float32)
+    scales = np.exp(arrays['scales'] / 16.0 - 10.0).astype(np.float32)
+    xyz = arrays['rotations'] / 127.5 - 1.0
+    w = np.sqrt(np.maximum(0.0, 1.0 - np.sum(xyz * xyz, axis=1, keepdims=True)))
+    rotations = np.concatenate([w, xyz], axis=1)
+    rotations = (rotations / np.linalg.norm(rotations, axis=1, keepdims=True)).astype(np.float32)
+    colors = np.empty((count, 4), dtype=np.uint8)
+    dc = (arrays['colors'] / 255.0 - 0.5) / COLOR_SCALE
+    colors[:, :3] = np.clip(np.floor((dc * splats.SH_C0 + 0.5) * 255.0), 0, 255)
+    colors[:, 3] = arrays['alphas']
+    sh = np.zeros((count, splats.SH_COMPONENTS[min(sh_degree, 2)]), dtype=np.float32)
+    for k in range(min(dim, SH_DIMS[2])):
+        for j in range(3):
+            sh[:, SH_INDEX_MAP[j * 15 + k]] = (arrays['sh'][:, k, j] - 128.0) / 128.0
+    return splats.SplatData(centers, scales, rotations, colors, sh, min(sh_degree, 2))
@@ -0,0 +1,108 @@
+"""Firebase Storage listing and object metadata lookups."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from . import telemetry
+from .downloader import DEFAULT_WORKERS, REQUEST_TIMEOUT, object_url
+
+# Metadata fields the sync engine cares about
+METADATA_FIELDS = ("name", "generation", "md5Hash", "size", "updated", "contentType")
+LIST_PAGE_SIZE = 1000
+METADATA_WORKERS = 8
+# Seconds a previous sync's metadata is trusted before the object is looked up again
+METADATA_MAX_AGE = float(os.environ.get("ARCHEON_METADATA_MAX_AGE", 3600))
+
+
+def list_objects(session, base_url, prefix, page_size=LIST_PAGE_SIZE):
+    """List every object item under prefix, following nextPageToken."""
+    items = []
+    params = {'prefix': prefix, 'maxResults': page_size}
+    with telemetry.span("list", prefix=prefix) as fields:
+        while True:
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url, params=params, timeout=REQUEST_TIMEOUT)
+            except requests.exceptions.RequestException:
+                telemetry.record_error("list", retried=False)
+                raise
+            telemetry.record_response("list", response, time.perf_counter() - start)
+            response.raise_for_status()
+            page = response.json()
+            items.extend(item for item in page.get('items', []) if 'name' in item)
+            fields['pages'] = fields.get('pages', 0) + 1
+            fields['objects'] = len(items)
+            token = page.get('nextPageToken')
+            if not token:
+                return items
+            params['pageToken'] = token
+
+
+def list_object_names(session, base_url, prefix, page_size=LIST_PAGE_SIZE):
+    return [item['name'] for item in list_objects(session, base_url, prefix, page_size)]
+
+
+def _trim(raw, cloud_path):
+    metadata = {field: raw.get(field) for field in METADATA_FIELDS}
+    metadata['name'] = metadata['name'] or cloud_path
+    try:
+        metadata['size'] = int(metadata['size'])
+    except (TypeError, ValueError):
+        metadata['size'] = None
+    metadata['checked'] = time.time()
+    return metadata
+
+
+def fetch_metadata(session, base_url, cloud_path):
+    """Return the trimmed metadata dict for one object, or None if unavailable."""
+    start = time.perf_counter()
+    try:
+        response = session.get(object_url(base_url, cloud_path), timeout=REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException:
+        telemetry.record_error("metadata", retried=False)
+        return None
+    telemetry.record_response("metadata", response, time.perf_counter() - start)
+    try:
+        response.raise_for_status()
+        raw = response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    return _trim(raw, cloud_path)
+
+
+def fetch_metadata_many(session, base_url, cloud_paths, workers=DEFAULT_WORKERS):
+    """Look up metadata for several objects concurrently, keyed by cloud path."""
+    with telemetry.span("metadata", objects=len(cloud_paths)), ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [telemetry.submit(pool, fetch_metadata, session, base_url, path) for path in cloud_paths]
+        return dict(zip(cloud_paths, (future.result() for future in futures)))
+
+
+def list_models(session, base_url, prefix, workers=METADATA_WORKERS, known=None, max_age=None):
+    """List objects under prefix with their metadata, in listing order.
+
+    The v0 list endpoint usually returns names only. Metadata the listing
+    does carry is used as is; otherwise known metadata (cloud path -> dict
+    with a 'checked' time, e.g. manifest.known_metadata) younger than
+    max_age (METADATA_MAX_AGE by default) is reused, so a no-op sync costs one list request instead of
+    one lookup per object. The rest is fetched per object; objects whose
+    lookup fails still appear with an unknown size.
+    """
+    known = known or {}
+    max_age = METADATA_MAX_AGE if max_age is None else max_age
+    now = time.time()
+    models, missing = {}, []
+    items = list_objects(session, base_url, prefix)
+    for item in items:
+        name = item['name']
+        previous = known.get(name)
+        if item.get('generation') or item.get('md5Hash'):
+            models[name] = _trim(item, name)
+        elif previous is not None and now - (previous.get('checked') or 0) < max_age:
+            models[name] = previous
+        else:
+            missing.append(name)
+    if missing:
+        models.update(fetch_metadata_many(session, base_url, missing, workers))
+    return [models[item['name']] or {'name': item['name'], 'size': None} for item in items]
@@ -0,0 +1,217 @@
+"""Sync pipeline for one user's model library, independent of the UI.
+
+Progress is reported through a ByteProgress and a log(level, message)
+callback so the same pipeline can run inline, in a background job, from the
+headless CLI (cli.py) or from a script.
+"""
+import os
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from . import blobstore, downloader, library, manifest, preprocess, provision, scheduler, storage, telemetry
+
+VIEWER_SOURCE_DIR = "./viewer"
+DOWNLOADS_DIR = "downloads"
+
+
+@dataclass
+class SyncSummary:
+    downloaded: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    linked: List[str] = field(default_factory=list)  # Served from the local blob store
+    deleted: List[str] = field(default_factory=list)
+    artifacts: Optional[preprocess.PreprocessSummary] = None  # Set when viewer artifacts were built after the sync
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+def _ignore_log(level, message):
+    pass
+
+
+def user_cloud_dir(user_id):
+    return f"models/{user_id}/"
+
+
+def user_local_dir(user_id, downloads_dir=DOWNLOADS_DIR):
+    return os.path.join(downloads_dir, user_id)
+
+
+# Ensure viewer content is in the right directory
+def ensure_viewer_contents(local_dir, source_viewer_dir=VIEWER_SOURCE_DIR, mode=provision.DEFAULT_MODE):
+    with telemetry.span("provision", local_dir=local_dir, mode=mode) as fields:
+        counts = provision.provision_viewer(local_dir, source_viewer_dir, mode)
+        fields['files'] = counts
+        return counts
+
+
+def sync_user(session, base_url, cloud_dir, local_dir, progress=None, control=None,
+              log=_ignore_log, workers=downloader.DEFAULT_WORKERS, on_result=None, on_tick=None, store=None,
+              transfers=None, owner=None):
+    """Bring local_dir in line with the objects under cloud_dir.
+
+    With a BlobStore, objects whose md5Hash is already stored (e.g. synced
+    by another user) are linked instead of downloaded, and new downloads are
+    added to the store. With a scheduler.Scheduler as transfers, downloads
+    are queued there as owner's rather than run on a private pool.
+
+    on_result/on_tick are forwarded to downloader.download_many and so run
+    on the calling thread. Each run is traced as a "sync" span (see
+    telemetry.py) with nested list, metadata, provision, plan and download
+    phases.
+    """
+    with telemetry.span("sync", cloud_dir=cloud_dir) as fields:
+        summary = _sync_user(session, base_url, cloud_dir, local_dir, progress, control, log, workers,
+                             on_result, on_tick, store, transfers, owner)
+        fields.update(downloaded=len(summary.downloaded), failed=len(summary.failed), unchanged=summary.unchanged,
+                      linked=len(summary.linked), deleted=len(summary.deleted))
+        return summary
+
+
+def _sync_user(session, base_url, cloud_dir, local_dir, progress, control, log, workers, on_result, on_tick, store,
+               transfers, owner):
+    os.makedirs(local_dir, exist_ok=True)
+    ensure_viewer_contents(local_dir)  # Ensure viewer contents are in the user's directory
+
+    # Compare fresh remote metadata against the local manifest and only
+    # transfer objects that are new, changed or incomplete on disk
+    sync_manifest = manifest.load_manifest(local_dir)
+    remote = {model['name']: model for model in
+              storage.list_models(session, base_url, cloud_dir, known=manifest.known_metadata(sync_manifest))}
+    with telemetry.span("plan", objects=len(remote)) as fields:
+        plan = manifest.plan_sync(local_dir, sync_manifest, remote)
+        for metadata in plan.unchanged:
+            # Remember when unchanged objects were last confirmed, so the next sync can reuse it
+            sync_manifest[metadata['name']]['checked'] = metadata.get('checked')
+        fields.update(download=len(plan.download), unchanged=len(plan.unchanged), delete=len(plan.delete))
+
+    summary = SyncSummary(unchanged=len(plan.unchanged))
+    if not remote and not sync_manifest:
+        log("info", "No files to sync.")
+        return summary
+
+    summary.deleted = manifest.apply_deletions(local_dir, sync_manifest, plan.delete)
+    for cloud_path in summary.deleted:
+        if store is not None:
+            store.release(os.path.join(local_dir, manifest.local_name(cloud_path)))
+        log("info", f"🗑️ Removed {os.path.basename(cloud_path)} (deleted from cloud)")
+    if plan.unchanged:
+        log("info", f"ℹ️ {len(plan.unchanged)} model(s) already up to date, skipping...")
+    if store is not None:
+        # Fold files synced before the store existed into it so other users can share them
+        for metadata in plan.unchanged:
+            local_path = os.path.join(local_dir, manifest.local_name(metadata['name']))
+            if metadata.get('md5Hash') and not store.references(metadata['md5Hash'], local_path):
+                store.ingest(local_path, metadata['md5Hash'])
+
+    tasks = []
+    for metadata in plan.download:
+        local_path = os.path.join(local_dir, manifest.local_name(metadata['name']))
+        if store is not None and metadata.get('md5Hash') and store.link_into(metadata['md5Hash'], local_path):
+            sync_manifest[metadata['name']] = manifest.manifest_entry(metadata)
+            summary.linked.append(metadata['name'])
+            log("success", f"🔗 Linked {os.path.basename(metadata['name'])} from local store")
+            continue
+        tasks.append(downloader.DownloadTask(metadata['name'], local_path, metadata.get('size'),
+                                             metadata.get('md5Hash'), metadata.get('generation')))
+    if progress is None:
+        progress = downloader.ByteProgress()
+    progress.total_files += len(tasks)
+    for task in tasks:
+        if task.size is not None:
+            progress.add_total(task.size)
+
+    def record_result(result):
+        file_name = os.path.basename(result.task.cloud_path)
+        if result.ok:
+            if store is not None and result.task.md5_hash:
+                store.ingest(result.task.local_path, result.task.md5_hash)
+            sync_manifest[result.task.cloud_path] = manifest.manifest_entry(remote[result.task.cloud_path])
+            summary.downloaded.append(result.task.cloud_path)
+            log("success", f"✔️ Downloaded {file_name}")
+        else:
+            summary.failed.append(result.task.cloud_path)
+            log("error", f"❌ Failed to download {file_name}")
+        if on_result is not None:
+            on_result(result)
+
+    try:
+        with telemetry.span("download", files=len(tasks), bytes=sum(task.size or 0 for task in tasks)):
+            downloader.download_many(session, base_url, tasks, progress, workers=workers, control=control,
+                                     on_result=record_result, on_tick=on_tick, scheduler=transfers, owner=owner)
+    finally:
+        # Persist whatever completed, even if the run was interrupted
+        manifest.save_manifest(local_dir, sync_manifest)
+        if store is not None:
+            store.gc()
+    return summary
+
+
+def sync_account(session, base_url, user_id, downloads_dir=DOWNLOADS_DIR, optimize=False, progress=None,
+                 control=None, log=_ignore_log, on_result=None, on_tick=None):
+    """Sync a user's library into downloads_dir/<user_id> through the shared blob store.
+
+    Downloads go through the process-wide scheduler, so syncs for several
+    users share its transfer slots and bandwidth caps. With optimize, viewer
+    artifacts are built afterwards (unless the run was cancelled) and their
+    summary is attached to the returned SyncSummary. The library index is
+    updated last, so the dashboard lists the new models' details.
+    """
+    local_dir = user_local_dir(user_id, downloads_dir)
+    summary = sync_user(session, base_url, user_cloud_dir(user_id), local_dir, progress, control, log,
+                        on_result=on_result, on_tick=on_tick, store=blobstore.get_store(downloads_dir),
+                        transfers=scheduler.get_scheduler(), owner=user_id)
+    if optimize and not (control is not None and control.cancelled):
+        # Convert new models once now so the viewer opens them without parsing raw .ply data
+        summary.artifacts = preprocess.run_preprocess(local_dir, log=log, control=control)
+    update_index(user_id, downloads_dir)
+    return summary
+
+
+def update_index(user_id, downloads_dir=DOWNLOADS_DIR):
+    """Re-scan the headers of new or changed models into the library index."""
+    with telemetry.span("index", user_id=user_id) as fields:
+        scanned, unchanged, removed = library.get_index(downloads_dir).update_user(
+            user_id, user_local_dir(user_id, downloads_dir))
+        fields.update(scanned=scanned, unchanged=unchanged, removed=removed)
+
+
+def open_model(session, base_url, user_id, metadata, downloads_dir=DOWNLOADS_DIR):
+    """Get one model onto disk ahead of any queued sync, for viewing it right away.
+
+    Returns (local_path, future). The future is already done if the model
+    is current locally or could be linked from the blob store; otherwise
+    the object is queued as urgent on the shared scheduler, and
+    downloader.available_bytes(local_path, live_only=True) reports how much
+    of it can be streamed so far (0 while it is still queued, even if an
+    older version is on disk). The file is added to the blob store once complete;
+    the manifest is left to the next sync, which adopts it by md5.
+    """
+    local_dir = user_local_dir(user_id, downloads_dir)
+    local_path = os.path.join(local_dir, manifest.local_name(metadata['name']))
+    store = blobstore.get_store(downloads_dir)
+    done = Future()
+    done.set_result(None)
+
+    plan = manifest.plan_sync(local_dir, manifest.load_manifest(local_dir), {metadata['name']: metadata})
+    if plan.unchanged:
+        return local_path, done
+    md5_hash = metadata.get('md5Hash')
+    if md5_hash and store.link_into(md5_hash, local_path):
+        return local_path, done
+
+    os.makedirs(local_dir, exist_ok=True)
+    task = downloader.DownloadTask(metadata['name'], local_path, metadata.get('size'), md5_hash,
+                                   metadata.get('generation'))
+    future = scheduler.get_scheduler().submit(user_id, session, base_url, task, urgent=True)
+
+    def share(finished):
+        if md5_hash and not finished.cancelled() and finished.exception() is None:
+            store.ingest(local_path, md5_hash)
+
+    future.add_done_callback(share)
+    return local_path, future
@@ -0,0 +1,246 @@
+"""Sync telemetry: metrics, phase spans and JSON event logs.
+
+The storage, download and sync code records into the process-wide registry
+here: request counts by HTTP status, request latency (time to response
+headers), retries, bytes and per-file transfer times, disk write and
+checksum time, and the duration of each sync phase (list, plan, provision,
+download). The registry renders in the Prometheus text format for the
+model server's /metrics endpoint.
+
+Spans and per-file transfers are also written as one JSON object per line
+to ARCHEON_TELEMETRY_LOG (a rotating file; "-" for stderr, empty to turn
+off). Each event carries the trace id of the sync it belongs to, and the
+most recent events are kept in memory for the app's status panel.
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+LOG_PATH = os.environ.get("ARCHEON_TELEMETRY_LOG", os.path.join("downloads", ".telemetry", "events.jsonl"))
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+RECENT_EVENTS = 1000
+RECENT_REQUESTS = 10000
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+COUNTER, GAUGE, HISTOGRAM = "counter", "gauge", "histogram"
+METRICS = {
+    'archeon_http_requests_total': (COUNTER, "Storage HTTP requests by operation and status ('error' if none)"),
+    'archeon_http_request_seconds': (HISTOGRAM, "Time to response headers for storage requests"),
+    'archeon_http_retries_total': (COUNTER, "Storage requests retried after an error or retryable status"),
+    'archeon_download_bytes_total': (COUNTER, "Object bytes received"),
+    'archeon_download_files_total': (COUNTER, "Object downloads finished, by result"),
+    'archeon_download_seconds': (HISTOGRAM, "Wall time per object download"),
+    'archeon_write_seconds_total': (COUNTER, "Time spent writing downloaded bytes to disk"),
+    'archeon_verify_seconds_total': (COUNTER, "Time spent checksumming downloaded files"),
+    'archeon_active_transfers': (GAUGE, "Object downloads in progress"),
+    'archeon_scheduler_queued': (GAUGE, "Object downloads waiting for a scheduler slot"),
+    'archeon_download_deduplicated_total': (COUNTER, "Downloads joined to an identical transfer queued or in flight"),
+    'archeon_throttle_seconds_total': (COUNTER, "Time transfers were held back by bandwidth caps"),
+    'archeon_phase_seconds': (HISTOGRAM, "Duration of sync phases"),
+}
+
+_trace = contextvars.ContextVar("archeon_trace", default=None)
+
+
+class Registry:
+    """Thread-safe labelled counters, gauges and histograms."""
+
+    def __init__(self, metrics=METRICS, buckets=LATENCY_BUCKETS):
+        self.metrics = metrics
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}  # (name, sorted label items) -> float, or [bucket counts, sum, count]
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, amount=1.0, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[self._key(name, labels)] = float(value)
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def value(self, name, **labels):
+        with self._lock:
+            return self._values.get(self._key(name, labels))
+
+    def total(self, name, where=None):
+        """Sum of a counter or gauge over its label sets, optionally filtered by where(labels)."""
+        with self._lock:
+            return sum(value for (metric, labels), value in self._values.items()
+                       if metric == name and (where is None or where(dict(labels))))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            items = sorted(self._values.items(), key=lambda item: item[0])
+            lines = []
+            for name, (kind, help_text) in self.metrics.items():
+                series = [(labels, value) for (metric, labels), value in items if metric == name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series:
+                    if kind != HISTOGRAM:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+registry = Registry()
+recent = deque(maxlen=RECENT_EVENTS)
+recent_requests = deque(maxlen=RECENT_REQUESTS)  # (ts, failed, retries) per request, for windowed rates
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _get_logger():
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            logger = logging.getLogger("archeon.telemetry")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            if not logger.handlers:
+                if LOG_PATH == "-":
+                    handler = logging.StreamHandler(sys.stderr)
+                elif LOG_PATH:
+                    os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+                    handler = RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                  encoding="utf-8")
+                else:
+                    handler = logging.NullHandler()
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+            _logger = logger
+        return _logger
+
+
+def event(kind, **fields):
+    """Record a structured event in the JSON log and the in-memory recent list."""
+    record = {'ts': round(time.time(), 3), 'event': kind}
+    trace = _trace.get()
+    if trace is not None:
+        record['trace'] = trace
+    record.update(fields)
+    recent.append(record)
+    try:
+        _get_logger().info(json.dumps(record, default=str))
+    except OSError:
+        pass  # Telemetry must never break a sync
+
+
+@contextmanager
+def span(phase, **fields):
+    """Time a phase into archeon_phase_seconds and log it; opens a trace if none is active.
+
+    The yielded dict can be filled with extra fields for the span's log event.
+    """
+    token = _trace.set(uuid.uuid4().hex[:16]) if _trace.get() is None else None
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        registry.observe('archeon_phase_seconds', seconds, phase=phase)
+        event("span", phase=phase, seconds=round(seconds, 6), status=status, **fields)
+        if token is not None:
+            _trace.reset(token)
+
+
+def submit(pool, func, *args, **kwargs):
+    """pool.submit that carries the current trace into the worker thread."""
+    return pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def retries_of(response):
+    """Retries urllib3 made inside the transport before returning response."""
+    retries = getattr(getattr(response, 'raw', None), 'retries', None)
+    return len(getattr(retries, 'history', None) or ())
+
+
+def record_response(op, response, seconds):
+    registry.inc('archeon_http_requests_total', op=op, status=response.status_code)
+    registry.observe('archeon_http_request_seconds', seconds, op=op)
+    retried = retries_of(response)
+    if retried:
+        registry.inc('archeon_http_retries_total', retried, op=op)
+    recent_requests.append((time.time(), response.status_code >= 400, retried))
+    return retried
+
+
+def record_error(op, retried=True):
+    registry.inc('archeon_http_requests_total', op=op, status="error")
+    if retried:
+        registry.inc('archeon_http_retries_total', op=op)
+    recent_requests.append((time.time(), True, int(retried)))
+
+
+def summary(window=60.0):
+    """Live figures for the status panel, from transfers and requests in the last window seconds."""
+    since = time.time() - window
+    transfers = [record for record in list(recent) if record['event'] == "transfer" and record['ts'] >= since]
+    done = [record for record in transfers if record.get('result') == "ok"]
+    nbytes = sum(record.get('bytes') or 0 for record in done)
+    ttfbs = sorted(record['ttfb_ms'] for record in done if record.get('ttfb_ms') is not None)
+    window_requests = [request for request in list(recent_requests) if request[0] >= since]
+    requests = len(window_requests)
+    errors = sum(1 for _, failed, _ in window_requests if failed)
+    last_transfer = next((record for record in reversed(list(recent)) if record['event'] == "transfer"), None)
+    return {
+        'active_transfers': int(registry.total('archeon_active_transfers')),
+        'queued_transfers': int(registry.total('archeon_scheduler_queued')),
+        'files': len(done),
+        'failed': len(transfers) - len(done),
+        'mb_per_s': nbytes / 1024 ** 2 / window,
+        'ttfb_ms': ttfbs[len(ttfbs) // 2] if ttfbs else None,
+        'requests': requests,
+        'error_rate': errors / requests if requests else 0.0,
+        'retries': sum(retried for _, _, retried in window_requests),
+        'last_transfer': last_transfer,
+    }
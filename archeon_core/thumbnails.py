@@ -0,0 +1,220 @@
+"""Small PNG previews of synced models, rendered on the CPU.
+
+A thumbnail is a z-buffered point rendering of an evenly spaced sample of
+the scene's splats, seen from a fixed camera fitted to the sample's robust
+bounds (2nd-98th percentile, so stray floaters don't shrink the scene to a
+dot). Splats are stamped as squares sized by their projected scale, on a 2x
+grid that is box-filtered down. Only the sampled records are read from the
+file, so a thumbnail costs the same for a 50 MB and a 5 GB capture.
+
+Thumbnails are cached under downloads/.thumbnails/ by content hash (the
+manifest's md5Hash, or size and mtime for files without one), so identical
+models share one image and a re-synced model gets a new one. They are
+rendered on demand in a small thread pool when the model server is first
+asked for /thumbnails/<user>/<file>, i.e. when the dashboard's lazily
+loaded <img> scrolls into view.
+"""
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from . import manifest, splats
+
+THUMBNAILS_DIRNAME = ".thumbnails"
+RENDERER_VERSION = 1  # Bump to re-render cached thumbnails after changing how they look
+WIDTH, HEIGHT = 192, 128
+SUPERSAMPLE = 2
+SAMPLE_SPLATS = 150_000
+MIN_OPACITY = 96          # Fainter splats mostly add haze at this size
+MAX_POINT_RADIUS = 2      # Supersampled pixels
+FIELD_OF_VIEW = 50.0      # Vertical, degrees
+VIEW_DIRECTION = (0.0, 0.35, 1.0)  # Looking along +z, slightly down (captures are y-down)
+WORLD_UP = (0.0, -1.0, 0.0)
+BACKGROUND = (24, 24, 40)
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+SUPPORTED_EXTENSIONS = (".ply", ".splat")
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def load_sample(path, limit=SAMPLE_SPLATS):
+    """Decode an evenly spaced sample of at most limit splats from a .ply or .splat file."""
+    lower = path.lower()
+    if lower.endswith(".ply"):
+        header = splats.read_ply_header(path)
+        records, decode = splats.map_ply_vertices(path, header), lambda rows: splats.decode_ply_vertices(rows, header)
+    elif lower.endswith(".splat"):
+        records = np.memmap(path, dtype=splats.splat_dtype(), mode='r',
+                            shape=(os.path.getsize(path) // splats.SPLAT_ROW_BYTES,))
+        decode = splats.decode_splat_rows
+    else:
+        raise ValueError(f"No thumbnails for {os.path.basename(path)}")
+    if len(records) > limit:
+        records = records[np.unique(np.linspace(0, len(records) - 1, limit).astype(np.int64))]
+    return decode(np.asarray(records))
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float64)
+    return vector / np.linalg.norm(vector)
+
+
+def render(scene, width=WIDTH, height=HEIGHT):
+    """(height, width, 3) uint8 preview of scene."""
+    w, h = width * SUPERSAMPLE, height * SUPERSAMPLE
+    image = np.empty((h * w, 3), dtype=np.uint8)
+    image[:] = BACKGROUND
+
+    visible = scene.colors[:, 3] >= MIN_OPACITY
+    centers = scene.centers[visible].astype(np.float64)
+    if len(centers):
+        colors = scene.colors[visible, :3]
+        sizes = scene.scales[visible].max(axis=1).astype(np.float64)
+
+        low, high = np.percentile(centers, [2, 98], axis=0)
+        target = (low + high) / 2
+        radius = max(float(np.linalg.norm(high - low)) / 2, 1e-6)
+        half_fov = np.radians(FIELD_OF_VIEW) / 2
+        forward = _normalize(VIEW_DIRECTION)
+        right = _normalize(np.cross(forward, WORLD_UP))
+        up = np.cross(right, forward)
+        eye = target - forward * radius / np.sin(half_fov)
+
+        relative = centers - eye
+        depth = relative @ forward
+        front = depth > radius * 1e-3
+        focal = (h / 2) / np.tan(half_fov)
+        depth = depth[front]
+        x = w / 2 + focal * (relative[front] @ right) / depth
+        y = h / 2 - focal * (relative[front] @ up) / depth
+        point_radius = np.clip(np.rint(focal * sizes[front] / depth), 0, MAX_POINT_RADIUS).astype(np.int64)
+        colors = colors[front]
+        px, py = np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+
+        # Stamp each point as a (2r+1)^2 square, then keep the nearest sample per pixel
+        pixels, depths, sources = [], [], []
+        for r in range(MAX_POINT_RADIUS + 1):
+            points = np.flatnonzero(point_radius >= r)
+            for dy in range(-r, r + 1):
+                for dx in range(-r, r + 1):
+                    if max(abs(dx), abs(dy)) != r:
+                        continue  # Smaller rings were stamped by earlier passes
+                    sx, sy = px[points] + dx, py[points] + dy
+                    inside = (sx >= 0) & (sx < w) & (sy >= 0) & (sy < h)
+                    pixels.append(sy[inside] * w + sx[inside])
+                    depths.append(depth[points[inside]])
+                    sources.append(points[inside])
+        pixels, depths, sources = np.concatenate(pixels), np.concatenate(depths), np.concatenate(sources)
+        order = np.lexsort((depths, pixels))
+        pixels, sources = pixels[order], sources[order]
+        nearest = np.r_[True, pixels[1:] != pixels[:-1]]
+        image[pixels[nearest]] = colors[sources[nearest]]
+
+    image = image.reshape(height, SUPERSAMPLE, width, SUPERSAMPLE, 3).astype(np.uint16)
+    return (image.sum(axis=(1, 3)) // (SUPERSAMPLE * SUPERSAMPLE)).astype(np.uint8)
+
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+
+def encode_png(image):
+    """Encode an (height, width, 3) uint8 image as an 8-bit RGB PNG."""
+    height, width, _ = image.shape
+    rows = image.reshape(height, width * 3)
+    # PNG 'Sub' filter: each byte minus the same channel of the pixel to its left
+    filtered = rows.copy()
+    filtered[:, 3:] -= rows[:, :-3]
+    raw = np.concatenate([np.ones((height, 1), dtype=np.uint8), filtered], axis=1)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 9))
+            + _png_chunk(b"IEND", b""))
+
+
+def render_thumbnail(model_path, png_path):
+    """Render model_path's thumbnail into png_path."""
+    png = encode_png(render(load_sample(model_path)))
+    tmp_path = f"{png_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(png)
+    os.replace(tmp_path, png_path)
+    return png_path
+
+
+def content_key(model_path):
+    """Cache key for a model's thumbnail: its content hash, image size and renderer version."""
+    local_dir, name = os.path.split(model_path)
+    content = None
+    for cloud_path, entry in manifest.load_manifest(local_dir).items():
+        if manifest.local_name(cloud_path) == name:
+            content = entry.get('md5Hash')
+            break
+    if content is None:
+        stat = os.stat(model_path)
+        content = f"{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(f"{content}|{WIDTH}x{HEIGHT}|{RENDERER_VERSION}".encode()).hexdigest()
+
+
+class ThumbnailCache:
+    """Content-addressed thumbnails under cache_dir, rendered in a shared pool."""
+
+    def __init__(self, cache_dir, workers=DEFAULT_WORKERS):
+        self.cache_dir = cache_dir
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._pending = {}  # key -> Future of the PNG path
+        self._failed = {}   # key -> error message; a changed model gets a new key
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def request(self, model_path):
+        """(key, Future of the thumbnail's path), rendering it unless cached or already queued."""
+        key = content_key(model_path)
+        png_path = self.path_for(key)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return key, future
+            future = Future()
+            if os.path.isfile(png_path):
+                future.set_result(png_path)
+                return key, future
+            if key in self._failed:
+                future.set_exception(ValueError(self._failed[key]))
+                return key, future
+            os.makedirs(self.cache_dir, exist_ok=True)
+            future = self._pending[key] = self._pool.submit(render_thumbnail, model_path, png_path)
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return key, future
+
+    def _finish(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.exception() is not None:
+                self._failed[key] = str(future.exception())
+
+    def get(self, model_path, timeout=None):
+        """(key, PNG path) for model_path once rendered, or (key, None) if it can't be or isn't ready in time."""
+        key, future = self.request(model_path)
+        try:
+            return key, future.result(timeout)
+        except Exception:
+            return key, None
+
+
+def get_cache(downloads_dir):
+    """Return the process-wide thumbnail cache under downloads_dir."""
+    cache_dir = os.path.abspath(os.path.join(downloads_dir, THUMBNAILS_DIRNAME))
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = _caches[cache_dir] = ThumbnailCache(cache_dir)
+        return cache
@@ -0,0 +1,143 @@
+"""Octree tiling with per-tile LOD levels for progressive streaming.
+
+Like the web viewer's SplatPartitioner/SplatTree, a scene is split into an
+octree whose leaves hold at most max_splats splats. Each leaf tile is
+written as additive LOD levels: level 0 holds the tile's most significant
+splats, every further level adds the next slice, and loading all levels
+gives the full tile. tileset.json indexes tiles, bounds and level files so
+a client can fetch coarse levels of the tiles nearest the camera first.
+"""
+import json
+import math
+import os
+import shutil
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import ksplat, splats
+
+TILESET_NAME = "tileset.json"
+TILESET_VERSION = 1
+DEFAULT_MAX_SPLATS = 65536
+DEFAULT_MAX_DEPTH = 8
+# Cumulative share of a tile's splats loaded after each level
+DEFAULT_LOD_FRACTIONS = (1 / 16, 1 / 4, 1.0)
+
+
+@dataclass
+class Tile:
+    id: str              # Octant path from the root, e.g. "0" or "0-3-5"
+    depth: int
+    indices: np.ndarray  # Splat indices in the source scene
+
+
+def partition_octree(centers, max_splats=DEFAULT_MAX_SPLATS, max_depth=DEFAULT_MAX_DEPTH):
+    """Split splats into octree leaves of at most max_splats (or max_depth) each."""
+    points = centers.astype(np.float64)
+    if len(points) == 0:
+        return []
+    low = points.min(axis=0)
+    side = float((points.max(axis=0) - low).max()) or 1.0
+    cells = 1 << max_depth
+    grid = np.clip(np.floor((points - low) / side * cells), 0, cells - 1).astype(np.int64)
+
+    tiles = []
+    pending = [("0", 0, np.arange(len(points)))]
+    while pending:
+        tile_id, depth, indices = pending.pop()
+        if len(indices) <= max_splats or depth == max_depth:
+            tiles.append(Tile(tile_id, depth, indices))
+            continue
+        shift = max_depth - depth - 1
+        cell = grid[indices] >> shift & 1
+        octant = cell[:, 0] << 2 | cell[:, 1] << 1 | cell[:, 2]
+        order = np.argsort(octant, kind='stable')
+        bounds = np.searchsorted(octant[order], np.arange(9))
+        for child in range(7, -1, -1):
+            if bounds[child + 1] > bounds[child]:
+                child_indices = indices[order[bounds[child]:bounds[child + 1]]]
+                pending.append((f"{tile_id}-{child}", depth + 1, child_indices))
+    tiles.sort(key=lambda tile: [int(part) for part in tile.id.split("-")])
+    return tiles
+
+
+def level_bounds(count, fractions=DEFAULT_LOD_FRACTIONS):
+    """Splat index boundaries of each additive level for a tile of count splats."""
+    ends = [min(count, max(1, math.ceil(count * fraction))) for fraction in fractions]
+    ends[-1] = count
+    return list(zip([0] + ends[:-1], ends))
+
+
+def tileset_options(max_splats=DEFAULT_MAX_SPLATS, max_depth=DEFAULT_MAX_DEPTH, fractions=DEFAULT_LOD_FRACTIONS,
+                    compression_level=ksplat.DEFAULT_COMPRESSION_LEVEL):
+    return {'version': TILESET_VERSION, 'max_splats': max_splats, 'max_depth': max_depth,
+            'fractions': list(fractions), 'compression_level': compression_level}
+
+
+def build_tileset(scene, out_dir, max_splats=DEFAULT_MAX_SPLATS, max_depth=DEFAULT_MAX_DEPTH,
+                  fractions=DEFAULT_LOD_FRACTIONS, compression_level=ksplat.DEFAULT_COMPRESSION_LEVEL):
+    """Write tile level files and tileset.json into out_dir; returns the tileset dict."""
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    entries = []
+    for tile in partition_octree(scene.centers, max_splats, max_depth):
+        tile_scene = scene.subset(tile.indices)
+        ranked = tile_scene.subset(splats.importance_order(tile_scene))
+        levels = []
+        for level, (start, end) in enumerate(level_bounds(len(ranked), fractions)):
+            if end <= start:
+                continue
+            uri = f"{tile.id}_L{level}.ksplat"
+            # Keep every splat: alpha filtering would make level sizes disagree with the index
+            written = ksplat.write_ksplat(ranked.subset(slice(start, end)), os.path.join(out_dir, uri),
+                                          compression_level, alpha_threshold=0)
+            levels.append({'level': level, 'uri': uri, 'splats': written,
+                           'bytes': os.path.getsize(os.path.join(out_dir, uri))})
+        low = tile_scene.centers.min(axis=0)
+        high = tile_scene.centers.max(axis=0)
+        entries.append({'id': tile.id, 'depth': tile.depth, 'splats': len(tile_scene),
+                        'min': low.tolist(), 'max': high.tolist(), 'center': ((low + high) / 2).tolist(),
+                        'levels': levels})
+
+    tileset = {'options': tileset_options(max_splats, max_depth, fractions, compression_level),
+               'splats': len(scene), 'levels': len(fractions), 'tiles': entries}
+    if len(scene):
+        tileset['min'] = scene.centers.min(axis=0).tolist()
+        tileset['max'] = scene.centers.max(axis=0).tolist()
+    # Written last so a partially written tileset is never picked up
+    tmp_path = os.path.join(out_dir, TILESET_NAME + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(tileset, f)
+    os.replace(tmp_path, os.path.join(out_dir, TILESET_NAME))
+    return tileset
+
+
+def load_tileset(out_dir):
+    try:
+        with open(os.path.join(out_dir, TILESET_NAME), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def tile_distance(tile, camera):
+    """Distance from camera to the tile's bounding box (0 inside it)."""
+    low, high = np.asarray(tile['min']), np.asarray(tile['max'])
+    nearest = np.clip(np.asarray(camera, dtype=np.float64), low, high)
+    return float(np.linalg.norm(nearest - camera))
+
+
+def stream_schedule(tileset, camera):
+    """Level files in load order: coarse to fine, nearest tiles first within each level."""
+    camera = np.asarray(camera, dtype=np.float64)
+    by_distance = sorted(tileset['tiles'], key=lambda tile: tile_distance(tile, camera))
+    schedule = []
+    for level in range(tileset['levels']):
+        for tile in by_distance:
+            for entry in tile['levels']:
+                if entry['level'] == level:
+                    schedule.append({'tile': tile['id'], **entry})
+    return schedule
@@ -0,0 +1,337 @@
+"""Firebase ID token lifecycle: refresh before expiry, on 401, and across restarts.
+
+A TokenManager owns one signed-in user's ID and refresh tokens. Storage
+sessions authenticate through TokenAuth, which asks the manager for the
+current ID token on every request, so a sync that outlives the one-hour
+token keeps going: the token is refreshed a few minutes before it expires,
+and a 401 triggers one refresh and a resend of the same request (ranged
+downloads carry on from the bytes already written).
+
+With "Remember me", refresh tokens are kept in a TokenStore: one file
+encrypted with AES-GCM under a random key that only this OS user can read.
+The key file sits next to the store, so the encryption keeps the tokens
+from other OS users and from a copy of tokens.bin alone, not from anyone
+who can read this user's token directory. Each browser that asked to be
+remembered gets its own opaque remember id, and a new session is restored
+only from the account that id was issued for, with a single refresh call
+instead of a password round trip.
+"""
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+
+import requests
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from requests.auth import AuthBase
+
+SIGN_IN_URL = "https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword"
+REFRESH_URL = "https://securetoken.googleapis.com/v1/token"
+REFRESH_MARGIN = 300     # Seconds before expiry at which the ID token is renewed
+DEFAULT_LIFETIME = 3600  # Firebase ID tokens last an hour
+REQUEST_TIMEOUT = 30
+
+TOKEN_DIR = os.environ.get("ARCHEON_TOKEN_DIR", os.path.join(os.path.expanduser("~"), ".archeon"))
+KEY_NAME = "token.key"
+STORE_NAME = "tokens.bin"
+STORE_MAGIC = b"ATK1"
+NONCE_BYTES = 12
+TAG_BYTES = 16
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class AuthError(Exception):
+    """The refresh token was rejected; the user has to sign in again."""
+
+
+class TokenManager:
+    def __init__(self, api_key, refresh_token, id_token=None, expires_at=0.0, local_id=None, email=None,
+                 store=None):
+        self.api_key = api_key
+        self.local_id = local_id
+        self.email = email
+        self.store = store  # Set when the user asked to be remembered
+        self._refresh_token = refresh_token
+        self._id_token = id_token
+        self._expires_at = expires_at
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_sign_in(cls, api_key, user, store=None):
+        """Manager for a pyrebase sign_in_with_email_and_password response."""
+        lifetime = int(user.get('expiresIn') or DEFAULT_LIFETIME)
+        manager = cls(api_key, user['refreshToken'], user['idToken'], time.time() + lifetime,
+                      user['localId'], user.get('email'), store)
+        if store is not None:
+            store.save(manager.local_id, manager.email, manager._refresh_token)
+        return manager
+
+    @classmethod
+    def restore(cls, api_key, store, remember_id):
+        """Sign the user remember_id was issued to back in with one refresh call, or return None."""
+        account = store.lookup(remember_id)
+        if account is None:
+            return None
+        manager = cls(api_key, account['refresh_token'], local_id=account['local_id'], email=account['email'],
+                      store=store)
+        try:
+            manager.id_token()
+        except AuthError:
+            store.forget(account['local_id'])
+            return None
+        except requests.exceptions.RequestException:
+            return None
+        return manager
+
+    @property
+    def key(self):
+        """Stable identity for pooling; unlike the ID token it survives refreshes."""
+        return f"user:{self.local_id}"
+
+    @property
+    def expires_at(self):
+        return self._expires_at
+
+    def id_token(self):
+        """Current ID token, refreshed first if it expires within REFRESH_MARGIN."""
+        with self._lock:
+            if self._id_token is None or time.time() >= self._expires_at - REFRESH_MARGIN:
+                self._refresh_locked()
+            return self._id_token
+
+    def refresh(self, stale_token=None):
+        """Force a refresh, unless another thread already replaced stale_token."""
+        with self._lock:
+            if stale_token is None or stale_token == self._id_token:
+                self._refresh_locked()
+            return self._id_token
+
+    def _refresh_locked(self):
+        try:
+            response = requests.post(REFRESH_URL, params={'key': self.api_key}, timeout=REQUEST_TIMEOUT,
+                                     data={'grant_type': 'refresh_token', 'refresh_token': self._refresh_token})
+        except requests.exceptions.RequestException:
+            # A blip shouldn't fail transfers while the current token is still accepted
+            if self._id_token is not None and time.time() < self._expires_at:
+                return
+            raise
+        if response.status_code in (400, 401, 403):
+            raise AuthError(_error_message(response))
+        response.raise_for_status()
+        payload = response.json()
+        self._id_token = payload['id_token']
+        self._expires_at = time.time() + int(payload.get('expires_in') or DEFAULT_LIFETIME)
+        self.local_id = payload.get('user_id', self.local_id)
+        if payload.get('refresh_token') and payload['refresh_token'] != self._refresh_token:
+            self._refresh_token = payload['refresh_token']
+            if self.store is not None:
+                self.store.save(self.local_id, self.email, self._refresh_token)
+
+    def auth(self):
+        return TokenAuth(self)
+
+    def user(self):
+        """pyrebase-style user dict with the current ID token."""
+        return {'localId': self.local_id, 'email': self.email, 'idToken': self.id_token()}
+
+
+def sign_in(api_key, email, password):
+    """Email/password sign-in via the Identity Toolkit REST API, without pyrebase.
+
+    Returns the same fields as pyrebase's sign_in_with_email_and_password, so
+    the result can go straight to TokenManager.from_sign_in.
+    """
+    response = requests.post(SIGN_IN_URL, params={'key': api_key}, timeout=REQUEST_TIMEOUT,
+                             json={'email': email, 'password': password, 'returnSecureToken': True})
+    if response.status_code in (400, 401, 403):
+        raise AuthError(_error_message(response))
+    response.raise_for_status()
+    return response.json()
+
+
+def _error_message(response):
+    try:
+        return response.json()['error']['message']
+    except (ValueError, KeyError, TypeError):
+        return f"Authentication failed with HTTP {response.status_code}"
+
+
+class TokenAuth(AuthBase):
+    """requests auth that signs each request with the manager's current token and retries a 401 once."""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def __call__(self, request):
+        request.headers['Authorization'] = f"Bearer {self.manager.id_token()}"
+        request.register_hook('response', self._handle_401)
+        return request
+
+    def _handle_401(self, response, **kwargs):
+        if response.status_code != 401:
+            return response
+        stale_token = response.request.headers.get('Authorization', '')[len("Bearer "):]
+        try:
+            token = self.manager.refresh(stale_token)
+        except (AuthError, requests.exceptions.RequestException):
+            return response
+        # Drain the body so the connection goes back to the pool
+        response.content
+        response.close()
+        retry = response.request.copy()
+        retry.hooks = {'response': []}  # One retry only
+        retry.headers['Authorization'] = f"Bearer {token}"
+        retried = response.connection.send(retry, **kwargs)
+        retried.history.append(response)
+        retried.request = retry
+        return retried
+
+
+class TokenStore:
+    """Remembered refresh tokens by user id, encrypted at rest.
+
+    scope (the Firebase API key) is bound in as associated data, so a store
+    written for one Firebase project is never replayed against another.
+    Browsers are tied to an account through remember ids from issue(); only
+    their SHA-256 digests are stored.
+    """
+
+    def __init__(self, directory=TOKEN_DIR, scope=""):
+        self.directory = directory
+        self.scope = scope.encode()
+        self._path = os.path.join(directory, STORE_NAME)
+        self._key_path = os.path.join(directory, KEY_NAME)
+        self._lock = threading.Lock()
+
+    def _key(self):
+        try:
+            with open(self._key_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        key = get_random_bytes(32)
+        try:
+            fd = os.open(self._key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            # Another process created it first
+            with open(self._key_path, 'rb') as f:
+                return f.read()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+    def _read(self):
+        try:
+            with open(self._path, 'rb') as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return {}
+        if not blob.startswith(STORE_MAGIC):
+            return {}
+        body = blob[len(STORE_MAGIC):]
+        nonce, tag, ciphertext = body[:NONCE_BYTES], body[NONCE_BYTES:NONCE_BYTES + TAG_BYTES], \
+            body[NONCE_BYTES + TAG_BYTES:]
+        cipher = AES.new(self._key(), AES.MODE_GCM, nonce=nonce)
+        cipher.update(self.scope)
+        try:
+            return json.loads(cipher.decrypt_and_verify(ciphertext, tag))
+        except (ValueError, KeyError):
+            # Tampered, written under another key or for another project
+            return {}
+
+    def _write(self, accounts):
+        cipher = AES.new(self._key(), AES.MODE_GCM, nonce=get_random_bytes(NONCE_BYTES))
+        cipher.update(self.scope)
+        ciphertext, tag = cipher.encrypt_and_digest(json.dumps(accounts).encode())
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        tmp_path = self._path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(STORE_MAGIC + cipher.nonce + tag + ciphertext)
+        os.replace(tmp_path, self._path)
+
+    def save(self, local_id, email, refresh_token):
+        with self._lock:
+            accounts = self._read()
+            browsers = accounts.get(local_id, {}).get('browsers', [])
+            accounts[local_id] = {'local_id': local_id, 'email': email, 'refresh_token': refresh_token,
+                                  'saved_at': time.time(), 'browsers': browsers}
+            self._write(accounts)
+
+    def load(self, local_id):
+        """The remembered account for local_id, or None."""
+        with self._lock:
+            return self._read().get(local_id)
+
+    def issue(self, local_id):
+        """New opaque remember id for one browser signed in as local_id (saved first)."""
+        remember_id = secrets.token_urlsafe(32)
+        with self._lock:
+            accounts = self._read()
+            account = accounts.get(local_id)
+            if account is None:
+                raise KeyError(local_id)
+            account.setdefault('browsers', []).append(_digest(remember_id))
+            self._write(accounts)
+        return remember_id
+
+    def lookup(self, remember_id):
+        """The account remember_id was issued for, or None."""
+        if not remember_id:
+            return None
+        digest = _digest(remember_id)
+        with self._lock:
+            accounts = self._read()
+        for account in accounts.values():
+            if any(secrets.compare_digest(digest, issued) for issued in account.get('browsers', ())):
+                return account
+        return None
+
+    def revoke(self, remember_id):
+        """Stop remember_id signing its browser in; the account goes once no browser remembers it."""
+        if not remember_id:
+            return
+        digest = _digest(remember_id)
+        with self._lock:
+            accounts = self._read()
+            for local_id, account in list(accounts.items()):
+                browsers = [issued for issued in account.get('browsers', ())
+                            if not secrets.compare_digest(digest, issued)]
+                if len(browsers) == len(account.get('browsers', ())):
+                    continue
+                if browsers:
+                    account['browsers'] = browsers
+                else:
+                    del accounts[local_id]
+                self._write(accounts)
+                return
+
+    def accounts(self):
+        with self._lock:
+            return sorted(self._read().values(), key=lambda account: account['saved_at'], reverse=True)
+
+    def forget(self, local_id):
+        with self._lock:
+            accounts = self._read()
+            if accounts.pop(local_id, None) is not None:
+                self._write(accounts)
+
+
+def _digest(remember_id):
+    return hashlib.sha256(remember_id.encode()).hexdigest()
+
+
+def get_store(scope, directory=TOKEN_DIR):
+    """Return the process-wide token store for scope under directory."""
+    key = (os.path.abspath(directory), scope)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = TokenStore(directory, scope)
+        return store
@@ -0,0 +1,87 @@
+"""Shared, pooled HTTP transport for Firebase Storage.
+
+All storage traffic goes through one requests.Session per user token, so
+listing and downloading many objects reuses kept-alive TCP/TLS connections
+instead of paying a fresh handshake per request. Sessions can be keyed by
+a raw ID token or by a tokens.TokenManager; the latter signs every request
+with the current token, so its session outlives token refreshes.
+"""
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .tokens import TokenManager
+
+STORAGE_HOST = "https://firebasestorage.googleapis.com"
+POOL_CONNECTIONS = 4   # Distinct hosts kept in the pool
+POOL_MAXSIZE = 16      # Keep-alive connections per host; >= download workers
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5   # Sleeps 0.5s, 1s, 2s, 4s between retries
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_SESSIONS = 8       # Tokens kept alive at once; oldest sessions are closed
+
+_sessions = OrderedDict()
+_lock = threading.Lock()
+
+
+def storage_base_url(bucket):
+    return f"{STORAGE_HOST}/v0/b/{bucket}/o"
+
+
+def _session_key(credentials):
+    return credentials.key if isinstance(credentials, TokenManager) else credentials
+
+
+def _build_session(credentials):
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                          max_retries=retry, pool_block=True)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    if isinstance(credentials, TokenManager):
+        session.auth = credentials.auth()
+    elif credentials:
+        session.headers["Authorization"] = f"Bearer {credentials}"
+    return session
+
+
+def get_session(credentials):
+    """Return the pooled session for an ID token or TokenManager, creating it on first use."""
+    key = _session_key(credentials)
+    with _lock:
+        session = _sessions.get(key)
+        if session is not None:
+            _sessions.move_to_end(key)
+            if isinstance(credentials, TokenManager) and session.auth.manager is not credentials:
+                # A fresh sign-in for the same user replaces the old manager
+                session.auth = credentials.auth()
+            return session
+        session = _build_session(credentials)
+        _sessions[key] = session
+        while len(_sessions) > MAX_SESSIONS:
+            _, stale = _sessions.popitem(last=False)
+            stale.close()
+        return session
+
+
+def close_session(credentials):
+    """Drop and close the session for credentials, e.g. on logout."""
+    with _lock:
+        session = _sessions.pop(_session_key(credentials), None)
+    if session is not None:
+        session.close()
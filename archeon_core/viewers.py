@@ -0,0 +1,256 @@
+"""Warm, long-lived viewers that switch models on command.
+
+Spawning ArcheonViewer.exe or opening a browser tab for every model pays
+the viewer's whole startup each time. The registry here keeps one viewer
+per user and kind (WEB for the browser page, NATIVE for the Unity build)
+and drives it over the model server's /viewer/<id>/ endpoints:
+
+    POST ready      the viewer has booted and takes commands
+    GET  commands   long-poll for commands newer than ?after=<seq>
+    POST status     progress of a command: {"seq", "state", "seconds"}
+
+Polling doubles as a heartbeat, so a closed tab is noticed and replaced on
+the next open. Switching models is one "load" command and costs the
+model's load time, not the viewer's boot. The model given at launch is
+command 0.
+
+Native viewers are started with -archeonControl <url> -archeonModel
+<path> (also ARCHEON_VIEWER_CONTROL in the environment). A build that
+doesn't speak the protocol still runs; it just never reports ready. Since
+the bundled build is one of those, a native build is only waited on for
+SILENT_READY_TIMEOUT until it has reported ready once; that is recorded in
+a marker next to the executable (READY_MARKER_SUFFIX), keyed by the
+build's size and mtime, so it survives restarts and resets on a new build.
+"""
+import itertools
+import os
+import subprocess
+import threading
+import time
+import uuid
+import webbrowser
+from urllib.parse import urlencode
+
+WEB = "web"
+NATIVE = "native"
+NATIVE_EXE = "ArcheonViewer.exe"
+VIEWER_PAGE = "model.html"
+CONTROL_PREFIX = "/viewer/"
+READY_TIMEOUT = 30.0      # Seconds a new viewer gets to report ready
+ACK_TIMEOUT = 5.0         # Seconds a warm viewer gets to pick up a command
+POLL_TIMEOUT = 25.0       # Longest a commands request is held open
+HEARTBEAT_TIMEOUT = 60.0  # A web viewer that hasn't polled for this long is gone
+SILENT_READY_TIMEOUT = 2.0  # For native builds not yet seen to report ready
+READY_MARKER_SUFFIX = ".ready"
+
+LOADING = "loading"
+LOADED = "loaded"
+FAILED = "failed"
+
+
+class Viewer:
+    def __init__(self, owner, kind):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.kind = kind
+        self.process = None  # Popen for native viewers
+        self.build = None    # Executable path for native viewers
+        self.info = {}
+        self.model = None
+        self.launched_at = time.time()
+        self.ready_at = None
+        self.last_seen = None
+        self._commands = []
+        self._status = {}
+        self._seq = itertools.count(1)
+        self._cond = threading.Condition()
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    @property
+    def alive(self):
+        if self.process is not None:
+            # Native builds without the control protocol never poll; trust the process
+            return self.process.poll() is None
+        if self.last_seen is None:
+            return time.time() - self.launched_at < READY_TIMEOUT
+        return time.time() - self.last_seen < HEARTBEAT_TIMEOUT
+
+    @property
+    def startup_seconds(self):
+        return None if self.ready_at is None else self.ready_at - self.launched_at
+
+    def control_path(self, action=""):
+        return f"{CONTROL_PREFIX}{self.id}/{action}"
+
+    # Called from the app
+
+    def send(self, action, **fields):
+        """Queue a command for the viewer and return its sequence number."""
+        with self._cond:
+            seq = next(self._seq)
+            self._commands.append(dict(fields, seq=seq, action=action))
+            self._cond.notify_all()
+        return seq
+
+    def load(self, src, model=None):
+        self.model = model or src
+        return self.send("load", src=src)
+
+    def wait_ready(self, timeout=None):
+        """True once the viewer has reported ready; False on timeout or if it died.
+
+        A native build that hasn't reported ready before only gets SILENT_READY_TIMEOUT.
+        """
+        if timeout is None:
+            timeout = SILENT_READY_TIMEOUT if self.build is not None and not reports_ready(self.build) \
+                else READY_TIMEOUT
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.ready and time.monotonic() < deadline:
+                if self.process is not None and self.process.poll() is not None:
+                    return False
+                self._cond.wait(min(0.25, max(0.0, deadline - time.monotonic())))
+            return self.ready
+
+    def wait_status(self, seq, states=(LOADING, LOADED, FAILED), timeout=ACK_TIMEOUT):
+        """The latest status for command seq once it reaches one of states, or None."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while time.monotonic() < deadline:
+                status = self._status.get(seq)
+                if status is not None and status.get('state') in states:
+                    return status
+                self._cond.wait(max(0.0, deadline - time.monotonic()))
+            return None
+
+    def status(self, seq):
+        with self._cond:
+            return self._status.get(seq)
+
+    # Called from the model server on behalf of the viewer
+
+    def mark_ready(self, info):
+        with self._cond:
+            self.info = info
+            self.ready_at = self.ready_at or time.time()
+            self.last_seen = time.time()
+            self._cond.notify_all()
+        if self.build is not None:
+            _record_ready(self.build)
+
+    def commands_after(self, after, timeout=POLL_TIMEOUT):
+        """Block until there are commands newer than after (or timeout) and return them."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.last_seen = time.time()
+            while True:
+                pending = [command for command in self._commands if command['seq'] > after]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    self.last_seen = time.time()
+                    return pending
+                self._cond.wait(remaining)
+
+    def report(self, status):
+        with self._cond:
+            self._status[int(status.get('seq', 0))] = status
+            self.last_seen = time.time()
+            self._cond.notify_all()
+
+
+class ViewerRegistry:
+    def __init__(self):
+        self._viewers = {}  # (owner, kind) -> Viewer
+        self._lock = threading.Lock()
+
+    def find(self, viewer_id):
+        with self._lock:
+            return next((viewer for viewer in self._viewers.values() if viewer.id == viewer_id), None)
+
+    def get(self, owner, kind):
+        """owner's warm viewer of this kind, if it is still running."""
+        with self._lock:
+            viewer = self._viewers.get((owner, kind))
+        return viewer if viewer is not None and viewer.alive else None
+
+    def open(self, owner, kind, launch, src, model=None):
+        """Show src in owner's viewer, launching one only if none is warm.
+
+        launch(viewer, src) starts a new viewer with src as its first model.
+        Returns (viewer, seq, launched), where seq is the load command to
+        watch with wait_status (0 for the model given at launch).
+        """
+        viewer = self.get(owner, kind)
+        if viewer is not None:
+            seq = viewer.load(src, model)
+            if viewer.process is not None or viewer.wait_status(seq) is not None:
+                return viewer, seq, False
+            # The page went away without us noticing (e.g. tab closed); start over
+        viewer = Viewer(owner, kind)
+        viewer.model = model or src
+        with self._lock:
+            self._viewers[(owner, kind)] = viewer
+        launch(viewer, src)
+        return viewer, 0, True
+
+    def close(self, owner):
+        """Ask owner's viewers to close and forget them, e.g. on logout."""
+        with self._lock:
+            closing = [viewer for (viewer_owner, _), viewer in self._viewers.items() if viewer_owner == owner]
+            for viewer in closing:
+                del self._viewers[(owner, viewer.kind)]
+        for viewer in closing:
+            viewer.send("close")
+            if viewer.process is not None and viewer.process.poll() is None:
+                viewer.process.terminate()
+
+
+def _build_signature(build):
+    stat = os.stat(build)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def reports_ready(build):
+    """True if this exact native build has reported ready before (see _record_ready)."""
+    try:
+        with open(build + READY_MARKER_SUFFIX) as f:
+            return f.read().strip() == _build_signature(build)
+    except OSError:
+        return False
+
+
+def _record_ready(build):
+    try:
+        signature = _build_signature(build)
+        if not reports_ready(build):
+            with open(build + READY_MARKER_SUFFIX, 'w') as f:
+                f.write(signature)
+    except OSError:
+        pass  # Only costs the next launch a shorter wait
+
+
+def launch_web(model_server):
+    """Launcher for the browser viewer page served by model_server."""
+    def launch(viewer, src):
+        webbrowser.open(model_server.url(f"{VIEWER_PAGE}?" + urlencode({'viewer': viewer.id, 'src': src})))
+    return launch
+
+
+def launch_native(model_server, local_dir):
+    """Launcher for the Unity viewer in local_dir; src is a model path or empty."""
+    def launch(viewer, src):
+        control_url = model_server.url(viewer.control_path())
+        viewer.build = os.path.abspath(os.path.join(local_dir, NATIVE_EXE))
+        args = [viewer.build, "-archeonControl", control_url]
+        if src:
+            args += ["-archeonModel", src]
+        viewer.process = subprocess.Popen(args, cwd=local_dir,
+                                          env=dict(os.environ, ARCHEON_VIEWER_CONTROL=control_url))
+    return launch
+
+
+# Shared by every Streamlit session in this process
+registry = ViewerRegistry()
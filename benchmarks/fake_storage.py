@@ -0,0 +1,314 @@
+"""Local stand-in for the Firebase Storage v0 REST API, with fault injection.
+
+Serves the endpoints the sync engine uses, from objects held in memory:
+
+    GET /v0/b/<bucket>/o?prefix=&delimiter=&maxResults=&pageToken=   list (paginated)
+    GET /v0/b/<bucket>/o/<url-encoded name>                          metadata (size, md5Hash, generation)
+    GET /v0/b/<bucket>/o/<url-encoded name>?alt=media                content, with single Range support
+    GET /__stats                                                     request and fault counters
+
+A FaultProfile adds per-request latency (visible as time to first byte), a
+per-connection bandwidth cap, 503 responses and connections dropped mid-body,
+all drawn from a seeded RNG so runs are repeatable. Run it standalone to point
+a sync at it by hand:
+
+    python benchmarks/fake_storage.py --library 200x1M --latency 0.05 --bandwidth 10M
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+DEFAULT_BUCKET = "archeon-bench.appspot.com"
+DEFAULT_PREFIX = "models/bench/"
+LIST_PAGE_LIMIT = 1000
+WRITE_BLOCK = 64 * 1024
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+@dataclass
+class FaultProfile:
+    latency: float = 0.0       # Seconds added before every response
+    bandwidth: float = 0.0     # Bytes per second per response body; 0 for unlimited
+    failure_rate: float = 0.0  # Share of requests answered with 503
+    drop_rate: float = 0.0     # Share of media responses cut off halfway through the body
+    seed: int = 0
+
+
+@dataclass
+class FakeObject:
+    name: str
+    data: bytes
+    generation: int
+    md5_hash: str
+    updated: str
+
+    def metadata(self, bucket):
+        return {
+            'name': self.name,
+            'bucket': bucket,
+            'generation': str(self.generation),
+            'metageneration': "1",
+            'contentType': "application/octet-stream",
+            'timeCreated': self.updated,
+            'updated': self.updated,
+            'storageClass': "STANDARD",
+            'size': str(len(self.data)),
+            'md5Hash': self.md5_hash,
+            'contentEncoding': "identity",
+            'contentDisposition': f"inline; filename*=utf-8''{quote(self.name.rsplit('/', 1)[-1])}",
+            'downloadTokens': "00000000-0000-0000-0000-000000000000",
+        }
+
+
+def parse_size(value):
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", value.upper())
+    if not match:
+        raise ValueError(f"Bad size '{value}' (expected e.g. 512K, 16M)")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def parse_library(spec):
+    """'400x16K,4x16M' -> [(400, 16384), (4, 16777216)]."""
+    groups = []
+    for part in spec.split(","):
+        count, _, size = part.strip().partition("x")
+        if not size:
+            raise ValueError(f"Bad library group '{part}' (expected COUNTxSIZE)")
+        groups.append((int(count), parse_size(size)))
+    return groups
+
+
+class FakeStorageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeFirebaseStorage/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/__stats":
+            self._send_json(200, server.stats())
+            return
+        if server.profile.latency:
+            time.sleep(server.profile.latency)
+        if server.token and self.headers.get("Authorization") not in (f"Bearer {server.token}",
+                                                                       f"Firebase {server.token}"):
+            server.count('unauthorized')
+            self._send_json(401, {'error': {'code': 401, 'message': "Permission denied."}})
+            return
+        if server.roll(server.profile.failure_rate):
+            server.count('failures_injected')
+            self._send_json(503, {'error': {'code': 503, 'message': "Service unavailable (injected)."}})
+            return
+
+        list_path = f"/v0/b/{server.bucket}/o"
+        if url.path == list_path:
+            self._send_json(200, server.list_page(query))
+        elif url.path.startswith(list_path + "/"):
+            obj = server.objects.get(unquote(url.path[len(list_path) + 1:]))
+            if obj is None:
+                self._send_json(404, {'error': {'code': 404, 'message': "Not Found."}})
+            elif query.get('alt') == ["media"]:
+                self._send_media(obj)
+            else:
+                self._send_json(200, obj.metadata(server.bucket))
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': "Not Found."}})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_media(self, obj):
+        size = len(obj.data)
+        start, end = 0, size - 1
+        header = self.headers.get("Range")
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip()) if header else None
+        partial = bool(match and (match.group(1) or match.group(2)))
+        if partial:
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size or end < start:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("ETag", f'"{obj.md5_hash}"')
+        self.end_headers()
+
+        payload = memoryview(obj.data)[start:end + 1]
+        cut = len(payload) // 2 if self.server.roll(self.server.profile.drop_rate) else None
+        bandwidth = self.server.profile.bandwidth
+        began = time.perf_counter()
+        sent = 0
+        try:
+            while sent < len(payload):
+                if cut is not None and sent >= cut:
+                    self.server.count('drops_injected')
+                    self.close_connection = True
+                    return
+                block = payload[sent:sent + WRITE_BLOCK]
+                self.wfile.write(block)
+                sent += len(block)
+                self.server.count('bytes_sent', len(block))
+                if bandwidth:
+                    delay = sent / bandwidth - (time.perf_counter() - began)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class FakeStorage(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, bucket=DEFAULT_BUCKET, profile=None, token=None):
+        super().__init__((host, port), FakeStorageHandler)
+        self.bucket = bucket
+        self.profile = profile or FaultProfile()
+        self.token = token  # Required bearer token, or None to accept anything
+        self.objects = {}
+        self._rng = random.Random(self.profile.seed)
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'bytes_sent': 0, 'unauthorized': 0, 'failures_injected': 0,
+                          'drops_injected': 0}
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v0/b/{self.bucket}/o"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-storage", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, objects=len(self.objects),
+                        bytes_stored=sum(len(obj.data) for obj in self.objects.values()),
+                        profile=asdict(self.profile))
+
+    def roll(self, rate):
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def put(self, name, data, generation=None):
+        """Add or replace an object; replacing bumps its generation like real Storage."""
+        previous = self.objects.get(name)
+        if generation is None:
+            generation = previous.generation + 1 if previous else 1
+        md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode()
+        updated = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        self.objects[name] = FakeObject(name, data, generation, md5_hash, updated)
+
+    def delete(self, name):
+        self.objects.pop(name, None)
+
+    def populate(self, groups, prefix=DEFAULT_PREFIX, seed=0):
+        """Fill prefix with random objects for [(count, size), ...]; returns the names."""
+        rng = random.Random(seed)
+        names = []
+        for group, (count, size) in enumerate(groups):
+            for index in range(count):
+                name = f"{prefix}g{group}_{index:05d}_{size}.ply"
+                self.put(name, rng.randbytes(size))
+                names.append(name)
+        return names
+
+    def list_page(self, query):
+        prefix = query.get('prefix', [""])[0]
+        delimiter = query.get('delimiter', [""])[0]
+        limit = min(int(query.get('maxResults', [LIST_PAGE_LIMIT])[0]), LIST_PAGE_LIMIT)
+        after = query.get('pageToken', [""])[0]
+        after = base64.urlsafe_b64decode(after.encode()).decode() if after else ""
+
+        items, prefixes = [], set()
+        more = False
+        for name in sorted(self.objects):
+            if not name.startswith(prefix) or name <= after:
+                continue
+            rest = name[len(prefix):]
+            if delimiter and delimiter in rest:
+                prefixes.add(prefix + rest.split(delimiter, 1)[0] + delimiter)
+                continue
+            if len(items) == limit:
+                more = True
+                break
+            items.append({'name': name, 'bucket': self.bucket})
+        page = {'prefixes': sorted(prefixes), 'items': items}
+        if more:
+            page['nextPageToken'] = base64.urlsafe_b64encode(items[-1]['name'].encode()).decode()
+        return page
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake Firebase Storage bucket for sync testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--bucket", default=DEFAULT_BUCKET)
+    parser.add_argument("--library", action="append", default=[],
+                        help="PREFIX=COUNTxSIZE[,COUNTxSIZE...], or COUNTxSIZE for the default prefix; repeatable")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--bandwidth", type=parse_size, default=0, help="Per-response cap, e.g. 10M (bytes/s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of downloads cut off halfway")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--token", help="Require this bearer token")
+    args = parser.parse_args(argv)
+
+    profile = FaultProfile(args.latency, args.bandwidth, args.failure_rate, args.drop_rate, args.seed)
+    storage = FakeStorage(args.host, args.port, args.bucket, profile, args.token)
+    for index, library in enumerate(args.library):
+        prefix, _, spec = library.rpartition("=")
+        storage.populate(parse_library(spec), prefix or DEFAULT_PREFIX, seed=args.seed + index)
+    # First line of output tells a parent process where to connect
+    print(json.dumps({'base_url': storage.base_url, 'objects': len(storage.objects)}), flush=True)
+    try:
+        storage.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""Cold-start and rerun latency of the Streamlit app (login page, no network).
+
+    python benchmarks/startup_benchmark.py [--cold-runs 5] [--reruns 30]
+        [--max-cold-ms N] [--max-rerun-ms N] [--json]
+
+Cold start is timed in a fresh interpreter per run, from process start
+(including `import streamlit`) to the end of the first script run. Reruns
+are timed in one process with Streamlit's AppTest harness, which is what a
+widget interaction costs on the server. The script also checks that
+rendering the login page imports none of DEFERRED_MODULES (pyrebase, numpy
+and the model server, which the dashboard loads on first use). With
+--max-*-ms budgets it exits non-zero when the median goes over, so it can
+gate changes.
+
+Needs firebase_config.json in the repository root (the example file is
+enough; nothing is sent to Firebase).
+"""
+import time
+
+PROCESS_START = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "Archeon.py")
+CONFIG_PATH = os.path.join(REPO_ROOT, "firebase_config.json")
+APP_TIMEOUT = 60
+DEFERRED_MODULES = ("pyrebase", "numpy", "archeon_core.server")
+
+
+def run_app_once():
+    """First script run in this process; returns (seconds since process start, AppTest)."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=APP_TIMEOUT)
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"App raised during startup: {app.exception[0].message}")
+    return time.perf_counter() - PROCESS_START, app
+
+
+def measure_cold(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child-cold"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1])['seconds'])
+    return samples
+
+
+def measure_reruns(runs):
+    _, app = run_app_once()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - start)
+    return samples, [name for name in DEFERRED_MODULES if name in sys.modules]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'median_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] * 1000,
+        'min_ms': ordered[0] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Archeon.py cold start and rerun latency.")
+    parser.add_argument("--cold-runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--reruns", type=int, default=30, help="Reruns to time after the first run")
+    parser.add_argument("--max-cold-ms", type=float, help="Fail if the median cold start exceeds this")
+    parser.add_argument("--max-rerun-ms", type=float, help="Fail if the median rerun exceeds this")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--child-cold", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    os.chdir(REPO_ROOT)
+    if args.child_cold:
+        seconds, _ = run_app_once()
+        print(json.dumps({'seconds': seconds}))
+        return 0
+    if not os.path.isfile(CONFIG_PATH):
+        print("firebase_config.json not found; copy firebase_config.json.example to run the benchmark.",
+              file=sys.stderr)
+        return 2
+
+    cold = summarize(measure_cold(args.cold_runs))
+    rerun_samples, loaded = measure_reruns(args.reruns)
+    rerun = summarize(rerun_samples)
+    results = {'cold_start': cold, 'rerun': rerun, 'imported_before_login': loaded}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, stats in (("Cold start", cold), ("Rerun", rerun)):
+            print(f"{name:<11} median {stats['median_ms']:8.1f} ms   p95 {stats['p95_ms']:8.1f} ms   "
+                  f"min {stats['min_ms']:8.1f} ms   ({stats['runs']} runs)")
+        print(f"Imported before login: {', '.join(loaded) if loaded else 'none of ' + ', '.join(DEFERRED_MODULES)}")
+
+    over_budget = [name for name, stats, budget in (("cold start", cold, args.max_cold_ms),
+                                                    ("rerun", rerun, args.max_rerun_ms))
+                   if budget is not None and stats['median_ms'] > budget]
+    for name in over_budget:
+        print(f"Median {name} is over budget", file=sys.stderr)
+    return 1 if over_budget or loaded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
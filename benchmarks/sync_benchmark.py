@@ -0,0 +1,256 @@
+"""Sync throughput benchmark against the local Firebase Storage stand-in.
+
+    python benchmarks/sync_benchmark.py [--library small|mixed|large|COUNTxSIZE ...]
+        [--profile lan|wan|flaky ...] [--workers 4] [--repeat 3] [--json]
+        [--save results.json] [--compare baseline.json [--max-regression 10]]
+
+Each network profile gets its own fake_storage.py process holding every
+selected library. Each run syncs one library into an empty directory from a
+fresh client process, so the reported CPU time and peak RSS belong to
+sync.sync_user alone. A second sync of the now up-to-date directory measures
+the cost of checking a library that has nothing to download.
+
+Reported per library and profile (median of --repeat runs): files/s, MB/s,
+time to first byte (sync start to the first byte written, which includes
+listing and metadata), CPU seconds and utilisation, peak RSS, no-op resync
+time and the number of HTTP requests the server saw.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from urllib.request import urlopen
+
+from fake_storage import DEFAULT_PREFIX, FaultProfile, parse_library
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+LIBRARIES = {
+    'small': "400x16K",        # Many small files: per-request overhead dominates
+    'mixed': "40x1M,4x16M",
+    'large': "2x80M",          # Above the downloader's parallel range threshold
+}
+PROFILES = {
+    'lan': FaultProfile(),
+    'wan': FaultProfile(latency=0.04, bandwidth=25 * 1024 ** 2),
+    'flaky': FaultProfile(latency=0.02, failure_rate=0.03, drop_rate=0.02),
+}
+SERVER_START_TIMEOUT = 120
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_client(base_url, prefix, workers):
+    """Sync prefix into a scratch directory and return the measurements (client process)."""
+    sys.path.insert(0, REPO_ROOT)
+    from archeon_core import downloader, sync, transport
+
+    class TimedProgress(downloader.ByteProgress):
+        first_byte_at = None
+
+        def advance(self, nbytes):
+            if self.first_byte_at is None and nbytes > 0:
+                self.first_byte_at = time.perf_counter()
+            super().advance(nbytes)
+
+    scratch = tempfile.mkdtemp(prefix="archeon-sync-bench-")
+    os.chdir(scratch)  # No ./viewer here, so viewer provisioning is skipped
+    local_dir = os.path.join(scratch, "library")
+    session = transport.get_session(None)
+    try:
+        progress = TimedProgress()
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        summary = sync.sync_user(session, base_url, prefix, local_dir, progress=progress, workers=workers)
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+
+        resync_start = time.perf_counter()
+        resync = sync.sync_user(session, base_url, prefix, local_dir, workers=workers)
+        resync_seconds = time.perf_counter() - resync_start
+    finally:
+        transport.close_session(None)
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        'files': len(summary.downloaded),
+        'bytes': progress.done_bytes,
+        'failed': len(summary.failed),
+        'seconds': seconds,
+        'ttfb_ms': (progress.first_byte_at - start) * 1000 if progress.first_byte_at else None,
+        'cpu_seconds': cpu_seconds,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'resync_ms': resync_seconds * 1000,
+        'resync_downloaded': len(resync.downloaded),
+    }
+
+
+def start_server(libraries, profile):
+    command = [sys.executable, os.path.join(BENCH_DIR, "fake_storage.py"), "--latency", str(profile.latency),
+               "--bandwidth", str(int(profile.bandwidth)), "--failure-rate", str(profile.failure_rate),
+               "--drop-rate", str(profile.drop_rate), "--seed", str(profile.seed)]
+    for name, spec in libraries.items():
+        command += ["--library", f"{DEFAULT_PREFIX}{name}/={spec}"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        process.kill()
+        raise RuntimeError("Fake storage server exited before it was ready")
+    return process, json.loads(line)['base_url']
+
+
+def server_requests(base_url):
+    stats_url = base_url.split("/v0/", 1)[0] + "/__stats"
+    with urlopen(stats_url, timeout=SERVER_START_TIMEOUT) as response:
+        return json.load(response)['requests']
+
+
+def run_scenario(base_url, library, profile_name, workers, repeat):
+    runs = []
+    for _ in range(repeat):
+        requests_before = server_requests(base_url)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--client", base_url,
+                                 f"{DEFAULT_PREFIX}{library}/", "--workers", str(workers)],
+                                capture_output=True, text=True, check=True).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        # Less one for the stats lookup itself
+        run['requests'] = server_requests(base_url) - requests_before - 1
+        runs.append(run)
+    return summarize(library, profile_name, workers, runs)
+
+
+def _median(runs, key):
+    values = [run[key] for run in runs if run[key] is not None]
+    return statistics.median(values) if values else None
+
+
+def summarize(library, profile_name, workers, runs):
+    seconds = _median(runs, 'seconds')
+    files = runs[0]['files']
+    nbytes = runs[0]['bytes']
+    cpu_seconds = _median(runs, 'cpu_seconds')
+    rss = _median(runs, 'peak_rss_bytes')
+    return {
+        'library': library,
+        'profile': profile_name,
+        'workers': workers,
+        'runs': len(runs),
+        'files': files,
+        'megabytes': nbytes / 1024 ** 2,
+        'failed': max(run['failed'] for run in runs),
+        'seconds': seconds,
+        'files_per_s': files / seconds if seconds else 0.0,
+        'mb_per_s': nbytes / 1024 ** 2 / seconds if seconds else 0.0,
+        'ttfb_ms': _median(runs, 'ttfb_ms'),
+        'cpu_seconds': cpu_seconds,
+        'cpu_percent': 100.0 * cpu_seconds / seconds if seconds else 0.0,
+        'peak_rss_mb': rss / 1024 ** 2 if rss is not None else None,
+        'resync_ms': _median(runs, 'resync_ms'),
+        'requests': _median(runs, 'requests'),
+    }
+
+
+def _format(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def print_table(results, baseline=None):
+    previous = {(row['library'], row['profile']): row for row in baseline or []}
+    print(f"{'library':<8} {'profile':<6} {'files':>6} {'MB':>8} {'files/s':>9} {'MB/s':>8} {'TTFB ms':>8} "
+          f"{'CPU s':>7} {'CPU %':>6} {'RSS MB':>7} {'resync ms':>9} {'reqs':>6}")
+    for row in results:
+        line = (f"{row['library']:<8} {row['profile']:<6} {row['files']:>6} {row['megabytes']:>8.1f} "
+                f"{row['files_per_s']:>9.1f} {row['mb_per_s']:>8.1f} {_format(row['ttfb_ms'], '>8.0f')} "
+                f"{row['cpu_seconds']:>7.2f} {row['cpu_percent']:>6.0f} {_format(row['peak_rss_mb'], '>7.0f')} "
+                f"{row['resync_ms']:>9.0f} {_format(row['requests'], '>6.0f')}")
+        old = previous.get((row['library'], row['profile']))
+        if old and old['mb_per_s']:
+            line += f"   MB/s {100.0 * (row['mb_per_s'] / old['mb_per_s'] - 1):+.1f}% vs baseline"
+        if row['failed']:
+            line += f"   ({row['failed']} failed)"
+        print(line)
+
+
+def regressions(results, baseline, max_regression):
+    previous = {(row['library'], row['profile']): row for row in baseline}
+    worse = []
+    for row in results:
+        old = previous.get((row['library'], row['profile']))
+        if old and old['mb_per_s'] and row['mb_per_s'] < old['mb_per_s'] * (1 - max_regression / 100.0):
+            worse.append(f"{row['library']}/{row['profile']}")
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sync.sync_user against a local fake Firebase Storage.")
+    parser.add_argument("--library", action="append",
+                        help=f"Built-in library ({', '.join(LIBRARIES)}) or COUNTxSIZE[,COUNTxSIZE...]; repeatable")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES), help="Network profile; repeatable")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent downloads")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per library and profile")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --save")
+    parser.add_argument("--max-regression", type=float,
+                        help="With --compare, fail if MB/s drops more than this many percent")
+    parser.add_argument("--client", nargs=2, metavar=("BASE_URL", "PREFIX"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.client:
+        print(json.dumps(run_client(args.client[0], args.client[1], args.workers)))
+        return 0
+
+    libraries = {}
+    for entry in args.library or list(LIBRARIES):
+        spec = LIBRARIES.get(entry, entry)
+        parse_library(spec)  # Fail early on a malformed spec
+        libraries[entry if entry in LIBRARIES else spec.replace(",", "+")] = spec
+
+    results = []
+    for profile_name in args.profile or list(PROFILES):
+        process, base_url = start_server(libraries, PROFILES[profile_name])
+        try:
+            for library in libraries:
+                results.append(run_scenario(base_url, library, profile_name, args.workers, args.repeat))
+        finally:
+            process.terminate()
+            process.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+    report = {'workers': args.workers, 'profiles': {name: asdict(PROFILES[name]) for name in args.profile or PROFILES},
+              'libraries': libraries, 'results': results}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(results, baseline)
+
+    failed = [f"{row['library']}/{row['profile']}" for row in results if row['failed']]
+    worse = regressions(results, baseline, args.max_regression) if baseline and args.max_regression is not None else []
+    for name in worse:
+        print(f"MB/s regressed beyond {args.max_regression}% for {name}", file=sys.stderr)
+    return 1 if failed or worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""sync.sync_account against benchmarks/fake_storage.py, without Firebase."""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+
+from archeon_core import storage, sync, transport  # noqa: E402
+from fake_storage import FakeStorage, FaultProfile  # noqa: E402
+
+USER = "alice"
+
+
+def model_name(user_id, file_name):
+    return f"{sync.user_cloud_dir(user_id)}{file_name}"
+
+
+def local_file(downloads_dir, user_id, file_name):
+    return os.path.join(sync.user_local_dir(user_id, str(downloads_dir)), file_name)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def downloads_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # No ./viewer here, so viewer provisioning is skipped
+    return tmp_path / "downloads"
+
+
+@pytest.fixture
+def session():
+    session = transport.get_session(None)
+    yield session
+    transport.close_session(None)
+
+
+def start_storage(profile=None):
+    return FakeStorage(profile=profile).start()
+
+
+def run_sync(fake, session, downloads_dir, user_id=USER):
+    return sync.sync_account(session, fake.base_url, user_id, downloads_dir=str(downloads_dir))
+
+
+def test_sync_resumes_through_dropped_connections(session, downloads_dir):
+    fake = start_storage(FaultProfile(drop_rate=0.3, seed=7))
+    try:
+        payloads = {f"scene_{index}.ply": os.urandom(3 * 1024 * 1024 + index) for index in range(4)}
+        for file_name, data in payloads.items():
+            fake.put(model_name(USER, file_name), data)
+        summary = run_sync(fake, session, downloads_dir)
+        assert summary.ok
+        assert fake.stats()['drops_injected'] > 0
+        for file_name, data in payloads.items():
+            assert read(local_file(downloads_dir, USER, file_name)) == data
+    finally:
+        fake.stop()
+
+
+def test_second_sync_is_a_no_op(session, downloads_dir):
+    fake = start_storage()
+    try:
+        for index in range(5):
+            fake.put(model_name(USER, f"scene_{index}.ply"), os.urandom(64 * 1024))
+        assert len(run_sync(fake, session, downloads_dir).downloaded) == 5
+        requests_before = fake.stats()['requests']
+        summary = run_sync(fake, session, downloads_dir)
+        assert summary.ok and summary.unchanged == 5
+        assert not summary.downloaded and not summary.linked and not summary.deleted
+        # Metadata the first sync confirmed is reused, so only the listing is requested
+        assert fake.stats()['requests'] - requests_before == 1
+    finally:
+        fake.stop()
+
+
+def test_remote_deletion_removes_the_local_copy(session, downloads_dir):
+    fake = start_storage()
+    try:
+        fake.put(model_name(USER, "kept.ply"), b"k" * 4096)
+        fake.put(model_name(USER, "gone.ply"), b"g" * 4096)
+        run_sync(fake, session, downloads_dir)
+        fake.delete(model_name(USER, "gone.ply"))
+        summary = run_sync(fake, session, downloads_dir)
+        assert summary.deleted == [model_name(USER, "gone.ply")]
+        assert not os.path.exists(local_file(downloads_dir, USER, "gone.ply"))
+        assert read(local_file(downloads_dir, USER, "kept.ply")) == b"k" * 4096
+    finally:
+        fake.stop()
+
+
+def test_changed_object_is_downloaded_again(session, downloads_dir, monkeypatch):
+    monkeypatch.setattr(storage, "METADATA_MAX_AGE", 0)  # Look every object up again
+    fake = start_storage()
+    try:
+        fake.put(model_name(USER, "scene.ply"), b"old" * 1000)
+        run_sync(fake, session, downloads_dir)
+        fake.put(model_name(USER, "scene.ply"), b"new" * 2000)
+        summary = run_sync(fake, session, downloads_dir)
+        assert summary.downloaded == [model_name(USER, "scene.ply")]
+        assert read(local_file(downloads_dir, USER, "scene.ply")) == b"new" * 2000
+    finally:
+        fake.stop()
+
+
+def test_identical_models_are_hard_linked_across_users(session, downloads_dir):
+    fake = start_storage()
+    try:
+        data = os.urandom(256 * 1024)
+        fake.put(model_name("alice", "shared.ply"), data)
+        fake.put(model_name("bob", "shared.ply"), data)
+        first = run_sync(fake, session, downloads_dir, "alice")
+        second = run_sync(fake, session, downloads_dir, "bob")
+        assert first.downloaded == [model_name("alice", "shared.ply")]
+        assert second.linked == [model_name("bob", "shared.ply")] and not second.downloaded
+        alice, bob = (local_file(downloads_dir, user_id, "shared.ply") for user_id in ("alice", "bob"))
+        assert read(bob) == data
+        assert os.path.samefile(alice, bob)
+    finally:
+        fake.stop()